@@ -1,22 +1,34 @@
 # app.py
 import os
+import json
 import click
 from flask import Flask, render_template, jsonify, request
 from flask_wtf.csrf import CSRFProtect
 from flask.cli import with_appcontext
-from collections import OrderedDict
-from sqlalchemy import func
+from datetime import datetime, timedelta, timezone
 
 # --- Importeer extensies, modellen en functies ---
-from models import db, Product, Dish, Category as ProductCategory, DishCategory, Ingredient
+from models import db, Dish
 from extensions import migrate # Aanname: je hebt een extensions.py voor Migrate
-from category_order_manager import load_category_order
-from db_seeder import seed_data
+from cost_engine import ranked_dishes, refresh_all_costs
+from query_counter import init_query_counter, query_budget
+from metrics import init_metrics
+from fragment_cache import init_fragment_cache
+from dashboard import dashboard_context
+from pagination import sort_url
+from product_search import search_index_filter
+from ingredient_catalog import catalog_response
+from data_version import CATEGORY_ORDER, DISHES, PRODUCTS, conditional_get
+from read_replica import REPLICA_BIND, init_read_replica, read_replica
+from db_pool import engine_options
+from sqlite_profile import init_sqlite_profile
 
 # --- Importeer de blueprints (routes) ---
 from routes.products import product_bp
 from routes.dishes import dish_bp
 from routes.preparations import preparation_bp
+from routes.jobs import job_bp
+from routes.exports import export_bp
 # Het is een goede praktijk om ook de hoofdroutes in een blueprint te plaatsen,
 # maar voor nu laten we ze hier voor de eenvoud.
 
@@ -44,24 +56,47 @@ def create_app():
     LOCAL_DB_URI = f"sqlite:///{os.path.join(app.instance_path, 'kostprijs.db')}"
 
     app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL or LOCAL_DB_URI
+
+    # Optionele leesreplica voor de GET-views met @read_replica (zie read_replica.py)
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    if REPLICA_DATABASE_URL:
+        if REPLICA_DATABASE_URL.startswith("postgres://"):
+            REPLICA_DATABASE_URL = REPLICA_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND: {'url': REPLICA_DATABASE_URL, **engine_options(REPLICA_DATABASE_URL, REPLICA_BIND)},
+        }
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_POOL_RECYCLE'] = 299
-    app.config['SQLALCHEMY_POOL_PRE_PING'] = True
+    # Pool (grootte per worker, recycle, pre-ping) en PostgreSQL-timeouts uit DB_*-variabelen, zie db_pool.py
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'een-sterke-lokale-geheime-sleutel')
 
-    # --- DE FIX: Voeg deze twee regels toe voor stabiele databaseverbindingen ---
-    app.config['SQLALCHEMY_POOL_RECYCLE'] = 299
-    app.config['SQLALCHEMY_POOL_PRE_PING'] = True
-
     # --- Koppel extensies aan de app ---
     db.init_app(app)
-    migrate.init_app(app, db) # Je had migrate correct geïnitialiseerd
+    migrate.init_app(app, db, include_object=search_index_filter) # De zoekindex valt buiten autogenerate
+
+    # --- WAL, busy_timeout, foreign keys, ... op elke SQLite-verbinding (SQLITE_PROFILE=0 om uit te zetten) ---
+    init_sqlite_profile(app)
+
+    # --- Leesqueries van @read_replica-views naar de replica, met terugval op de primaire ---
+    init_read_replica(app)
+
+    # --- N+1-detectie: telt SELECT-queries per request (QUERY_BUDGET_ENFORCE=1 in tests) ---
+    app.config['QUERY_BUDGET_ENFORCE'] = os.environ.get('QUERY_BUDGET_ENFORCE') == '1'
+    init_query_counter(app)
+
+    # --- Prometheus-metingen per endpoint, beschikbaar op /metrics ---
+    init_metrics(app)
+
+    # --- Cache voor de gerenderde dashboardsecties (FRAGMENT_CACHE=memory|filesystem|redis|null) ---
+    init_fragment_cache(app)
 
     # --- DE FIX: Registreer alle blueprints met de correcte URL-prefix ---
     # Dit lost het probleem op waarbij URLs voor gerechten en bereidingen incorrect waren.
     app.register_blueprint(product_bp, url_prefix='/products')
     app.register_blueprint(dish_bp, url_prefix='/dishes')
     app.register_blueprint(preparation_bp, url_prefix='/preparations')
+    app.register_blueprint(job_bp, url_prefix='/jobs')
+    app.register_blueprint(export_bp, url_prefix='/exports')
     
     with app.app_context():
         # --- Custom Jinja2 Filters ---
@@ -82,57 +117,413 @@ def create_app():
             except (ValueError, TypeError):
                 return 'N/A'
 
+        # Sorteerlinks in de kolomhoofdingen van de beheerlijsten
+        app.add_template_global(sort_url)
+
         # --- API en Hoofdroutes ---
         @app.route('/api/top_dishes')
+        @read_replica
+        @query_budget(3)
+        @conditional_get(DISHES)
         def top_dishes_api():
             # ... (jouw bestaande API-logica is prima) ...
             sort_by = request.args.get('sort_by', 'cost_price')
             count = request.args.get('count', 5, type=int)
-            all_dishes = Dish.query.filter_by(is_preparation=False).all()
-            if sort_by == 'profit':
-                sorted_dishes = sorted(all_dishes, key=lambda d: d.selling_price_calculated - d.cost_price_calculated, reverse=True)
-            else:
-                sorted_dishes = sorted(all_dishes, key=lambda d: d.cost_price_calculated, reverse=True)
-            top_dishes = sorted_dishes[:count]
+            offset = request.args.get('offset', 0, type=int)
+            dish_category_id = request.args.get('category', type=int)
+            top_dishes = ranked_dishes(sort_by=sort_by, count=count, offset=offset, dish_category_id=dish_category_id)
             chart_data = {
                 'labels': [d.name for d in top_dishes],
-                'data': [d.selling_price_calculated - d.cost_price_calculated if sort_by == 'profit' else d.cost_price_calculated for d in top_dishes]
+                'data': [d.value for d in top_dishes]
             }
             return jsonify(chart_data)
 
+        @app.route('/api/ingredient_catalog')
+        @read_replica
+        @query_budget(6)
+        def ingredient_catalog_api():
+            """Alle producten en bereidingen voor de receptformulieren; 304 zolang niets wijzigde."""
+            return catalog_response()
+
+        def parse_date_arg(name, default):
+            value = request.args.get(name)
+            if not value:
+                return default
+            try:
+                moment = datetime.fromisoformat(value)
+            except ValueError:
+                return None
+            # De prijshistoriek bewaart naïeve UTC-tijdstippen; een tijdzone wordt omgerekend
+            if moment.tzinfo is not None:
+                moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+            return moment
+
+        @app.route('/api/costs_as_of')
+        @read_replica
+        @query_budget(6)
+        @conditional_get(PRODUCTS, DISHES)
+        def costs_as_of_api():
+            """
+            Kostprijs en verkoopprijs van alle eindgerechten op een gegeven datum (?date=JJJJ-MM-DD),
+            of enkel van de gevraagde gerechten (?dish_id=..).
+            """
+            from price_history import dish_costs_as_of
+            moment = parse_date_arg('date', datetime.utcnow())
+            if moment is None:
+                return jsonify({'status': 'error', 'message': 'Ongeldige datum.'}), 400
+            dish_ids = request.args.getlist('dish_id', type=int) or None
+            costs = dish_costs_as_of([moment], dish_ids=dish_ids)
+            dishes = db.session.query(Dish.id, Dish.name).filter(Dish.is_preparation == False)
+            if dish_ids:
+                dishes = dishes.filter(Dish.id.in_(dish_ids))
+            dishes = dishes.order_by(Dish.name).all()
+            return jsonify([
+                {'id': d.id, 'name': d.name, 'cost_price': costs[d.id][0].cost_price, 'selling_price': costs[d.id][0].selling_price}
+                for d in dishes if d.id in costs
+            ])
+
+        @app.route('/api/cost_trend')
+        @read_replica
+        @query_budget(6)
+        @conditional_get(PRODUCTS, DISHES)
+        def cost_trend_api():
+            """Kostprijsverloop van één of meer gerechten (?dish_id=..&start=..&end=..&points=..)."""
+            from price_history import cost_trend
+            end = parse_date_arg('end', datetime.utcnow())
+            start = parse_date_arg('start', (end or datetime.utcnow()) - timedelta(days=365))
+            if start is None or end is None or start >= end:
+                return jsonify({'status': 'error', 'message': 'Ongeldige periode.'}), 400
+            dish_ids = request.args.getlist('dish_id', type=int)
+            points = min(request.args.get('points', 12, type=int), 366)
+            return jsonify(cost_trend(dish_ids, start, end, points=points))
+
+        @app.route('/api/simulate_prices', methods=['POST'])
+        @csrf.exempt # Alleen-lezen: er wordt niets naar de database geschreven
+        def simulate_prices_api():
+            """Wat-als-simulatie: nieuwe kostprijs en marge per gerecht voor een batch prijsscenario's."""
+            from price_simulation import ScenarioError, parse_only_changed, parse_scenarios, simulate # NumPy enkel laden wanneer nodig
+            payload = request.get_json(silent=True)
+            only_changed = None
+            if isinstance(payload, dict):
+                only_changed = payload.get('only_changed')
+                payload = payload.get('scenarios')
+            try:
+                only_changed = parse_only_changed(only_changed)
+                scenarios = parse_scenarios(payload)
+            except ScenarioError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            return jsonify({'status': 'success', 'scenarios': simulate(scenarios, only_changed=only_changed)})
+
         @app.route('/')
+        @read_replica
+        @query_budget(10)
+        @conditional_get(PRODUCTS, DISHES, CATEGORY_ORDER, private=True)
         def index():
-            # ... (jouw bestaande index-logica is complex en blijft ongewijzigd) ...
-            all_dish_categories = DishCategory.query.join(Dish).filter(Dish.is_preparation == False).distinct().order_by(DishCategory.name).all()
-            cost_per_category_query = db.session.query(ProductCategory.name, func.sum(Ingredient.quantity * (Product.package_price / Product.package_weight))).join(Product, ProductCategory.id == Product.category_id).join(Ingredient, Product.id == Ingredient.product_id).filter(Product.package_weight != None, Product.package_weight > 0, Product.package_price != None).group_by(ProductCategory.name).order_by(func.sum(Ingredient.quantity * (Product.package_price / Product.package_weight)).desc()).all()
-            cost_distribution_data = {'labels': [row[0] for row in cost_per_category_query],'data': [float(row[1]) if row[1] is not None else 0 for row in cost_per_category_query]}
-            category_orders = load_category_order()
-            sorted_dish_category_names = [cat.name for cat in all_dish_categories]
-            custom_sorted_dish_names = [name for name in category_orders.get('dishes', []) if name in sorted_dish_category_names]
-            custom_sorted_dish_names += [name for name in sorted_dish_category_names if name not in custom_sorted_dish_names]
-            composed_dishes_by_category = OrderedDict()
-            for cat_name in custom_sorted_dish_names:
-                category = next((cat for cat in all_dish_categories if cat.name == cat_name), None)
-                if category:
-                    dishes_in_cat = [d for d in category.dishes if not d.is_preparation]
-                    if dishes_in_cat:
-                        composed_dishes_by_category[cat_name] = dishes_in_cat
-            all_product_categories = ProductCategory.query.order_by(ProductCategory.name).all()
-            sorted_product_category_names = [cat.name for cat in all_product_categories]
-            custom_sorted_product_names = [name for name in category_orders.get('products', []) if name in sorted_product_category_names]
-            custom_sorted_product_names += [name for name in sorted_product_category_names if name not in custom_sorted_product_names]
-            products_by_category = OrderedDict()
-            for cat_name in custom_sorted_product_names:
-                category = next((cat for cat in all_product_categories if cat.name == cat_name), None)
-                if category:
-                    products_by_category[cat_name] = category.products
-            return render_template('index.html', cost_distribution_json=jsonify(cost_distribution_data).get_data(as_text=True), composed_dishes_by_category=composed_dishes_by_category, products_by_category=products_by_category)
+            # Categoriesecties komen uit de fragmentcache; enkel gewijzigde secties worden gerenderd
+            return render_template('index.html', **dashboard_context())
 
         # --- CLI Commando voor de seeder ---
         @app.cli.command("seed-db")
         def seed_db_command():
             """Vult de database met initiële data als deze leeg is."""
+            from db_seeder import seed_data  # Enkel hier nodig; de webworkers laden de seeder niet
+            seed_data()
+
+        @app.cli.command("deploy")
+        def deploy_command():
+            """Upgrade, seed (indien leeg) en ontbrekende kostprijzen in één proces, voor startup.sh."""
+            from flask_migrate import upgrade
+            from db_seeder import seed_data
+            upgrade()
             seed_data()
+            costs = refresh_all_costs(missing_only=True)
+            db.session.commit()
+            print(f"✅ Kostprijs van {len(costs)} gerechten/bereidingen aangevuld.")
+
+        @app.cli.command("startup-check")
+        @click.option('--rounds', default=3, show_default=True, help="Aantal koude starts (mediaan telt).")
+        # Gemeten rond 1 s; de marge vangt trage of gedeelde CI-machines op
+        @click.option('--max-seconds', default=2.0, show_default=True, envvar='STARTUP_MAX_SECONDS',
+                      help="Budget voor het importeren van de app.")
+        @click.option('--max-rss-mb', default=100, show_default=True, help="Budget voor het geheugen van één worker na het opstarten.")
+        @click.option('--output', type=click.Path(dir_okay=False), help="Resultaat als JSON wegschrijven (als latere basislijn).")
+        @click.option('--compare', type=click.File('r'), help="Vorig resultaat: de duur mag hoogstens --max-ratio keer zo lang zijn.")
+        @click.option('--max-ratio', default=1.5, show_default=True, help="Toegelaten vertraging tegenover --compare.")
+        def startup_check_command(rounds, max_seconds, max_rss_mb, output, compare, max_ratio):
+            """
+            Meet de koude start van een worker (import + create_app). Een zware module bij het
+            opstarten laden faalt altijd; de duur wordt getoetst aan --max-seconds, of met
+            --compare aan een eerder resultaat op dezelfde machine.
+            """
+            from benchmark import HEAVY_MODULES, measure_startup
+            result = measure_startup(rounds=rounds)
+            print(f"Opstarten: {result['seconds'] * 1000:.0f} ms, {result['max_rss_mb']:.0f} MB RSS"
+                  f"{', zware modules: ' + ', '.join(result['modules']) if result['modules'] else ''}")
+            if output:
+                with open(output, 'w') as f:
+                    json.dump(result, f, indent=4)
+            problems = []
+            if compare:
+                previous = json.load(compare)
+                ratio = result['seconds'] / previous['seconds']
+                print(f"Basislijn: {previous['seconds'] * 1000:.0f} ms (x{ratio:.2f})")
+                if ratio > max_ratio:
+                    problems.append(f"{ratio:.2f} keer trager dan de basislijn (max. x{max_ratio})")
+            elif result['seconds'] > max_seconds:
+                problems.append(f"trager dan {max_seconds} s")
+            if result['max_rss_mb'] > max_rss_mb:
+                problems.append(f"meer dan {max_rss_mb} MB")
+            if result['modules']:
+                problems.append(f"laadt {', '.join(result['modules'])} (horen lui geïmporteerd te worden: {', '.join(HEAVY_MODULES)})")
+            if problems:
+                raise click.ClickException("Opstartbudget overschreden: " + "; ".join(problems))
+            print("✅ Binnen het opstartbudget.")
+
+        @app.cli.command("pool-check")
+        @click.option('--web-workers', default=1, show_default=True, envvar='WEB_CONCURRENCY', help="Aantal gunicorn-workers.")
+        @click.option('--job-workers', default=1, show_default=True, help="Aantal jobworker-processen.")
+        def pool_check_command(web_workers, job_workers):
+            """Toont de pool-instellingen en het totale aantal verbindingen tegenover max_connections."""
+            from db_pool import connection_budget
+            problems = []
+            for row in connection_budget(db.engines, web_workers, job_workers):
+                line = (f"{row['pool']}: {row['per_process']} per proces x {web_workers + job_workers} processen "
+                        f"= {row['total']} verbindingen")
+                if row['max_connections'] is not None:
+                    line += f" (server laat er {row['max_connections']} toe)"
+                    if row['total'] > row['max_connections']:
+                        problems.append(f"{row['pool']}: {row['total']} > {row['max_connections']}")
+                print(line)
+            if problems:
+                raise click.ClickException("Meer verbindingen dan de database toelaat: " + "; ".join(problems)
+                                           + ". Verlaag DB_POOL_SIZE/DB_MAX_OVERFLOW of het aantal workers.")
+            print("✅ Binnen het verbindingsbudget.")
+
+        # --- SQLite-profiel (zie sqlite_profile.py) ---
+        @app.cli.group("sqlite")
+        def sqlite_group():
+            """Controle en onderhoud van een SQLite-database."""
+
+        @sqlite_group.command("check")
+        @click.option('--hold', default=1.0, show_default=True, help="Seconden dat de schrijftransactie openblijft.")
+        @click.option('--readers', default=4, show_default=True, help="Aantal gelijktijdige lezers.")
+        def sqlite_check_command(hold, readers):
+            """Toont dat lezers niet wachten op een schrijver en dat een tweede schrijver wacht i.p.v. faalt."""
+            from sqlite_profile import concurrency_check, profile_pragmas
+            if db.engine.dialect.name != 'sqlite':
+                raise click.ClickException("De database is geen SQLite.")
+            pragmas = {pragma: db.session.execute(db.text(f'PRAGMA {pragma}')).scalar()
+                       for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'foreign_keys')}
+            db.session.rollback()
+            print("Pragma's: " + ", ".join(f"{pragma}={value}" for pragma, value in pragmas.items()))
+            result = concurrency_check(db.engine.url, profile_pragmas(app.config), hold=hold, readers=readers)
+            print(f"Schrijftransactie {hold:.1f} s open: {result['reads']} leesrondes, mediaan {result['read_p50_ms'] or 0:.1f} ms, "
+                  f"traagste {result['read_max_ms'] or 0:.1f} ms; tweede schrijver wachtte "
+                  f"{result['second_writer_wait_ms'] or 0:.0f} ms op het schrijfslot")
+            problems = result['read_errors'][:1]
+            if result['second_writer_error']:
+                problems.append(f"tweede schrijver: {result['second_writer_error']}")
+            if not result['reads'] or result['read_max_ms'] > hold * 1000 / 2:
+                problems.append("lezers werden door de schrijver opgehouden")
+            if problems:
+                raise click.ClickException("; ".join(problems))
+            print("✅ Lezers lezen door terwijl er geschreven wordt.")
+
+        @sqlite_group.command("maintain")
+        def sqlite_maintain_command():
+            """Voert PRAGMA optimize en een WAL-checkpoint meteen uit."""
+            from sqlite_profile import maintain
+            if db.engine.dialect.name != 'sqlite':
+                raise click.ClickException("De database is geen SQLite.")
+            wal_pages, copied = maintain(db.engine)
+            print(f"✅ Geoptimaliseerd; {copied} van {wal_pages} WAL-pagina's teruggeschreven.")
+
+        @app.cli.command("recompute-costs")
+        @click.option('--missing', is_flag=True, help="Enkel gerechten zonder opgeslagen kostprijs.")
+        def recompute_costs_command(missing):
+            """Berekent de opgeslagen kostprijzen van gerechten en bereidingen opnieuw."""
+            costs = refresh_all_costs(missing_only=missing)
+            db.session.commit()
+            print(f"✅ Kostprijs van {len(costs)} gerechten/bereidingen bijgewerkt.")
+
+        @app.cli.command("rebuild-closure")
+        def rebuild_closure_command():
+            """Berekent de where-used-index (recipe_closure) van alle recepten opnieuw."""
+            from recipe_closure import rebuild_closure
+            count = rebuild_closure()
+            db.session.commit()
+            print(f"✅ Where-used-index opgebouwd voor {count} gerechten/bereidingen.")
+
+        @app.cli.command("rebuild-search-index")
+        def rebuild_search_index_command():
+            """Maakt de zoekindex voor producten (opnieuw) aan en vult ze volledig."""
+            from product_search import create_search_index
+            with db.engine.begin() as connection:
+                create_search_index(connection)
+            print("✅ Zoekindex voor producten opnieuw opgebouwd.")
+
+        @app.cli.command("import-prices")
+        @click.argument('price_file', type=click.Path(exists=True, dir_okay=False))
+        @click.option('--supplier', help="Leverancier voor alle rijen (anders de kolom 'leverancier').")
+        @click.option('--category', help="Categorie voor nieuwe producten (anders de kolom 'categorie').")
+        @click.option('--create-missing', is_flag=True, help="Maak onbekende artikelnummers aan als nieuw product.")
+        @click.option('--chunk-size', default=5000, show_default=True, help="Aantal rijen per transactie.")
+        def import_prices_command(price_file, supplier, category, create_missing, chunk_size):
+            """Importeert een prijslijst (CSV/XLSX) van een leverancier op basis van artikelnummer."""
+            from price_import import PriceImportError, import_prices, iter_price_rows, price_summary_message
+            try:
+                with open(price_file, 'rb') as f:
+                    summary = import_prices(
+                        iter_price_rows(f, price_file),
+                        supplier_name=supplier,
+                        category_name=category,
+                        create_missing=create_missing,
+                        chunk_size=chunk_size,
+                    )
+            except PriceImportError as e:
+                db.session.rollback()
+                raise click.ClickException(str(e))
+            print(f"✅ {price_summary_message(summary)}")
+            for error in summary['errors']:
+                print(f"   ⚠️ {error}")
+
+        @app.cli.command("simulate-prices")
+        @click.argument('scenario_file', type=click.File('r'))
+        @click.option('--output', type=click.File('w'), help="Schrijf het volledige resultaat als JSON weg.")
+        def simulate_prices_command(scenario_file, output):
+            """Simuleert prijswijzigingen uit een JSON-bestand zonder de database aan te passen."""
+            from price_simulation import ScenarioError, parse_scenarios, simulate
+            try:
+                scenarios = parse_scenarios(json.load(scenario_file))
+            except (ScenarioError, json.JSONDecodeError) as e:
+                raise click.ClickException(str(e))
+            results = simulate(scenarios)
+            for result in results:
+                print(f"{result['name']}: {len(result['dishes'])} gerechten gewijzigd, "
+                      f"kost {result['total_cost_delta']:+.2f} €, marge {result['total_margin_delta']:+.2f} €")
+            if output:
+                json.dump(results, output, indent=4)
+
+        @app.cli.command("generate-catalog")
+        @click.option('--products', default=50000, show_default=True)
+        @click.option('--suppliers', default=200, show_default=True)
+        @click.option('--categories', default=40, show_default=True)
+        @click.option('--dishes', default=10000, show_default=True)
+        @click.option('--preparations', default=2000, show_default=True)
+        @click.option('--depth', default=6, show_default=True, help="Nestingdiepte van bereidingen.")
+        @click.option('--seed', default=42, show_default=True, help="Zelfde seed, zelfde catalogus.")
+        def generate_catalog_command(products, suppliers, categories, dishes, preparations, depth, seed):
+            """Vult een lege database met een synthetische catalogus voor benchmarks."""
+            from catalog_generator import CatalogNotEmptyError, generate_catalog
+            try:
+                counts = generate_catalog(
+                    products=products, suppliers=suppliers, categories=categories,
+                    dishes=dishes, preparations=preparations, depth=depth, seed=seed,
+                )
+            except (CatalogNotEmptyError, ValueError) as e:
+                db.session.rollback()
+                raise click.ClickException(str(e))
+            print(f"✅ Catalogus aangemaakt: {counts['products']} producten, {counts['suppliers']} leveranciers, "
+                  f"{counts['dishes']} gerechten, {counts['preparations']} bereidingen, {counts['ingredients']} ingrediënten.")
+
+        @app.cli.command("benchmark")
+        @click.option('--rounds', default=5, show_default=True, help="Aantal gemeten rondes per request.")
+        @click.option('--warmup', default=1, show_default=True, help="Aantal niet-gemeten opwarmrondes.")
+        @click.option('--only', multiple=True, help="Meet enkel deze request(s), bv. --only index.")
+        @click.option('--output', type=click.Path(dir_okay=False), help="JSON-bestand (standaard benchmarks/benchmark-<tijdstip>.json).")
+        @click.option('--compare', type=click.File('r'), help="Vorig resultaat om mee te vergelijken.")
+        def benchmark_command(rounds, warmup, only, output, compare):
+            """Meet de duur van de belangrijkste pagina's en API's tegen de huidige database."""
+            from benchmark import compare_results, run_benchmarks
+            result = run_benchmarks(app, rounds=rounds, warmup=warmup, only=only)
+            if not output:
+                os.makedirs('benchmarks', exist_ok=True)
+                output = os.path.join('benchmarks', f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+            with open(output, 'w') as f:
+                json.dump(result, f, indent=4)
+
+            previous = {row['name']: row for row in compare_results(json.load(compare), result)} if compare else {}
+            for name, stats in result['results'].items():
+                line = f"{name:32} {stats['median_ms']:10.1f} ms (p95 {stats['p95_ms']:.1f} ms, {stats['sql_statements']} SQL)"
+                if previous.get(name, {}).get('ratio') is not None:
+                    line += f"  x{previous[name]['ratio']:.2f} t.o.v. vorige run"
+                print(line)
+            print(f"✅ Resultaat weggeschreven naar {output}")
+
+        # --- Snapshots om een omgeving te seeden of te klonen (zie snapshot.py) ---
+        @app.cli.group("snapshot")
+        def snapshot_group():
+            """Volledige database wegschrijven naar of terugzetten uit een snapshotbestand."""
+
+        @snapshot_group.command("dump")
+        @click.argument('snapshot_file', type=click.Path(dir_okay=False))
+        def snapshot_dump_command(snapshot_file):
+            """Schrijft alle tabellen naar een snapshot, bv. kostprijs.snapshot.gz."""
+            import time
+            from snapshot import dump_snapshot
+            started = time.perf_counter()
+            counts = dump_snapshot(snapshot_file)
+            print(f"✅ {sum(counts.values())} rijen uit {len(counts)} tabellen weggeschreven naar {snapshot_file} "
+                  f"in {time.perf_counter() - started:.1f} s.")
+
+        @snapshot_group.command("restore")
+        @click.argument('snapshot_file', type=click.Path(exists=True, dir_okay=False))
+        @click.option('--replace', is_flag=True, help="Maak de tabellen eerst leeg in plaats van rijen te overschrijven (upsert).")
+        def snapshot_restore_command(snapshot_file, replace):
+            """Zet een snapshot terug in één transactie en berekent de where-used-index en kostprijzen opnieuw."""
+            import time
+            from snapshot import SnapshotError, restore_snapshot
+            started = time.perf_counter()
+            try:
+                counts = restore_snapshot(snapshot_file, replace=replace)
+            except SnapshotError as e:
+                raise click.ClickException(str(e))
+            print(f"✅ {sum(counts.values())} rijen in {len(counts)} tabellen teruggezet in {time.perf_counter() - started:.1f} s.")
+
+        # --- Achtergrondtaken (zie jobs.py) ---
+        @app.cli.group("jobs")
+        def jobs_group():
+            """Achtergrondtaken: worker starten en taken inplannen."""
+
+        @jobs_group.command("worker")
+        @click.option('--threads', default=2, show_default=True, envvar='JOB_WORKER_THREADS', help="Aantal taken tegelijk.")
+        @click.option('--once', is_flag=True, help="Voer de wachtende taken uit en stop.")
+        def jobs_worker_command(threads, once):
+            """Voert taken uit de wachtrij uit tot SIGTERM/Ctrl+C."""
+            import signal
+            from jobs import JobWorker
+            worker = JobWorker(app, threads=threads)
+            if once:
+                print(f"✅ {worker.run_pending()} taken uitgevoerd.")
+                return
+            signal.signal(signal.SIGTERM, lambda signum, frame: worker.request_stop())
+            print(f"Jobworker {worker.name} gestart met {threads} thread(s).")
+            worker.start()
+            try:
+                worker.join()
+            except KeyboardInterrupt:
+                worker.request_stop()
+                worker.join()
+
+        @jobs_group.command("enqueue")
+        @click.argument('kind')
+        @click.option('--param', 'params', multiple=True, metavar='NAAM=WAARDE', help="Parameter (waarde als JSON of tekst).")
+        def jobs_enqueue_command(kind, params):
+            """Plant een taak in, bv. `flask jobs enqueue recompute-costs --param missing=true`."""
+            from jobs import InvalidJobError, enqueue
+            values = {}
+            for param in params:
+                name, _, value = param.partition('=')
+                try:
+                    values[name] = json.loads(value)
+                except ValueError:
+                    values[name] = value
+            try:
+                job = enqueue(kind, values)
+            except InvalidJobError as e:
+                raise click.ClickException(str(e))
+            db.session.commit()
+            print(f"✅ Taak #{job.id} ({kind}) ingepland.")
 
     return app
 app = create_app()
@@ -0,0 +1,177 @@
+# benchmark.py
+"""
+Tijdmetingen van de zwaarste pagina's en API's via de Flask-testclient.
+
+Bedoeld om tegen een (synthetische) SQLite-catalogus te draaien, zie
+catalog_generator.py. Het resultaat is JSON, zodat opeenvolgende runs met
+compare_results naast elkaar gelegd kunnen worden.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import event, func, select
+from extensions import db
+from models import Product, Dish, Ingredient
+
+
+def _benchmark_targets(session):
+    """De te meten requests: (naam, methode, url, formulierdata)."""
+    # Het eindgerecht met de meeste ingrediënten en de grootste productcategorie
+    dish_id = session.scalar(
+        select(Ingredient.parent_dish_id)
+        .join(Dish, Dish.id == Ingredient.parent_dish_id)
+        .where(Dish.is_preparation.is_(False))
+        .group_by(Ingredient.parent_dish_id)
+        .order_by(func.count().desc(), Ingredient.parent_dish_id)
+        .limit(1)
+    )
+    category_id = session.scalar(
+        select(Product.category_id).group_by(Product.category_id).order_by(func.count().desc(), Product.category_id).limit(1)
+    )
+    targets = [
+        ('index', 'GET', url_for('index'), None),
+        ('manage_dishes', 'GET', url_for('dishes.manage_dishes'), None),
+        ('manage_preparations', 'GET', url_for('preparations.manage_preparations'), None),
+        ('top_dishes_api', 'GET', url_for('top_dishes_api', count=10), None),
+        ('get_products_by_category_json', 'GET', url_for('products.get_products_by_category_json', category_id=category_id), None),
+    ]
+    if dish_id is not None:
+        dish = session.get(Dish, dish_id)
+        # Het bestaande recept ongewijzigd terugsturen: meet een volledige save zonder de data te veranderen
+        form = {
+            'dish_name': dish.name,
+            'profit_type': dish.profit_type,
+            'profit_value': str(dish.profit_value),
+            'dish_category': str(dish.dish_category_id or ''),
+            'ingredient_type[]': [], 'ingredient_id[]': [], 'quantity[]': [],
+        }
+        for ing in dish.ingredients:
+            form['ingredient_type[]'].append('product' if ing.product_id else 'preparation')
+            form['ingredient_id[]'].append(str(ing.product_id or ing.preparation_id))
+            form['quantity[]'].append(str(ing.quantity))
+        url = url_for('dishes.edit_dish', dish_id=dish_id)
+        targets += [('edit_dish_get', 'GET', url, None), ('edit_dish_post', 'POST', url, form)]
+    return targets
+
+
+def _summary(timings, statements):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, round(0.95 * (len(timings) - 1)))]
+    return {
+        'rounds': len(timings),
+        'min_ms': round(timings[0] * 1000, 3),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'max_ms': round(timings[-1] * 1000, 3),
+        'sql_statements': statements,
+    }
+
+
+def run_benchmarks(app, rounds=5, warmup=1, only=None):
+    """
+    Meet elke request `rounds` keer na `warmup` opwarmrondes en geeft het resultaat als
+    dict terug. CSRF wordt tijdens de meting uitgeschakeld voor de POST van edit_dish.
+    """
+    session = db.session
+    with app.test_request_context():
+        targets = _benchmark_targets(session)
+    if only:
+        targets = [t for t in targets if t[0] in only]
+    counts = {
+        'products': session.scalar(select(func.count(Product.id))),
+        'dishes': session.scalar(select(func.count(Dish.id)).where(Dish.is_preparation.is_(False))),
+        'preparations': session.scalar(select(func.count(Dish.id)).where(Dish.is_preparation.is_(True))),
+        'ingredients': session.scalar(select(func.count(Ingredient.id))),
+    }
+    session.remove()
+
+    statements = [0]
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    csrf_enabled = app.config.get('WTF_CSRF_ENABLED', True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    results = {}
+    try:
+        client = app.test_client()
+        for name, method, url, form in targets:
+            timings, status = [], None
+            for round_ in range(warmup + rounds):
+                statements[0] = 0
+                start = time.perf_counter()
+                response = client.open(url, method=method, data=form)
+                elapsed = time.perf_counter() - start
+                status = response.status_code
+                if round_ >= warmup:
+                    timings.append(elapsed)
+            results[name] = dict(_summary(timings, statements[0]), method=method, url=url, status=status)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+        app.config['WTF_CSRF_ENABLED'] = csrf_enabled
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'database': db.engine.dialect.name,
+        'python': platform.python_version(),
+        'catalog': counts,
+        'results': results,
+    }
+
+
+def compare_results(previous, current):
+    """Verschil in mediane duur per request tussen twee benchmarkresultaten."""
+    rows = []
+    for name, result in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        ratio = result['median_ms'] / before['median_ms'] if before and before['median_ms'] else None
+        rows.append({
+            'name': name,
+            'previous_ms': before['median_ms'] if before else None,
+            'current_ms': result['median_ms'],
+            'ratio': round(ratio, 3) if ratio is not None else None,
+        })
+    return rows
+
+
+# Bibliotheken die enkel voor CLI-commando's of zeldzame requests nodig zijn
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'redis')
+
+_STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+seconds = time.perf_counter() - start
+print(json.dumps({
+    'seconds': seconds,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': sorted(name for name in %r if name in sys.modules),
+}))
+"""
+
+
+def measure_startup(rounds=3):
+    """
+    Koude start van een worker: `import app` (dus ook create_app) in een vers
+    Python-proces, zoals gunicorn het doet. Mediaan van de duur en het geheugen.
+    """
+    results = []
+    for _ in range(rounds):
+        output = subprocess.run(
+            [sys.executable, '-c', _STARTUP_SCRIPT % (HEAVY_MODULES,)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'seconds': statistics.median(r['seconds'] for r in results),
+        'max_rss_mb': statistics.median(r['max_rss_mb'] for r in results),
+        'modules': results[-1]['modules'],
+    }
@@ -0,0 +1,191 @@
+# bom_matrix.py
+import numpy as np
+from sqlalchemy import select
+from extensions import db
+from models import Product, Dish, Ingredient, RecipeClosure
+from cost_engine import CostCycleError, DishCost, unit_price
+
+
+class BomMatrix:
+    """
+    De ingrediëntentabel als ijle (COO) hoeveelheidsmatrices:
+
+    - A (gerecht x gerecht): hoeveelheid bereiding j per eenheid van gerecht i
+    - B (gerecht x product): hoeveelheid product p per eenheid van gerecht i
+
+    Rijen van bereidingen zijn, net als in Dish.cost_price_calculated, gedeeld door
+    yield_quantity. Het volledig uitgesplitste productverbruik is dan X = (I - A)^-1 B,
+    en de kostprijs van alle gerechten één matrix-vectorproduct X @ prijzen.
+    """
+
+    def __init__(self, dish_ids, product_ids, is_preparation, profit_type, profit_value, prep_coo, product_coo, base_prices):
+        self.dish_ids = dish_ids
+        self.product_ids = product_ids
+        self.dish_index = {dish_id: i for i, dish_id in enumerate(dish_ids)}
+        self.product_index = {product_id: i for i, product_id in enumerate(product_ids)}
+        self.is_preparation = is_preparation
+        self.profit_type = profit_type
+        self.profit_value = profit_value
+        self.prep_coo = prep_coo        # (rijen, kolommen, waarden) van A
+        self.product_coo = product_coo  # (rijen, kolommen, waarden) van B
+        self.base_prices = base_prices  # huidige eenheidsprijs per product
+        self._exploded = None
+
+    @classmethod
+    def load(cls, session=None, dish_ids=None):
+        """
+        Bouwt de matrices op uit drie bulk-queries. Met `dish_ids` enkel die gerechten,
+        de bereidingen en producten in hun recipe_closure, en hun ingrediënten.
+        """
+        session = session or db.session
+        product_query = select(Product.id, Product.package_price, Product.package_weight).order_by(Product.id)
+        dish_query = select(Dish.id, Dish.is_preparation, Dish.yield_quantity, Dish.profit_type, Dish.profit_value).order_by(Dish.id)
+        ingredient_query = select(Ingredient.parent_dish_id, Ingredient.product_id, Ingredient.preparation_id, Ingredient.quantity)
+        if dish_ids is not None:
+            closure = select(RecipeClosure.product_id, RecipeClosure.preparation_id).where(RecipeClosure.ancestor_dish_id.in_(dish_ids))
+            in_scope = Dish.id.in_(dish_ids) | Dish.id.in_(closure.with_only_columns(RecipeClosure.preparation_id))
+            product_query = product_query.where(Product.id.in_(closure.with_only_columns(RecipeClosure.product_id)))
+            dish_query = dish_query.where(in_scope)
+            ingredient_query = ingredient_query.where(Ingredient.parent_dish_id.in_(select(Dish.id).where(in_scope)))
+        products = session.execute(product_query).all()
+        dishes = session.execute(dish_query).all()
+        ingredients = session.execute(ingredient_query).all()
+
+        dish_ids = [row.id for row in dishes]
+        product_ids = [row.id for row in products]
+        dish_index = {dish_id: i for i, dish_id in enumerate(dish_ids)}
+        product_index = {product_id: i for i, product_id in enumerate(product_ids)}
+
+        # Schaalfactor per rij: 1/yield voor bereidingen, 0 als de opbrengst ontbreekt
+        row_scale = np.ones(len(dishes))
+        for i, row in enumerate(dishes):
+            if row.is_preparation:
+                row_scale[i] = 1 / row.yield_quantity if row.yield_quantity and row.yield_quantity > 0 else 0
+
+        prep_entries, product_entries = [], []
+        for row in ingredients:
+            parent = dish_index.get(row.parent_dish_id)
+            if parent is None:
+                continue
+            if row.product_id is not None and row.product_id in product_index:
+                product_entries.append((parent, product_index[row.product_id], row.quantity))
+            elif row.preparation_id is not None and row.preparation_id in dish_index:
+                prep_entries.append((parent, dish_index[row.preparation_id], row.quantity))
+
+        return cls(
+            dish_ids,
+            product_ids,
+            is_preparation=np.array([bool(row.is_preparation) for row in dishes], dtype=bool),
+            profit_type=np.array([row.profit_type or '' for row in dishes]),
+            profit_value=np.array([row.profit_value or 0 for row in dishes], dtype=float),
+            prep_coo=_scaled_coo(prep_entries, row_scale),
+            product_coo=_scaled_coo(product_entries, row_scale),
+            base_prices=np.array([unit_price(row.package_price, row.package_weight) for row in products], dtype=float),
+        )
+
+    def exploded_usage(self):
+        """
+        X = (I - A)^-1 B als COO-triplet (gerecht-index, product-index, hoeveelheid).
+        Berekend als B + AB + A²B + ... : de reeks stopt vanzelf na de diepste nesting.
+        """
+        if self._exploded is None:
+            rows, cols, vals = self.product_coo
+            total = [(rows, cols, vals)]
+            level = self.product_coo
+            for _ in range(len(self.dish_ids)):
+                level = _coo_matmul(self.prep_coo, level, len(self.product_ids))
+                if len(level[0]) == 0:
+                    break
+                total.append(level)
+            else:
+                if len(level[0]):
+                    raise CostCycleError("De receptenboom bevat een cyclus tussen bereidingen.")
+            self._exploded = _coo_sum(
+                np.concatenate([t[0] for t in total]),
+                np.concatenate([t[1] for t in total]),
+                np.concatenate([t[2] for t in total]),
+                len(self.product_ids),
+            )
+        return self._exploded
+
+    def cost_vector(self, prices=None):
+        """Kostprijs per gerecht (per eenheid voor bereidingen) voor een prijsvector per product."""
+        prices = self.base_prices if prices is None else prices
+        rows, cols, vals = self.exploded_usage()
+        return np.bincount(rows, weights=vals * prices[cols], minlength=len(self.dish_ids))
+
+    def cost_matrix(self, price_matrix, chunk_size=64):
+        """
+        Kostprijzen voor meerdere prijsscenario's tegelijk: X @ P met P (producten x scenario's).
+        Scenario's worden per blok verwerkt zodat het geheugengebruik begrensd blijft.
+        """
+        rows, cols, vals = self.exploded_usage()
+        result = np.zeros((len(self.dish_ids), price_matrix.shape[1]))
+        if len(rows) == 0:
+            return result
+        # exploded_usage() is gesorteerd op rij, dus reduceat telt per gerecht op
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        for start in range(0, price_matrix.shape[1], chunk_size):
+            block = price_matrix[:, start:start + chunk_size]
+            result[rows[starts], start:start + block.shape[1]] = np.add.reduceat(vals[:, None] * block[cols], starts, axis=0)
+        return result
+
+    def selling_price_vector(self, costs):
+        """Verkoopprijs volgens profit_type/profit_value; 0 voor bereidingen."""
+        factor = np.where(
+            self.profit_type == 'percentage', 1 + self.profit_value / 100,
+            np.where(self.profit_type == 'multiplier', self.profit_value, 1.0),
+        )
+        if costs.ndim == 2:
+            factor = factor[:, None]
+            return np.where(self.is_preparation[:, None], 0.0, costs * factor)
+        return np.where(self.is_preparation, 0.0, costs * factor)
+
+    def evaluate(self, prices=None):
+        """Zelfde resultaat als CostGraph.evaluate(): DishCost per dish_id, in één gevectoriseerde stap."""
+        costs = self.cost_vector(prices)
+        selling = self.selling_price_vector(costs)
+        return {
+            dish_id: DishCost(float(costs[i]), float(selling[i]))
+            for i, dish_id in enumerate(self.dish_ids)
+        }
+
+
+def _scaled_coo(entries, row_scale):
+    if not entries:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    rows, cols, vals = (np.array(column) for column in zip(*entries))
+    rows = rows.astype(np.int64)
+    cols = cols.astype(np.int64)
+    return _coo_sum(rows, cols, vals.astype(float) * row_scale[rows], None)
+
+
+def _coo_sum(rows, cols, vals, n_cols):
+    """Telt dubbele (rij, kolom)-posities op en laat nullen weg."""
+    if len(rows) == 0:
+        return rows, cols, vals
+    n_cols = n_cols or int(cols.max()) + 1
+    keys, inverse = np.unique(rows * n_cols + cols, return_inverse=True)
+    sums = np.bincount(inverse, weights=vals)
+    keep = sums != 0
+    keys, sums = keys[keep], sums[keep]
+    return keys // n_cols, keys % n_cols, sums
+
+
+def _coo_matmul(left, right, n_cols):
+    """Ijl product left @ right van twee COO-matrices, volledig in NumPy."""
+    l_rows, l_cols, l_vals = left
+    r_rows, r_cols, r_vals = right
+    if len(l_rows) == 0 or len(r_rows) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    order = np.argsort(r_rows, kind='stable')
+    r_rows, r_cols, r_vals = r_rows[order], r_cols[order], r_vals[order]
+    starts = np.searchsorted(r_rows, l_cols, side='left')
+    counts = np.searchsorted(r_rows, l_cols, side='right') - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    left_pos = np.repeat(np.arange(len(l_rows)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    right_pos = np.repeat(starts, counts) + offsets
+    return _coo_sum(l_rows[left_pos], r_cols[right_pos], l_vals[left_pos] * r_vals[right_pos], n_cols)
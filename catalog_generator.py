@@ -0,0 +1,167 @@
+# catalog_generator.py
+"""
+Synthetische catalogus op schaal, in hetzelfde schema als models.py.
+
+Bedoeld voor benchmarks (zie benchmark.py) en om het gedrag van de app bij
+tienduizenden producten en gerechten te bekijken. Alles wordt met bulk-INSERTs
+weggeschreven; met dezelfde seed ontstaat telkens dezelfde catalogus.
+"""
+import random
+from datetime import datetime
+from sqlalchemy import func, select, text
+from extensions import db
+from models import Category, Supplier, Product, DishCategory, PreparationCategory, Dish, Ingredient
+from cost_engine import refresh_all_costs
+from recipe_closure import rebuild_closure
+from price_history import record_prices
+
+INSERT_BATCH_SIZE = 5000
+
+PACKAGE_UNITS = ('Kg', 'L', 'Stuks')
+YIELD_UNITS = ('Kg', 'L', 'Stuks')
+
+
+class CatalogNotEmptyError(RuntimeError):
+    """De database bevat al producten; de generator vult enkel een lege catalogus."""
+
+
+def _insert(session, table, rows):
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        session.execute(table.insert(), rows[start:start + INSERT_BATCH_SIZE])
+
+
+def _reset_sequences(session):
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('category', 'supplier', 'product', 'dish_category', 'preparation_category', 'dish', 'ingredient'):
+        session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 1)) FROM {table};"))
+
+
+def _ingredients(rng, parent_id, product_ids, preparation_ids, count, required_preparation=None):
+    """Ingrediëntrijen voor één gerecht: unieke producten, een paar bereidingen."""
+    rows = []
+    if required_preparation is not None:
+        rows.append({'parent_dish_id': parent_id, 'product_id': None, 'preparation_id': required_preparation,
+                     'quantity': round(rng.uniform(0.05, 0.5), 3)})
+    if preparation_ids:
+        for prep_id in rng.sample(preparation_ids, min(len(preparation_ids), rng.randint(0, 2))):
+            if prep_id != required_preparation:
+                rows.append({'parent_dish_id': parent_id, 'product_id': None, 'preparation_id': prep_id,
+                             'quantity': round(rng.uniform(0.05, 0.5), 3)})
+    for product_id in rng.sample(product_ids, max(count - len(rows), 1)):
+        rows.append({'parent_dish_id': parent_id, 'product_id': product_id, 'preparation_id': None,
+                     'quantity': round(rng.uniform(0.01, 0.4), 3)})
+    return rows
+
+
+def _profit(rng):
+    # 'percentage' verwacht een opslag in procent, 'multiplier' een factor
+    if rng.random() < 0.5:
+        return {'profit_type': 'percentage', 'profit_value': rng.choice((150, 200, 250, 300))}
+    return {'profit_type': 'multiplier', 'profit_value': rng.choice((2.5, 3, 3.5, 4))}
+
+
+def generate_catalog(products=50000, suppliers=200, categories=40, dishes=10000, preparations=2000,
+                     depth=6, dish_categories=25, ingredients=(4, 12), seed=42, session=None):
+    """
+    Maakt een catalogus aan met de gevraagde aantallen en geeft de aantallen per tabel terug.
+
+    Bereidingen worden over `depth` niveaus verdeeld: een bereiding op niveau n gebruikt
+    altijd minstens één bereiding van niveau n-1, zodat de diepste eindgerechten precies
+    `depth` niveaus nesting hebben. Op het einde worden alle kostprijzen berekend en
+    opgeslagen, net als na `flask recompute-costs`.
+    """
+    session = session or db.session
+    if session.scalar(select(func.count(Product.id))):
+        raise CatalogNotEmptyError("De database bevat al producten. Gebruik een lege database voor een synthetische catalogus.")
+    if depth < 1 or preparations < depth:
+        raise ValueError("Er zijn minstens evenveel bereidingen als nestingniveaus nodig.")
+    rng = random.Random(seed)
+    min_ingredients, max_ingredients = ingredients
+
+    category_rows = [{'id': i, 'name': f"Categorie {i:03d}"} for i in range(1, categories + 1)]
+    supplier_rows = [{'id': i, 'name': f"Leverancier {i:04d}"} for i in range(1, suppliers + 1)]
+    dish_category_rows = [{'id': i, 'name': f"Gerechtcategorie {i:03d}"} for i in range(1, dish_categories + 1)]
+    prep_category_rows = [{'id': i, 'name': f"Bereidingscategorie {i:02d}"} for i in range(1, depth + 1)]
+
+    product_rows = []
+    for i in range(1, products + 1):
+        supplier_id = rng.randint(1, suppliers)
+        product_rows.append({
+            'id': i,
+            'name': f"Product {i:06d}",
+            'category_id': rng.randint(1, categories),
+            'supplier_id': supplier_id,
+            'article_number': f"{supplier_id:04d}-{i:06d}",
+            'package_weight': rng.choice((1, 2.5, 5, 10, 12, 25)),
+            'package_unit': rng.choice(PACKAGE_UNITS),
+            'package_price': round(rng.uniform(0.5, 120), 2),
+        })
+    product_ids = [row['id'] for row in product_rows]
+
+    # Bereidingen per niveau; ids direct na de eindgerechten
+    dish_rows, ingredient_rows = [], []
+    levels = [[] for _ in range(depth)]
+    next_id = dishes + 1
+    for n in range(preparations):
+        level = n % depth if n < depth else rng.randrange(depth)
+        dish_id = next_id
+        next_id += 1
+        dish_rows.append({
+            'id': dish_id, 'name': f"Bereiding {n + 1:05d}", 'is_preparation': True,
+            'preparation_category_id': level + 1, 'dish_category_id': None,
+            'yield_quantity': rng.choice((0.5, 1, 2, 2.5, 5)), 'yield_unit': rng.choice(YIELD_UNITS),
+            'profit_type': 'percentage', 'profit_value': 0,
+        })
+        levels[level].append(dish_id)
+    for level, prep_ids in enumerate(levels):
+        lower = levels[level - 1] if level else []
+        shallower = [p for lvl in levels[:max(level - 1, 0)] for p in lvl]
+        for dish_id in prep_ids:
+            ingredient_rows += _ingredients(
+                rng, dish_id, product_ids, shallower, rng.randint(min_ingredients, max_ingredients),
+                required_preparation=rng.choice(lower) if lower else None,
+            )
+
+    all_preparations = [p for lvl in levels for p in lvl]
+    for dish_id in range(1, dishes + 1):
+        dish_rows.append({
+            'id': dish_id, 'name': f"Gerecht {dish_id:05d}", 'is_preparation': False,
+            'preparation_category_id': None, 'dish_category_id': rng.randint(1, dish_categories),
+            'yield_quantity': None, 'yield_unit': None,
+            **_profit(rng),
+        })
+        # Een deel van de gerechten hangt aan de diepste bereidingen: dat is de volle nestingdiepte
+        deepest = rng.choice(levels[-1]) if dish_id % 10 == 0 else None
+        ingredient_rows += _ingredients(
+            rng, dish_id, product_ids, all_preparations, rng.randint(min_ingredients, max_ingredients),
+            required_preparation=deepest,
+        )
+
+    _insert(session, Category.__table__, category_rows)
+    _insert(session, Supplier.__table__, supplier_rows)
+    _insert(session, DishCategory.__table__, dish_category_rows)
+    _insert(session, PreparationCategory.__table__, prep_category_rows)
+    _insert(session, Product.__table__, product_rows)
+    _insert(session, Dish.__table__, sorted(dish_rows, key=lambda row: row['id']))
+    _insert(session, Ingredient.__table__, ingredient_rows)
+    _reset_sequences(session)
+    record_prices(
+        [{'product_id': row['id'], 'package_price': row['package_price'], 'package_weight': row['package_weight']} for row in product_rows],
+        valid_from=datetime.utcnow(), session=session,
+    )
+    rebuild_closure(session=session)
+    refresh_all_costs(session=session)
+    session.commit()
+
+    return {
+        'categories': len(category_rows),
+        'suppliers': len(supplier_rows),
+        'products': len(product_rows),
+        'dish_categories': len(dish_category_rows),
+        'dishes': dishes,
+        'preparations': preparations,
+        'ingredients': len(ingredient_rows),
+        'depth': depth,
+        'seed': seed,
+    }
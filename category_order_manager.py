@@ -1,19 +1,83 @@
-# category_order_manager.py
-import json
-
-ORDER_FILE = 'category_order.json'
-
-def load_category_order():
-    """Laadt de sorteervolgorde van categorieën uit een JSON-bestand."""
-    try:
-        with open(ORDER_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # Retourneer een standaardstructuur als het bestand niet bestaat of corrupt is
-        return {'dishes': [], 'products': []}
-
-def save_category_order(order_data):
-    """Slaat de sorteervolgorde van categorieën op in een JSON-bestand."""
-    with open(ORDER_FILE, 'w') as f:
-        json.dump(order_data, f, indent=4)
-
+# category_order_manager.py
+"""
+Sorteervolgorde van de categorieën op het dashboard.
+
+De volgorde staat in de tabel category_order, zodat alle workers en hosts dezelfde
+zien en gelijktijdige opslagen elkaar niet corrumperen. Elke worker houdt de
+volgorde in het geheugen en leest ze pas opnieuw als de dataversie 'category_order'
+gestegen is; dat kost per request één kleine query in plaats van een bestand parsen.
+Zolang een soort nog niet in de database staat, geldt category_order.json als standaard.
+"""
+import json
+import threading
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import CategoryOrder, DataVersion
+from data_version import CATEGORY_ORDER
+
+ORDER_FILE = 'category_order.json'
+ORDER_TYPES = ('dishes', 'products')
+
+_cache = {'version': None, 'orders': None}
+_cache_lock = threading.Lock()
+
+
+def _default_order():
+    """De oorspronkelijke volgorde uit het JSON-bestand, indien aanwezig."""
+    try:
+        with open(ORDER_FILE, 'r') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        data = {}
+    return {kind: list(data.get(kind, [])) for kind in ORDER_TYPES}
+
+
+def _order_version(session):
+    return session.scalar(select(DataVersion.version).where(DataVersion.scope == CATEGORY_ORDER)) or 0
+
+
+def load_category_order(session=None, version=None):
+    """
+    Laadt de sorteervolgorde van categorieën ({'dishes': [...], 'products': [...]}).
+    Wie de dataversie 'category_order' al kent (zie current_versions), geeft ze mee als
+    `version` en spaart zo de versiequery uit.
+    """
+    session = session or db.session
+    if version is None:
+        version = _order_version(session)
+    with _cache_lock:
+        if _cache['version'] == version:
+            return {kind: list(names) for kind, names in _cache['orders'].items()}
+    orders = _default_order()
+    for row in session.scalars(select(CategoryOrder)):
+        if row.kind in orders:
+            orders[row.kind] = list(row.names or [])
+    with _cache_lock:
+        _cache['version'] = version
+        _cache['orders'] = orders
+    return {kind: list(names) for kind, names in orders.items()}
+
+
+def save_category_order(order_type, names, session=None):
+    """
+    Slaat de volgorde van één soort op en commit. De dataversie stijgt in dezelfde
+    transactie, zodat de andere workers bij hun volgende request de nieuwe volgorde lezen.
+    """
+    if order_type not in ORDER_TYPES:
+        raise ValueError(f"Onbekende soort '{order_type}'.")
+    session = session or db.session
+    for attempt in range(2):
+        row = session.get(CategoryOrder, order_type)
+        if row is None:
+            session.add(CategoryOrder(kind=order_type, names=list(names)))
+        else:
+            row.names = list(names)
+        try:
+            session.commit()
+            return
+        except IntegrityError:
+            # Een andere worker maakte de rij net aan: opnieuw, nu als update
+            session.rollback()
+            if attempt:
+                raise
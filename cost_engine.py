@@ -0,0 +1,314 @@
+# cost_engine.py
+from collections import namedtuple
+from flask import g, has_app_context
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from extensions import db
+from metrics import COST_ENGINE
+# Module-import i.p.v. 'from models import ...': models.py gebruikt deze module zelf.
+import models
+
+# Maximaal aantal ids per IN-clausule (SQLite heeft een limiet op het aantal parameters).
+IN_CHUNK_SIZE = 500
+
+# Resultaat per gerecht/bereiding. Voor een bereiding is cost_price de prijs per yield_unit.
+DishCost = namedtuple('DishCost', ['cost_price', 'selling_price'])
+
+DishNode = namedtuple('DishNode', ['is_preparation', 'yield_quantity', 'profit_type', 'profit_value'])
+IngredientEdge = namedtuple('IngredientEdge', ['product_id', 'preparation_id', 'quantity'])
+
+
+class CostCycleError(ValueError):
+    """Een bereiding gebruikt (onrechtstreeks) zichzelf als ingrediënt."""
+
+
+def unit_price(package_price, package_weight):
+    """Zelfde regel als Product.unit_price_calculated, maar op ruwe kolomwaarden."""
+    if package_price is None or package_weight is None or package_weight == 0:
+        return 0
+    return package_price / package_weight
+
+
+def selling_price(cost, profit_type, profit_value):
+    """Zelfde regel als Dish.selling_price_calculated voor een eindgerecht."""
+    if profit_type == 'percentage':
+        return cost * (1 + profit_value / 100)
+    elif profit_type == 'multiplier':
+        return cost * profit_value
+    return cost
+
+
+class CostGraph:
+    """
+    De volledige receptenboom (gerechten, bereidingen en producten) in het geheugen.
+    Wordt met een paar bulk-queries geladen en daarna in topologische volgorde
+    geëvalueerd, zodat elke bereiding maar één keer berekend wordt.
+    """
+
+    def __init__(self, product_prices, dishes, ingredients):
+        self.product_prices = product_prices  # product_id -> eenheidsprijs
+        self.dishes = dishes                  # dish_id -> DishNode
+        self.ingredients = ingredients        # dish_id -> [IngredientEdge]
+        self._costs = {}
+
+    @classmethod
+    @COST_ENGINE.labels('load_graph').time()
+    def load(cls, session=None):
+        """Laadt de tabellen product, dish en ingredient in drie queries."""
+        session = session or db.session
+        product_prices = {
+            row.id: unit_price(row.package_price, row.package_weight)
+            for row in session.execute(select(models.Product.id, models.Product.package_price, models.Product.package_weight))
+        }
+        dishes = {
+            row.id: DishNode(row.is_preparation, row.yield_quantity, row.profit_type, row.profit_value)
+            for row in session.execute(select(models.Dish.id, models.Dish.is_preparation, models.Dish.yield_quantity, models.Dish.profit_type, models.Dish.profit_value))
+        }
+        ingredients = {}
+        for row in session.execute(select(models.Ingredient.parent_dish_id, models.Ingredient.product_id, models.Ingredient.preparation_id, models.Ingredient.quantity)):
+            ingredients.setdefault(row.parent_dish_id, []).append(
+                IngredientEdge(row.product_id, row.preparation_id, row.quantity)
+            )
+        return cls(product_prices, dishes, ingredients)
+
+    @classmethod
+    def load_subgraph(cls, dish_ids, session=None):
+        """
+        Laadt enkel de opgegeven gerechten/bereidingen. Onderliggende bereidingen die
+        niet herberekend moeten worden, komen uit hun opgeslagen kostprijs; ontbreekt
+        die, dan worden ze mee in de deelgraaf opgenomen.
+        """
+        session = session or db.session
+        Dish, Ingredient, Product = models.Dish, models.Ingredient, models.Product
+        dishes, ingredients, known_costs = {}, {}, {}
+        pending = set(dish_ids)
+        while pending:
+            for chunk in _chunks(pending):
+                for row in session.execute(select(Dish.id, Dish.is_preparation, Dish.yield_quantity, Dish.profit_type, Dish.profit_value).where(Dish.id.in_(chunk))):
+                    dishes[row.id] = DishNode(row.is_preparation, row.yield_quantity, row.profit_type, row.profit_value)
+                for row in session.execute(select(Ingredient.parent_dish_id, Ingredient.product_id, Ingredient.preparation_id, Ingredient.quantity).where(Ingredient.parent_dish_id.in_(chunk))):
+                    ingredients.setdefault(row.parent_dish_id, []).append(
+                        IngredientEdge(row.product_id, row.preparation_id, row.quantity)
+                    )
+            children = {
+                edge.preparation_id
+                for edges in ingredients.values() for edge in edges
+                if edge.preparation_id is not None
+            } - dishes.keys() - known_costs.keys()
+            pending = set()
+            for chunk in _chunks(children):
+                for row in session.execute(select(Dish.id, Dish.cost_price_cached).where(Dish.id.in_(chunk))):
+                    if row.cost_price_cached is None:
+                        pending.add(row.id)
+                    else:
+                        known_costs[row.id] = DishCost(row.cost_price_cached, 0)
+
+        product_ids = {
+            edge.product_id
+            for edges in ingredients.values() for edge in edges
+            if edge.product_id is not None
+        }
+        product_prices = {}
+        for chunk in _chunks(product_ids):
+            for row in session.execute(select(Product.id, Product.package_price, Product.package_weight).where(Product.id.in_(chunk))):
+                product_prices[row.id] = unit_price(row.package_price, row.package_weight)
+
+        graph = cls(product_prices, dishes, ingredients)
+        graph._costs.update(known_costs)
+        return graph
+
+    def evaluate(self, dish_ids=None):
+        """
+        Berekent kostprijs en verkoopprijs voor de gevraagde gerechten (standaard allemaal).
+        Tussenresultaten blijven bewaard, dus herhaalde aanroepen zijn goedkoop.
+        """
+        if dish_ids is None:
+            dish_ids = self.dishes.keys()
+        results = {}
+        for dish_id in dish_ids:
+            if dish_id not in self.dishes:
+                continue
+            if dish_id not in self._costs:
+                self._evaluate_from(dish_id)
+            results[dish_id] = self._costs[dish_id]
+        return results
+
+    def _evaluate_from(self, root_id):
+        # Iteratieve post-order DFS: diep geneste sauzen en basissen lopen zo niet
+        # tegen de recursielimiet van Python aan.
+        in_progress = {root_id}
+        stack = [(root_id, iter(self.ingredients.get(root_id, ())))]
+        while stack:
+            dish_id, edges = stack[-1]
+            child_id = None
+            for edge in edges:
+                prep_id = edge.preparation_id
+                if prep_id is None or prep_id in self._costs or prep_id not in self.dishes:
+                    continue
+                if prep_id in in_progress:
+                    raise CostCycleError(f"Bereiding {prep_id} gebruikt zichzelf als ingrediënt.")
+                child_id = prep_id
+                break
+            if child_id is not None:
+                in_progress.add(child_id)
+                stack.append((child_id, iter(self.ingredients.get(child_id, ()))))
+                continue
+            stack.pop()
+            in_progress.discard(dish_id)
+            self._costs[dish_id] = self._dish_cost(dish_id)
+
+    def _edge_unit_cost(self, edge):
+        if edge.product_id is not None:
+            return self.product_prices.get(edge.product_id, 0)
+        if edge.preparation_id is not None and edge.preparation_id in self._costs:
+            return self._costs[edge.preparation_id].cost_price
+        return 0
+
+    def _dish_cost(self, dish_id):
+        node = self.dishes[dish_id]
+        total_ingredient_cost = sum(self._edge_unit_cost(edge) * edge.quantity for edge in self.ingredients.get(dish_id, ()))
+        if node.is_preparation:
+            if node.yield_quantity and node.yield_quantity > 0:
+                return DishCost(total_ingredient_cost / node.yield_quantity, 0)
+            return DishCost(0, 0)
+        return DishCost(total_ingredient_cost, selling_price(total_ingredient_cost, node.profit_type, node.profit_value))
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[start:start + IN_CHUNK_SIZE]
+
+
+def dependent_dishes(product_ids=(), dish_ids=(), session=None):
+    """
+    Geeft alle gerechten en bereidingen terug die de gewijzigde producten of bereidingen
+    (onrechtstreeks) gebruiken, inclusief de opgegeven dish_ids zelf. Leest de
+    transitieve sluiting (recipe_closure): één geïndexeerde lookup per soort.
+    """
+    session = session or db.session
+    RecipeClosure = models.RecipeClosure
+    affected = set(dish_ids)
+    for column, ids in ((RecipeClosure.product_id, product_ids), (RecipeClosure.preparation_id, dish_ids)):
+        for chunk in _chunks(ids):
+            affected.update(session.scalars(select(RecipeClosure.ancestor_dish_id).where(column.in_(chunk)).distinct()))
+    return affected
+
+
+def store_costs(costs, session=None):
+    """Schrijft berekende kosten in één bulk-UPDATE weg naar de gecachte kolommen."""
+    session = session or db.session
+    if costs:
+        session.execute(update(models.Dish), [
+            {
+                'id': dish_id,
+                'cost_price_cached': cost.cost_price,
+                'selling_price_cached': cost.selling_price,
+                'profit_cached': cost.selling_price - cost.cost_price,
+            }
+            for dish_id, cost in costs.items()
+        ])
+    invalidate()
+
+
+@COST_ENGINE.labels('refresh_costs').time()
+def refresh_costs(product_ids=(), dish_ids=(), session=None):
+    """
+    Herberekent enkel de gerechten en bereidingen die afhangen van de gewijzigde
+    producten of recepten en werkt hun opgeslagen kostprijs bij in de lopende transactie.
+    Roep dit aan na het wijzigen en vóór de commit.
+    """
+    session = session or db.session
+    affected = dependent_dishes(product_ids, dish_ids, session=session)
+    if not affected:
+        return {}
+    costs = CostGraph.load_subgraph(affected, session=session).evaluate(affected)
+    store_costs(costs, session=session)
+    return costs
+
+
+@COST_ENGINE.labels('refresh_all_costs').time()
+def refresh_all_costs(missing_only=False, session=None):
+    """Herberekent alle gerechten in één keer, of enkel die zonder opgeslagen kostprijs."""
+    session = session or db.session
+    if missing_only:
+        missing = session.scalars(select(models.Dish.id).where(models.Dish.cost_price_cached.is_(None))).all()
+        return refresh_costs(dish_ids=missing, session=session)
+    # NumPy pas hier importeren: de webworkers hebben de matrixvariant niet nodig.
+    from bom_matrix import BomMatrix
+    costs = BomMatrix.load(session=session).evaluate()
+    store_costs(costs, session=session)
+    return costs
+
+
+def ranked_dishes(sort_by='cost_price', count=5, offset=0, dish_category_id=None, session=None):
+    """
+    Top-N eindgerechten op opgeslagen kostprijs of winst, aflopend gesorteerd.
+    Leest via ix_dish_ranking_* (met categorie: ix_dish_ranking_category_*) enkel de
+    gevraagde rijen in plaats van alles te sorteren.
+    Geeft (id, name, value)-rijen terug.
+    """
+    session = session or db.session
+    Dish = models.Dish
+    column = Dish.profit_cached if sort_by == 'profit' else Dish.cost_price_cached
+    query = (
+        select(Dish.id, Dish.name, column.label('value'))
+        .where(Dish.is_preparation == False, column.is_not(None))
+        .order_by(column.desc(), Dish.id)
+        .offset(max(offset, 0))
+        .limit(max(count, 0))
+    )
+    if dish_category_id:
+        query = query.where(Dish.dish_category_id == dish_category_id)
+    return session.execute(query).all()
+
+
+def current_graph():
+    """
+    Geeft de kostengraaf voor de huidige app-context terug. De graaf wordt één keer
+    per request geladen en vervalt automatisch bij elke flush naar de database.
+    """
+    graph = g.get('_cost_graph')
+    if graph is None:
+        graph = CostGraph.load()
+        g._cost_graph = graph
+    return graph
+
+
+@COST_ENGINE.labels('dish_costs').time()
+def dish_costs(dish_ids=None):
+    """
+    Kostprijs en verkoopprijs (DishCost) per dish_id voor de gevraagde gerechten.
+    Leest de opgeslagen kosten; enkel wat daar ontbreekt, wordt via de graaf berekend.
+    """
+    Dish = models.Dish
+    query = select(Dish.id, Dish.cost_price_cached, Dish.selling_price_cached)
+    if dish_ids is None:
+        rows = db.session.execute(query).all()
+    else:
+        rows = [row for chunk in _chunks(dish_ids) for row in db.session.execute(query.where(Dish.id.in_(chunk)))]
+    costs, missing = {}, []
+    for row in rows:
+        if row.cost_price_cached is None or row.selling_price_cached is None:
+            missing.append(row.id)
+        else:
+            costs[row.id] = DishCost(row.cost_price_cached, row.selling_price_cached)
+    if missing:
+        costs.update(current_graph().evaluate(missing))
+    return costs
+
+
+def invalidate():
+    """Vergeet de geladen kostengraaf zodat de volgende aanvraag opnieuw laadt."""
+    if has_app_context():
+        g.pop('_cost_graph', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_after_flush(session, flush_context):
+    invalidate()
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _invalidate_after_bulk_delete(delete_context):
+    invalidate()
@@ -0,0 +1,181 @@
+# cost_export.py
+"""
+Export van de volledige kostprijsopbouw: elk gerecht met al zijn producten, ook die
+uit (geneste) bereidingen, met hoeveelheid, eenheidsprijs en kost per regel.
+
+De rijen komen uit één query over recipe_closure met yield_per, dus op PostgreSQL via
+een server-side cursor. Zowel CSV als XLSX worden als generator weggeschreven: de
+eerste bytes vertrekken meteen en het geheugengebruik hangt niet af van de grootte
+van de catalogus. De XLSX wordt rechtstreeks als zip-stream opgebouwd (zonder
+openpyxl, dat een werkblad eerst volledig naar een tijdelijk bestand schrijft).
+"""
+import csv
+import io
+import zipfile
+from xml.sax.saxutils import escape
+from sqlalchemy import and_, select
+from extensions import db
+from models import Dish, DishCategory, Product, RecipeClosure, Supplier
+from cost_engine import unit_price
+
+HEADER = ['gerecht_id', 'gerecht', 'categorie', 'kostprijs', 'verkoopprijs', 'product_id', 'artikelnummer',
+          'product', 'leverancier', 'hoeveelheid', 'eenheid', 'eenheidsprijs', 'kost', 'diepte']
+
+YIELD_PER = 2000
+FLUSH_BYTES = 64 * 1024  # zoveel bytes bufferen vóór een chunk naar de client gaat
+XLSX_MAX_ROWS = 1048576  # limiet van Excel per werkblad; daarna volgt een nieuw blad
+
+
+def export_rows(session=None):
+    """Eén rij per (gerecht, product); gerechten zonder ingrediënten krijgen één lege regel."""
+    session = session or db.session
+    query = (
+        select(Dish.id, Dish.name, DishCategory.name, Dish.cost_price_cached, Dish.selling_price_cached,
+               Product.id, Product.article_number, Product.name, Supplier.name,
+               RecipeClosure.quantity, Product.package_unit, Product.package_price, Product.package_weight,
+               RecipeClosure.depth)
+        .select_from(Dish)
+        .outerjoin(DishCategory, Dish.dish_category_id == DishCategory.id)
+        .outerjoin(RecipeClosure, and_(RecipeClosure.ancestor_dish_id == Dish.id, RecipeClosure.product_id.is_not(None)))
+        .outerjoin(Product, RecipeClosure.product_id == Product.id)
+        .outerjoin(Supplier, Product.supplier_id == Supplier.id)
+        .where(Dish.is_preparation == False)
+        .order_by(Dish.id, RecipeClosure.depth, Product.name)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for (dish_id, dish_name, category, cost, selling, product_id, article_number, product_name, supplier,
+         quantity, unit, package_price, package_weight, depth) in session.execute(query):
+        if product_id is None:
+            yield (dish_id, dish_name, category, cost, selling) + (None,) * 9
+            continue
+        price = unit_price(package_price, package_weight)
+        yield (dish_id, dish_name, category, cost, selling, product_id, article_number, product_name, supplier,
+               quantity, unit, price, quantity * price, depth)
+
+
+def iter_csv(rows):
+    """CSV (UTF-8 met BOM voor Excel) in chunks van ongeveer FLUSH_BYTES."""
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Niet-seekbaar doel voor zipfile: bewaart de geschreven bytes tot ze opgehaald worden."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def _row(values):
+    # Bewust één lus zonder hulpfuncties: dit loopt voor elke cel van de export
+    cells = []
+    for value in values:
+        kind = type(value)
+        if value is None:
+            cells.append('<c/>')
+        elif kind is float or kind is int:
+            cells.append(f'<c><v>{value!r}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+    return '<row>' + ''.join(cells) + '</row>'
+
+
+_SHEET_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_END = '</sheetData></worksheet>'
+
+
+def _package_files(sheet_count):
+    sheets = range(1, sheet_count + 1)
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + ''.join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                  'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                  for n in sheets)
+        + '</Types>'
+    )
+    root_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    )
+    workbook = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + ''.join(f'<sheet name="Kostprijzen{"" if n == 1 else f" {n}"}" sheetId="{n}" r:id="rId{n}"/>' for n in sheets)
+        + '</sheets></workbook>'
+    )
+    workbook_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + ''.join(f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                  f'Target="worksheets/sheet{n}.xml"/>' for n in sheets)
+        + '</Relationships>'
+    )
+    return {'[Content_Types].xml': content_types, '_rels/.rels': root_rels,
+            'xl/workbook.xml': workbook, 'xl/_rels/workbook.xml.rels': workbook_rels}
+
+
+def iter_xlsx(rows, max_rows=XLSX_MAX_ROWS):
+    """
+    XLSX als stream: de werkbladen worden rij per rij in de zip gecomprimeerd en de
+    workbook-bestanden, die het aantal bladen moeten kennen, komen achteraan.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        sheet_count = 0
+        sheet = None
+        sheet_rows = max_rows
+        for row in rows:
+            if sheet_rows >= max_rows:
+                if sheet is not None:
+                    sheet.write(_SHEET_END.encode('utf-8'))
+                    sheet.close()
+                sheet_count += 1
+                sheet = archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w')
+                sheet.write((_SHEET_START + _row(HEADER)).encode('utf-8'))
+                sheet_rows = 1
+            sheet.write(_row(row).encode('utf-8'))
+            sheet_rows += 1
+            if sink.size >= FLUSH_BYTES:
+                yield sink.take()
+        if sheet is None:
+            sheet_count = 1
+            sheet = archive.open('xl/worksheets/sheet1.xml', 'w')
+            sheet.write((_SHEET_START + _row(HEADER)).encode('utf-8'))
+        sheet.write(_SHEET_END.encode('utf-8'))
+        sheet.close()
+        for name, content in _package_files(sheet_count).items():
+            archive.writestr(name, content)
+    yield sink.take()
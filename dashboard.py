@@ -0,0 +1,146 @@
+# dashboard.py
+"""
+Opbouw van het dashboard uit gecachete fragmenten.
+
+Elke categoriesectie (gerechtkaarten, producttabel) wordt apart gerenderd en in de
+fragmentcache bewaard onder de versie van die categorie. Een warme pagina haalt enkel
+de categorielijsten en versies op en plakt de fragmenten aan elkaar; enkel de secties
+waarvan een product, gerecht of de categorie zelf wijzigde, worden opnieuw geladen.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from functools import lru_cache
+from flask import current_app, get_template_attribute
+from markupsafe import Markup
+from sqlalchemy import func, select
+from extensions import db
+from models import Category, Dish, DishCategory, Ingredient, Product
+from category_order_manager import load_category_order
+from data_version import (CATEGORY_ORDER, DISH_SECTIONS, DISHES, PRODUCT_SECTIONS, PRODUCTS, current_versions,
+                          dish_section, product_section)
+from fragment_cache import cached_fragments
+
+SECTIONS_TEMPLATE = 'dashboard_sections.html'
+
+
+@lru_cache(maxsize=1)
+def _key_prefix():
+    """Sleutelprefix met een hash van de sectietemplate: een gedeelde cache toont na een deploy geen oude HTML."""
+    source, _, _ = current_app.jinja_env.loader.get_source(current_app.jinja_env, SECTIONS_TEMPLATE)
+    return 'dashboard:' + hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]
+
+
+def _custom_order(rows, preferred_names):
+    """Eerst de categorieën in de eigen volgorde, daarna de rest alfabetisch (zoals `rows`)."""
+    by_name = {row.name: row for row in rows}
+    ordered = [by_name[name] for name in preferred_names if name in by_name]
+    seen = {row.name for row in ordered}
+    return ordered + [row for row in rows if row.name not in seen]
+
+
+def _version(versions, scope):
+    return versions.get(scope, (0, None))[0]
+
+
+def _dish_fragments(categories, versions, session):
+    prefix = _key_prefix()
+    generation = _version(versions, DISH_SECTIONS)
+    keys = {}
+    for category in categories:
+        version = f'{generation}.{_version(versions, dish_section(category.id))}'
+        keys[f'{prefix}:dish-cards:{category.id}:{version}'] = ('cards', category)
+        keys[f'{prefix}:dish-options:{category.id}:{version}'] = ('options', category)
+
+    def render_missing(missing):
+        category_ids = {keys[key][1].id for key in missing}
+        dishes = defaultdict(list)
+        query = (select(Dish).where(Dish.dish_category_id.in_(category_ids), Dish.is_preparation == False)
+                 .order_by(Dish.id))
+        for dish in session.scalars(query):
+            dishes[dish.dish_category_id].append(dish)
+        cards = get_template_attribute(SECTIONS_TEMPLATE, 'dish_section')
+        options = get_template_attribute(SECTIONS_TEMPLATE, 'dish_options')
+        rendered = {}
+        for key in missing:
+            kind, category = keys[key]
+            macro = cards if kind == 'cards' else options
+            rendered[key] = str(macro(category.name, dishes[category.id]))
+        return rendered
+
+    fragments = cached_fragments(keys, render_missing)
+    return keys, fragments
+
+
+def dish_sections(order, versions, session=None):
+    """(secties, opties): HTML per gerechtcategorie en de <option>s voor de kostprijsevolutie."""
+    session = session or db.session
+    rows = session.execute(
+        select(DishCategory.id, DishCategory.name).join(Dish)
+        .where(Dish.is_preparation == False).distinct().order_by(DishCategory.name)
+    ).all()
+    categories = _custom_order(rows, order)
+    keys, fragments = _dish_fragments(categories, versions, session)
+    sections, options = [], []
+    for key, (kind, category) in keys.items():
+        (sections if kind == 'cards' else options).append(fragments[key])
+    return [Markup(html) for html in sections], Markup(''.join(options))
+
+
+def product_sections(order, versions, session=None):
+    """HTML per productcategorie, in de eigen volgorde."""
+    session = session or db.session
+    rows = session.execute(select(Category.id, Category.name).order_by(Category.name)).all()
+    categories = _custom_order(rows, order)
+    prefix = _key_prefix()
+    generation = _version(versions, PRODUCT_SECTIONS)
+    keys = {
+        f'{prefix}:products:{category.id}:{generation}.{_version(versions, product_section(category.id))}': category
+        for category in categories
+    }
+
+    def render_missing(missing):
+        products = defaultdict(list)
+        query = select(Product).where(Product.category_id.in_({keys[key].id for key in missing})).order_by(Product.id)
+        for product in session.scalars(query):
+            products[product.category_id].append(product)
+        macro = get_template_attribute(SECTIONS_TEMPLATE, 'product_section')
+        return {key: str(macro(keys[key].name, products[keys[key].id])) for key in missing}
+
+    fragments = cached_fragments(keys, render_missing)
+    return [Markup(fragments[key]) for key in keys]
+
+
+def cost_distribution_json(versions, session=None):
+    """Kostenverdeling per productcategorie als JSON, gecachet per product- en gerechtversie."""
+    session = session or db.session
+    key = f'{_key_prefix()}:cost-distribution:{_version(versions, PRODUCTS)}.{_version(versions, DISHES)}'
+
+    def render_missing(missing):
+        unit_cost = Ingredient.quantity * (Product.package_price / Product.package_weight)
+        rows = session.execute(
+            select(Category.name, func.sum(unit_cost))
+            .join(Product, Category.id == Product.category_id)
+            .join(Ingredient, Product.id == Ingredient.product_id)
+            .where(Product.package_weight != None, Product.package_weight > 0, Product.package_price != None)
+            .group_by(Category.name)
+            .order_by(func.sum(unit_cost).desc())
+        ).all()
+        data = {'labels': [row[0] for row in rows], 'data': [float(row[1]) if row[1] is not None else 0 for row in rows]}
+        return {key: json.dumps(data)}
+
+    return cached_fragments([key], render_missing)[key]
+
+
+def dashboard_context(session=None):
+    """Alle variabelen voor index.html."""
+    session = session or db.session
+    versions = current_versions(session=session)
+    order = load_category_order(session=session, version=versions[CATEGORY_ORDER][0])
+    dish_html, dish_options = dish_sections(order.get('dishes', []), versions, session=session)
+    return {
+        'dish_sections': dish_html,
+        'dish_options': dish_options,
+        'product_sections': product_sections(order.get('products', []), versions, session=session),
+        'cost_distribution_json': cost_distribution_json(versions, session=session),
+    }
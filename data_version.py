@@ -0,0 +1,274 @@
+# data_version.py
+"""
+Monotone versietellers per gegevensgroep, voor ETags en caches.
+
+Elke schrijfactie via de sessie (ORM-objecten, bulk-insert/update/delete op een
+tabel) markeert de betrokken groep; vlak voor de commit wordt de teller van die
+groep in dezelfde transactie verhoogd. Een rollback verhoogt dus niets. Ruwe
+text()-statements zijn niet te herkennen en roepen zelf mark_changed() aan.
+
+Met @conditional_get krijgen pagina's en JSON-endpoints een ETag/Last-Modified uit
+deze tellers; een revalidatie met een nog geldige ETag kost enkel de versiequery.
+
+Daarnaast heeft elke categoriesectie van het dashboard een eigen teller
+('products.category.<id>', 'dishes.category.<id>'), zodat de fragmentcache enkel de
+secties met gewijzigde producten of gerechten opnieuw rendert. Wijzigingen per id
+(ORM-objecten, bulk-UPDATE per primaire sleutel, mark_rows_changed) worden naar hun
+sectie herleid; andere bulk-statements verhogen de teller van alle secties samen.
+"""
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, make_response, request, session
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Category, DataVersion, Dish, DishCategory, Product
+
+PRODUCTS = 'products'
+DISHES = 'dishes'
+CATEGORY_ORDER = 'category_order'
+SCOPES = (PRODUCTS, DISHES, CATEGORY_ORDER)
+
+# Tellers die alle dashboardsecties van een soort tegelijk ongeldig maken
+PRODUCT_SECTIONS = 'products.sections'
+DISH_SECTIONS = 'dishes.sections'
+
+# Boven zoveel gewijzigde rijen worden de secties niet meer één voor één opgezocht
+SECTION_LOOKUP_LIMIT = 500
+
+# Tabel -> gegevensgroep
+TABLE_SCOPES = {
+    'product': PRODUCTS,
+    'category': PRODUCTS,
+    'supplier': PRODUCTS,
+    'product_price_history': PRODUCTS,
+    'dish': DISHES,
+    'ingredient': DISHES,
+    'recipe_closure': DISHES,
+    'dish_category': DISHES,
+    'preparation_category': DISHES,
+    'category_order': CATEGORY_ORDER,
+}
+
+# Tabel -> (id-kolom, sectiekolom, extra voorwaarde, sectienaam, teller voor alle secties)
+SECTION_TABLES = {
+    'product': (Product.id, Product.category_id, None, 'products.category', PRODUCT_SECTIONS),
+    'category': (Category.id, Category.id, None, 'products.category', PRODUCT_SECTIONS),
+    'dish': (Dish.id, Dish.dish_category_id, Dish.is_preparation == False, 'dishes.category', DISH_SECTIONS),
+    'dish_category': (DishCategory.id, DishCategory.id, None, 'dishes.category', DISH_SECTIONS),
+}
+
+_SESSION_KEY = 'data_version_scopes'
+_ROWS_KEY = 'data_version_rows'
+
+
+def product_section(category_id):
+    return f'products.category.{category_id}'
+
+
+def dish_section(dish_category_id):
+    return f'dishes.category.{dish_category_id}'
+
+
+def mark_changed(*scopes, session=None):
+    """Laat de versie van deze groepen stijgen bij de volgende commit van de sessie."""
+    session = session or db.session
+    session.info.setdefault(_SESSION_KEY, set()).update(scopes)
+
+
+def mark_rows_changed(table_name, ids, session=None):
+    """
+    Zoals mark_changed, voor rijen die buiten de ORM per id gewijzigd worden: bij de
+    commit worden hun groep en dashboardsecties opgezocht en verhoogd.
+    """
+    session = session or db.session
+    if table_name in TABLE_SCOPES:
+        mark_changed(TABLE_SCOPES[table_name], session=session)
+    if table_name in SECTION_TABLES:
+        session.info.setdefault(_ROWS_KEY, {}).setdefault(table_name, set()).update(ids)
+
+
+def _resolve_rows(session, rows):
+    """Sectietellers voor de per id gewijzigde rijen (na de flush, dus met de nieuwe waarden)."""
+    scopes = set()
+    for table_name, ids in rows.items():
+        id_column, section_column, condition, prefix, all_sections = SECTION_TABLES[table_name]
+        if len(ids) > SECTION_LOOKUP_LIMIT:
+            scopes.add(all_sections)
+            continue
+        query = select(section_column).distinct().where(id_column.in_(ids))
+        if condition is not None:
+            query = query.where(condition)
+        scopes.update(f'{prefix}.{value}' for value in session.scalars(query) if value is not None)
+    return scopes
+
+
+def _object_sections(obj):
+    """Sectietellers die een gewijzigd ORM-object raakt, inclusief de vorige categorie."""
+    table_name = obj.__table__.name
+    if table_name not in SECTION_TABLES:
+        return set()
+    id_column, section_column, condition, prefix, all_sections = SECTION_TABLES[table_name]
+    state = inspect(obj)
+    # state.dict in plaats van getattr: een verwijderd object mag niets meer laden
+    if table_name == 'dish':
+        if state.dict.get('is_preparation') and not state.attrs.is_preparation.history.has_changes():
+            return set()
+    values = {state.dict.get(section_column.key)}
+    values.update(state.attrs[section_column.key].history.deleted or ())
+    return {f'{prefix}.{value}' for value in values if value is not None}
+
+
+def bump(scopes, session=None):
+    """Verhoogt de tellers meteen, binnen de lopende transactie."""
+    session = session or db.session
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    now = datetime.utcnow()
+    result = session.execute(
+        update(DataVersion)
+        .where(DataVersion.scope.in_(scopes))
+        .values(version=DataVersion.version + 1, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount < len(scopes):
+        existing = set(session.scalars(select(DataVersion.scope).where(DataVersion.scope.in_(scopes))))
+        for scope in scopes:
+            if scope in existing:
+                continue
+            try:
+                with session.begin_nested():
+                    session.add(DataVersion(scope=scope, version=1, updated_at=now))
+            except IntegrityError:
+                # Net door een andere transactie aangemaakt: dan gewoon verhogen
+                session.execute(
+                    update(DataVersion).where(DataVersion.scope == scope)
+                    .values(version=DataVersion.version + 1, updated_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+
+
+def current_versions(session=None):
+    """{scope: (versie, laatst gewijzigd)} voor alle gekende groepen, in één kleine query."""
+    session = session or db.session
+    versions = {scope: (0, None) for scope in SCOPES}
+    for row in session.execute(select(DataVersion.scope, DataVersion.version, DataVersion.updated_at)):
+        versions[row.scope] = (row.version, row.updated_at)
+    return versions
+
+
+def version_tag(*scopes, session=None):
+    """
+    (tag, laatst gewijzigd) voor een combinatie van groepen, bv. 'products.12-dishes.40'.
+    Bruikbaar als ETag en als cachesleutel.
+    """
+    versions = current_versions(session=session)
+    tag = '-'.join(f'{scope}.{versions[scope][0]}' for scope in scopes)
+    moments = [versions[scope][1] for scope in scopes if versions[scope][1] is not None]
+    last_modified = max(moments).replace(tzinfo=timezone.utc) if moments else None
+    return tag, last_modified
+
+
+def is_not_modified(etag, last_modified=None):
+    """Of de client met If-None-Match / If-Modified-Since al de huidige versie heeft."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified=None, private=False):
+    """Zet ETag, Last-Modified en Cache-Control zodat browser en proxy altijd revalideren."""
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
+
+
+def _csrf_period():
+    """
+    Tijdvak voor pagina's met CSRF-tokens: een gecachete pagina mag geen token tonen
+    dat ondertussen verlopen is, dus de ETag wisselt elke halve tokenlevensduur.
+    """
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    return int(time.time() // max(limit // 2, 1)) if limit else 0
+
+
+def conditional_get(*scopes, private=False):
+    """
+    Decorator voor GET-views die enkel afhangen van de gegeven groepen.
+
+    Is de ETag van de client nog actueel, dan volgt meteen een 304 zonder de view uit
+    te voeren. `private` is voor HTML met formulieren (CSRF-token in de sessie): die
+    mag enkel de browser bewaren, geen gedeelde proxy. Staat er nog een flash-bericht
+    klaar, dan wordt de pagina gewoon gerenderd en niet gevalideerd.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            tag, last_modified = version_tag(*scopes)
+            etag = f'{tag}-t{_csrf_period()}' if private else tag
+            if is_not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return set_validators(response, etag, last_modified, private=private)
+        return wrapper
+    return decorator
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_objects(session, flush_context):
+    # Na de flush: nieuwe objecten hebben dan een id, de historiek is nog beschikbaar
+    for obj in list(session.new) + list(session.deleted) + [o for o in session.dirty if session.is_modified(o)]:
+        scope = TABLE_SCOPES.get(getattr(getattr(obj, '__table__', None), 'name', None))
+        if scope:
+            mark_changed(scope, *_object_sections(obj), session=session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_statements(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        table_name = getattr(table, 'name', None)
+        if table_name not in TABLE_SCOPES:
+            return
+        session = orm_execute_state.session
+        params = orm_execute_state.parameters
+        if orm_execute_state.is_update and isinstance(params, (list, tuple)) and params and all('id' in p for p in params):
+            # Bulk-UPDATE per primaire sleutel (bv. store_costs): secties per id op te zoeken
+            mark_rows_changed(table_name, [p['id'] for p in params], session=session)
+        else:
+            mark_changed(TABLE_SCOPES[table_name], session=session)
+            if table_name in SECTION_TABLES:
+                mark_changed(SECTION_TABLES[table_name][4], session=session)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_on_commit(session):
+    # Eerst flushen: de ORM-wijzigingen van deze commit moeten ook meetellen
+    session.flush()
+    scopes = session.info.pop(_SESSION_KEY, None) or set()
+    rows = session.info.pop(_ROWS_KEY, None)
+    if rows:
+        scopes |= _resolve_rows(session, rows)
+    if scopes:
+        bump(scopes, session=session)
+        session.info.pop(_SESSION_KEY, None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_on_rollback(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    session.info.pop(_SESSION_KEY, None)
+    session.info.pop(_ROWS_KEY, None)
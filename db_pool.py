@@ -0,0 +1,123 @@
+# db_pool.py
+"""
+Engine-opties (connectiepool en timeouts) uit omgevingsvariabelen, en een gemeten pool.
+
+Flask-SQLAlchemy 3 leest enkel SQLALCHEMY_ENGINE_OPTIONS (en per bind de opties in
+SQLALCHEMY_BINDS); de oude sleutels SQLALCHEMY_POOL_* worden genegeerd.
+
+    DB_POOL_SIZE          vaste verbindingen per proces (standaard GUNICORN_THREADS + 1)
+    DB_MAX_OVERFLOW       extra verbindingen bij piekbelasting, nadien gesloten (standaard 2)
+    DB_POOL_TIMEOUT       seconden wachten op een vrije verbinding (standaard 10)
+    DB_POOL_RECYCLE       verbindingen ouder dan zoveel seconden vervangen (standaard 299)
+    DB_POOL_PRE_PING      verbinding testen bij checkout (standaard 1)
+    DB_STATEMENT_TIMEOUT  PostgreSQL: maximale duur van één statement in seconden (standaard 0 = geen;
+                          gunicorn.conf.py zet voor de webworkers de timeout van gunicorn)
+    DB_LOCK_TIMEOUT       PostgreSQL: maximale wachttijd op een lock in seconden (standaard 10)
+
+Elk proces heeft een eigen pool per engine. De webserver heeft dus tot
+WEB_CONCURRENCY x (DB_POOL_SIZE + DB_MAX_OVERFLOW) verbindingen per database open,
+plus die van de jobworker; `flask pool-check` rekent dat na tegen max_connections.
+"""
+import os
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from metrics import DB_CONNECTIONS, DB_POOL_CAPACITY, DB_POOL_CHECKOUT, DB_POOL_IN_USE, DB_POOL_TIMEOUTS
+
+DEFAULT_MAX_OVERFLOW = 2
+DEFAULT_POOL_TIMEOUT = 10
+DEFAULT_POOL_RECYCLE = 299  # net onder de 5 minuten waarna de hosting inactieve verbindingen verbreekt
+DEFAULT_LOCK_TIMEOUT = 10
+
+
+def _number(environ, name, default, convert=int):
+    value = environ.get(name)
+    return convert(value) if value not in (None, '') else default
+
+
+def _pool_listeners(label):
+    return {
+        'checkout': lambda dbapi_connection, record, proxy: DB_POOL_IN_USE.labels(label).inc(),
+        'checkin': lambda dbapi_connection, record: DB_POOL_IN_USE.labels(label).dec(),
+        'connect': lambda dbapi_connection, record: DB_CONNECTIONS.labels(label, 'opened').inc(),
+        'close': lambda dbapi_connection, record: DB_CONNECTIONS.labels(label, 'closed').inc(),
+        'close_detached': lambda dbapi_connection: DB_CONNECTIONS.labels(label, 'closed').inc(),
+    }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool die wachttijd, bezetting en verloop van verbindingen meet (zie metrics.py)."""
+
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kw):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kw)
+        self.label = kw.get('logging_name') or 'default'
+        self.capacity = pool_size + max(max_overflow, 0)
+        DB_POOL_CAPACITY.labels(self.label).inc(self.capacity)
+        # recreate() (na engine.dispose()) neemt de listeners van de vorige pool over
+        if '_dispatch' not in kw:
+            for name, listener in _pool_listeners(self.label).items():
+                event.listen(self, name, listener)
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT.labels(self.label).observe(time.perf_counter() - started)
+
+    def dispose(self):
+        super().dispose()
+        DB_POOL_CAPACITY.labels(self.label).dec(self.capacity)
+
+
+def engine_options(url, name='primary', environ=None):
+    """Opties voor create_engine voor `url`; `name` is het label van de pool in de metingen."""
+    environ = os.environ if environ is None else environ
+    url = make_url(url)
+    options = {
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', '1').lower() not in ('0', 'false', 'nee', 'no'),
+        'pool_recycle': _number(environ, 'DB_POOL_RECYCLE', DEFAULT_POOL_RECYCLE),
+        'pool_logging_name': name,
+    }
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options  # één gedeelde verbinding (StaticPool van Flask-SQLAlchemy)
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=_number(environ, 'DB_POOL_SIZE', _number(environ, 'GUNICORN_THREADS', 1) + 1),
+        max_overflow=_number(environ, 'DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW),
+        pool_timeout=_number(environ, 'DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT, float),
+    )
+    if url.get_backend_name() == 'postgresql':
+        timeouts = {
+            'statement_timeout': _number(environ, 'DB_STATEMENT_TIMEOUT', 0, float),
+            'lock_timeout': _number(environ, 'DB_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT, float),
+        }
+        settings = ' '.join(f'-c {setting}={int(seconds * 1000)}' for setting, seconds in timeouts.items() if seconds)
+        if settings:
+            options['connect_args'] = {'options': settings}
+    return options
+
+
+def connection_budget(engines, web_workers, job_workers=1):
+    """
+    Maximaal aantal verbindingen per database over alle processen:
+    [{'pool', 'per_process', 'total', 'max_connections'}], max_connections enkel voor PostgreSQL.
+    """
+    budget = []
+    for key, engine in engines.items():
+        pool = engine.pool
+        per_process = getattr(pool, 'capacity', None) or pool.size()
+        row = {'pool': getattr(pool, 'label', key or 'primary'), 'per_process': per_process,
+               'total': per_process * (web_workers + job_workers), 'max_connections': None}
+        if engine.dialect.name == 'postgresql':
+            with engine.connect() as connection:
+                maximum = int(connection.exec_driver_sql('SHOW max_connections').scalar())
+                reserved = int(connection.exec_driver_sql('SHOW superuser_reserved_connections').scalar())
+            row['max_connections'] = maximum - reserved
+        budget.append(row)
+    return budget
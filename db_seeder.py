@@ -1,20 +1,88 @@
 # db_seeder.py
-import pandas as pd
-import numpy as np
+"""
+Vult een lege database met de CSV's uit data/.
+
+De bestanden worden met de csv-module rij per rij gelezen; elke waarde wordt omgezet
+naar het type van de modelkolom (lege cel = NULL) en per batch ingevoegd. Zonder
+pandas/NumPy en pas geïmporteerd door `flask seed-db`, zodat de webworkers dit nooit laden.
+"""
+import csv
 import os
-from sqlalchemy import text
-from models import db, Category, Supplier, Product, DishCategory, Dish, Ingredient
 import sys
+from sqlalchemy import Boolean, Float, Integer, Numeric, text
+from models import db, Category, Supplier, Product, DishCategory, Dish, Ingredient
+from recipe_closure import rebuild_closure
 
 # Definieer de basisdirectory voor robuuste bestandspaden
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+INSERT_BATCH_SIZE = 5000
+
+# (bestand, model, hernoemde kolommen) in volgorde van de foreign keys
+SEED_FILES = [
+    ('category.csv', Category, {}),
+    ('dish_category.csv', DishCategory, {}),
+    ('supplier.csv', Supplier, {}),
+    ('product.csv', Product, {}),
+    ('dish.csv', Dish, {}),
+    ('ingredient.csv', Ingredient, {'dish_id': 'parent_dish_id'}),
+]
+
+
+def _integer(value):
+    # Exports uit een spreadsheet schrijven gehele getallen soms als '12.0'
+    return int(value) if value.lstrip('-').isdigit() else int(float(value))
+
+
+def _boolean(value):
+    return value.strip().lower() in ('1', 'true', 'ja', 'yes')
+
+
+def _converter(column):
+    if isinstance(column.type, Boolean):
+        return _boolean
+    if isinstance(column.type, Integer):
+        return _integer
+    if isinstance(column.type, (Float, Numeric)):
+        return float
+    return str
+
+
+def read_csv_rows(path, table, renames=None):
+    """Dicts per CSV-rij met waarden in het type van de kolommen van `table`; onbekende kolommen vallen weg."""
+    renames = renames or {}
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = [renames.get(name, name) for name in next(reader)]
+        fields = [(i, name, _converter(table.columns[name])) for i, name in enumerate(header) if name in table.columns]
+        for line_number, row in enumerate(reader, start=2):
+            try:
+                yield {name: convert(row[i]) if i < len(row) and row[i] != '' else None for i, name, convert in fields}
+            except ValueError as e:
+                raise ValueError(f"{os.path.basename(path)}, regel {line_number}: {e}") from e
+
+
+def _insert_file(filename, model, renames):
+    table = model.__table__
+    batch, count = [], 0
+    for row in read_csv_rows(os.path.join(BASE_DIR, 'data', filename), table, renames):
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+
 def seed_data():
     """
     Vult de database met initiële data, maar ENKEL als de database leeg is.
     Dit voorkomt het overschrijven van live data.
     """
-    
+
     if Category.query.first():
         print("✅ Database bevat al data. Seeden wordt overgeslagen.")
         return
@@ -22,53 +90,18 @@ def seed_data():
     print("Database is leeg. Start seeding database from exported CSVs...")
 
     try:
-        # 1. Tabellen zonder afhankelijkheden
-        category_df = pd.read_csv(os.path.join(BASE_DIR, 'data', 'category.csv'))
-        db.session.execute(Category.__table__.insert(), category_df.to_dict(orient='records'))
-        print("✅ category.csv succesvol geseed.")
-        
-        dish_category_df = pd.read_csv(os.path.join(BASE_DIR, 'data', 'dish_category.csv'))
-        db.session.execute(DishCategory.__table__.insert(), dish_category_df.to_dict(orient='records'))
-        print("✅ dish_category.csv succesvol geseed.")
-        
-        supplier_df = pd.read_csv(os.path.join(BASE_DIR, 'data', 'supplier.csv'))
-        db.session.execute(Supplier.__table__.insert(), supplier_df.to_dict(orient='records'))
-        print("✅ supplier.csv succesvol geseed.")
-
-        # 2. Producten
-        product_df = pd.read_csv(os.path.join(BASE_DIR, 'data', 'product.csv'))
-        product_df = product_df.replace({np.nan: None})
-        db.session.execute(Product.__table__.insert(), product_df.to_dict(orient='records'))
-        print("✅ Producten succesvol geseed.")
-
-        # 3. Gerechten
-        dish_df = pd.read_csv(os.path.join(BASE_DIR, 'data', 'dish.csv'))
-        dish_df = dish_df.replace({np.nan: None})
-        db.session.execute(Dish.__table__.insert(), dish_df.to_dict(orient='records'))
-        print("✅ Gerechten succesvol geseed.")
-
-        # 4. Ingrediënten
-        ingredient_df = pd.read_csv(os.path.join(BASE_DIR, 'data', 'ingredient.csv'))
-        ingredient_df.rename(columns={'dish_id': 'parent_dish_id'}, inplace=True)
-        ingredient_df = ingredient_df.replace({np.nan: None})
-        
-        for col in ['id', 'parent_dish_id', 'product_id', 'preparation_id']:
-            if col in ingredient_df.columns:
-                ingredient_df[col] = ingredient_df[col].apply(lambda x: int(x) if pd.notna(x) else None)
-        
-        ingredient_df['quantity'] = ingredient_df['quantity'].astype(float)
-        
-        db.session.execute(Ingredient.__table__.insert(), ingredient_df.to_dict(orient='records'))
-        print("✅ Ingrediënten succesvol geseed.")
+        for filename, model, renames in SEED_FILES:
+            count = _insert_file(filename, model, renames)
+            print(f"✅ {filename} succesvol geseed ({count} rijen).")
+
+        # Where-used-index van de zonet ingevoegde recepten
+        rebuild_closure()
 
         # --- FIX: Reset the primary key sequences for all tables ---
         if db.engine.dialect.name == 'postgresql':
-            db.session.execute(text("SELECT setval(pg_get_serial_sequence('category', 'id'), coalesce(max(id), 1)) FROM category;"))
-            db.session.execute(text("SELECT setval(pg_get_serial_sequence('dish_category', 'id'), coalesce(max(id), 1)) FROM dish_category;"))
-            db.session.execute(text("SELECT setval(pg_get_serial_sequence('supplier', 'id'), coalesce(max(id), 1)) FROM supplier;"))
-            db.session.execute(text("SELECT setval(pg_get_serial_sequence('product', 'id'), coalesce(max(id), 1)) FROM product;"))
-            db.session.execute(text("SELECT setval(pg_get_serial_sequence('dish', 'id'), coalesce(max(id), 1)) FROM dish;"))
-            db.session.execute(text("SELECT setval(pg_get_serial_sequence('ingredient', 'id'), coalesce(max(id), 1)) FROM ingredient;"))
+            for _, model, _ in SEED_FILES:
+                table = model.__table__.name
+                db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 1)) FROM {table};"))
             print("✅ Primary key sequences reset for PostgreSQL.")
 
         db.session.commit()
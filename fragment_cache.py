@@ -0,0 +1,210 @@
+# fragment_cache.py
+"""
+Cache voor gerenderde HTML-fragmenten (de categoriesecties van het dashboard).
+
+Een sleutel bevat altijd de versie van wat het fragment toont (zie data_version.py),
+dus een fragment wordt nooit expliciet gewist: na een wijziging vraagt de pagina
+een nieuwe sleutel op en verdwijnt de oude vanzelf uit de cache.
+
+Backends, te kiezen met FRAGMENT_CACHE:
+- 'memory' (standaard): LRU per worker, begrensd op FRAGMENT_CACHE_MAX_BYTES.
+- 'filesystem': gedeeld tussen de workers van één host, in FRAGMENT_CACHE_DIR.
+- 'redis': gedeeld tussen hosts, op FRAGMENT_CACHE_URL (vereist het pakket redis).
+- 'null': geen cache.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import current_app
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_TIMEOUT = 24 * 3600  # Redis: oude versies verlopen vanzelf
+PRUNE_EVERY = 200  # filesystem: om de zoveel writes opruimen
+
+
+class NullCache:
+    def get_many(self, keys):
+        return {}
+
+    def set_many(self, mapping):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache:
+    """LRU in het geheugen van de worker, begrensd op het totaal aantal bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = value
+        return found
+
+    def set_many(self, mapping):
+        with self._lock:
+            for key, value in mapping.items():
+                size = len(value.encode('utf-8'))
+                if size > self.max_bytes:
+                    continue
+                if key in self._entries:
+                    self.size -= len(self._entries.pop(key).encode('utf-8'))
+                self._entries[key] = value
+                self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.encode('utf-8'))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class FileSystemCache:
+    """
+    Eén bestand per fragment. Bestanden worden atomair vervangen (schrijven naar een
+    tijdelijk bestand, dan os.replace), dus andere workers lezen nooit een half fragment.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.html')
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            try:
+                with open(self._path(key), encoding='utf-8') as f:
+                    found[key] = f.read()
+            except FileNotFoundError:
+                pass
+        return found
+
+    def set_many(self, mapping):
+        for key, value in mapping.items():
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(value)
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        self._writes += len(mapping)
+        if self._writes >= PRUNE_EVERY:
+            self._writes = 0
+            self.prune()
+
+    def prune(self):
+        """Verwijdert de oudste fragmenten tot de map onder max_bytes blijft."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.html'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.html', '.tmp')):
+                os.unlink(entry.path)
+
+
+class RedisCache:
+    """Redis of een compatibele server (Valkey, KeyDB); gedeeld tussen alle hosts."""
+
+    def __init__(self, url, prefix='kostprijs:fragment:', timeout=DEFAULT_TIMEOUT):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("FRAGMENT_CACHE='redis' vereist het pakket 'redis' (pip install redis).") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget([self.prefix + key for key in keys])
+        return {key: value.decode('utf-8') for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, mapping):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(self.prefix + key, value.encode('utf-8'), ex=self.timeout)
+        pipeline.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_fragment_cache(config, instance_path):
+    backend = config.get('FRAGMENT_CACHE', 'memory')
+    max_bytes = config.get('FRAGMENT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    if backend == 'memory':
+        return MemoryCache(max_bytes)
+    if backend == 'filesystem':
+        directory = config.get('FRAGMENT_CACHE_DIR') or os.path.join(instance_path, 'fragment_cache')
+        return FileSystemCache(directory, max_bytes)
+    if backend == 'redis':
+        return RedisCache(config['FRAGMENT_CACHE_URL'], timeout=config.get('FRAGMENT_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    if backend == 'null':
+        return NullCache()
+    raise ValueError(f"Onbekende FRAGMENT_CACHE-backend '{backend}'.")
+
+
+def init_fragment_cache(app):
+    app.config.setdefault('FRAGMENT_CACHE', os.environ.get('FRAGMENT_CACHE', 'memory'))
+    app.config.setdefault('FRAGMENT_CACHE_DIR', os.environ.get('FRAGMENT_CACHE_DIR'))
+    app.config.setdefault('FRAGMENT_CACHE_URL', os.environ.get('FRAGMENT_CACHE_URL'))
+    app.config.setdefault('FRAGMENT_CACHE_MAX_BYTES', int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)))
+    app.extensions['fragment_cache'] = create_fragment_cache(app.config, app.instance_path)
+
+
+def fragment_cache():
+    return current_app.extensions['fragment_cache']
+
+
+def cached_fragments(keys, render_missing):
+    """
+    {sleutel: html} voor alle sleutels. `render_missing(ontbrekende_sleutels)` rendert
+    in één keer wat niet in de cache zit en geeft {sleutel: html} terug.
+    """
+    cache = fragment_cache()
+    keys = list(keys)
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        rendered = render_missing(missing)
+        cache.set_many(rendered)
+        found.update(rendered)
+    return found
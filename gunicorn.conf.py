@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+# Wordt door gunicorn automatisch ingelezen vanuit de werkmap.
+import os
+import shutil
+
+# Gedeelde map voor de Prometheus-metingen van alle workers (zie metrics.py)
+METRICS_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join('/tmp', 'kostprijs-metrics'))
+
+# Een sync-worker meldt zich pas na een request weer bij de master; de gestreamde
+# exports (/exports/costs.csv en .xlsx) van een grote catalogus duren langer dan de
+# standaard 30 s.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Threads per worker; db_pool.py stemt de grootte van de connectiepool hierop af
+threads = int(os.environ.setdefault('GUNICORN_THREADS', '1'))
+
+# Een query die langer loopt dan de worker mag leven, heeft geen zin: PostgreSQL breekt ze af
+os.environ.setdefault('DB_STATEMENT_TIMEOUT', str(timeout))
+
+
+def on_starting(server):
+    # Oude metingen van een vorige start weggooien
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
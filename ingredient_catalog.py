@@ -0,0 +1,86 @@
+# ingredient_catalog.py
+"""
+Compacte catalogus van alle producten en bereidingen voor de receptformulieren.
+
+Eén JSON-document met per product/bereiding id, naam, eenheid en eenheidsprijs,
+gecachet per dataversie en vooraf gecomprimeerd. Het formulier haalt het één keer op;
+daarna revalideert de browser enkel met If-None-Match en krijgt een 304 tot er
+iets aan producten of bereidingen wijzigt.
+"""
+import gzip
+import json
+import threading
+from flask import make_response, request
+from sqlalchemy import select
+from extensions import db
+from models import Product, Dish, Category
+from cost_engine import dish_costs, unit_price
+from data_version import DISHES, PRODUCTS, is_not_modified, set_validators, version_tag
+
+# Kolomvolgorde van de rijen in het document
+PRODUCT_FIELDS = ('id', 'name', 'category_id', 'unit', 'unit_price')
+PREPARATION_FIELDS = ('id', 'name', 'unit', 'unit_price')
+
+_cache = {}  # tag -> (json, gzip); enkel de laatste versie wordt bewaard
+_cache_lock = threading.Lock()
+
+
+def build_catalog(session=None):
+    """De catalogus als dict, uit drie bulk-queries en de opgeslagen kostprijzen."""
+    session = session or db.session
+    categories = session.execute(select(Category.id, Category.name).order_by(Category.name)).all()
+    products = session.execute(
+        select(Product.id, Product.name, Product.category_id, Product.package_unit, Product.package_price, Product.package_weight)
+        .order_by(Product.name)
+    ).all()
+    preparations = session.execute(
+        select(Dish.id, Dish.name, Dish.yield_unit).where(Dish.is_preparation == True).order_by(Dish.name)
+    ).all()
+    prep_costs = dish_costs([p.id for p in preparations])
+    return {
+        'categories': [[c.id, c.name] for c in categories],
+        'product_fields': PRODUCT_FIELDS,
+        'products': [
+            [p.id, p.name, p.category_id, p.package_unit, round(unit_price(p.package_price, p.package_weight), 6)]
+            for p in products
+        ],
+        'preparation_fields': PREPARATION_FIELDS,
+        'preparations': [
+            [p.id, p.name, p.yield_unit, round(prep_costs[p.id].cost_price, 6) if p.id in prep_costs else 0]
+            for p in preparations
+        ],
+    }
+
+
+def _encoded_catalog(tag):
+    with _cache_lock:
+        cached = _cache.get(tag)
+    if cached is None:
+        body = dict(build_catalog(), version=tag)
+        raw = json.dumps(body, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        cached = (raw, gzip.compress(raw, compresslevel=6))
+        with _cache_lock:
+            _cache.clear()
+            _cache[tag] = cached
+    return cached
+
+
+def catalog_response():
+    """
+    GET-antwoord met ETag per dataversie: 304 als de client de versie al heeft,
+    anders de gecachete JSON (gzip als de client dat aanvaardt).
+    """
+    tag, last_modified = version_tag(PRODUCTS, DISHES)
+    etag = f'catalog-{tag}'
+    if is_not_modified(etag, last_modified):
+        response = make_response('', 304)
+    else:
+        raw, compressed = _encoded_catalog(tag)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = make_response(compressed)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = make_response(raw)
+        response.mimetype = 'application/json'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return set_validators(response, etag, last_modified)
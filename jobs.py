@@ -0,0 +1,413 @@
+# jobs.py
+"""
+Achtergrondtaken zonder externe broker.
+
+Een route of CLI-commando zet een taak in de tabel job (enqueue) en keert meteen terug.
+De jobworker (`flask jobs worker`, Procfile 'worker:' of naast gunicorn in startup.sh) voert de
+wachtende taken uit in een kleine threadpool. Een taak wordt opgeëist met een
+voorwaardelijke UPDATE van 'queued' naar 'running', dus meerdere workers voeren nooit
+dezelfde taak uit.
+
+- Voortgang: een taak krijgt een JobContext en meldt context.progress(done, total, message).
+- Annuleren: een wachtende taak wordt meteen geannuleerd; een lopende taak stopt bij haar
+  volgende voortgangsmelding en haar open transactie wordt teruggedraaid.
+- Nieuwe pogingen: een mislukte taak wordt met oplopend uitstel opnieuw ingepland tot
+  max_attempts. Een JobError (bv. een ongeldig bestand) wordt niet herhaald.
+- Valt een worker weg, dan worden zijn taken zonder recente hartslag na STALE_AFTER
+  opnieuw ingepland.
+
+De JSON-API onder /jobs/ is er voor de browser: de kaart Achtergrondtaken op het
+dashboard start taken (enkel die met api=True), volgt ze op en annuleert ze. POST-requests
+staan zoals elk formulier achter CSRFProtect en sturen het token mee in de header
+X-CSRFToken. De app kent geen gebruikers of API-sleutels; scripts en cron starten
+taken daarom met `flask jobs enqueue` op de server zelf.
+"""
+import inspect
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Job
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+POLL_INTERVAL = 2.0  # seconden tussen twee blikken op een lege wachtrij
+HEARTBEAT_INTERVAL = 30  # seconden
+STALE_AFTER = timedelta(minutes=5)
+RETRY_DELAY = 30  # seconden voor de tweede poging, daarna telkens het dubbele
+
+logger = logging.getLogger(__name__)
+
+Task = namedtuple('Task', ['func', 'max_attempts', 'api'])
+TASKS = {}
+
+
+class JobError(Exception):
+    """Fout waar een nieuwe poging niets aan verandert: de taak mislukt meteen."""
+
+
+class JobCancelled(Exception):
+    """De taak werd geannuleerd terwijl ze liep."""
+
+
+class InvalidJobError(ValueError):
+    """Onbekende taak of parameters die niet bij de taak passen."""
+
+
+def task(kind, max_attempts=3, api=False):
+    """
+    Registreert een functie als taak `kind`. De functie krijgt een JobContext en de
+    parameters van de taak als keyword-argumenten en geeft een JSON-resultaat terug.
+    Met api=True kan de taak ook via POST /jobs/ gestart worden.
+    """
+    def decorator(func):
+        TASKS[kind] = Task(func, max_attempts, api)
+        return func
+    return decorator
+
+
+def enqueue(kind, params=None, max_attempts=None, session=None):
+    """Zet een taak in de wachtrij en geeft de Job terug. Er wordt niet gecommit."""
+    if kind not in TASKS:
+        raise InvalidJobError(f"Onbekende taak '{kind}'.")
+    try:
+        inspect.signature(TASKS[kind].func).bind(None, **(params or {}))
+    except TypeError as e:
+        raise InvalidJobError(f"Ongeldige parameters voor taak '{kind}': {e}") from e
+    session = session or db.session
+    job = Job(kind=kind, params=params or {}, status=QUEUED, run_after=datetime.utcnow(),
+              max_attempts=max_attempts or TASKS[kind].max_attempts)
+    session.add(job)
+    session.flush()
+    return job
+
+
+def cancel(job_id, session=None):
+    """Annuleert een wachtende taak, of vraagt een lopende taak om te stoppen. Commit."""
+    session = session or db.session
+    session.execute(
+        update(Job).where(Job.id == job_id, Job.status == QUEUED)
+        .values(status=CANCELLED, finished_at=datetime.utcnow(), message='Geannuleerd')
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        update(Job).where(Job.id == job_id, Job.status == RUNNING).values(cancel_requested=True)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return session.get(Job, job_id)
+
+
+def job_status(job):
+    """De status van een taak als JSON-vriendelijke dict."""
+    def timestamp(value):
+        return value.isoformat() if value else None
+
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': job.params,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'cancel_requested': job.cancel_requested,
+        'progress': {'done': job.progress_done, 'total': job.progress_total},
+        'message': job.message,
+        'result': job.result,
+        'error': job.error,
+        'created_at': timestamp(job.created_at),
+        'started_at': timestamp(job.started_at),
+        'finished_at': timestamp(job.finished_at),
+    }
+
+
+def store_upload(upload):
+    """Bewaart een geüpload bestand voor een taak in instance/job_uploads en geeft het pad terug."""
+    directory = os.path.join(current_app.instance_path, 'job_uploads')
+    os.makedirs(directory, exist_ok=True)
+    extension = os.path.splitext(upload.filename or '')[1].lower()
+    path = os.path.join(directory, uuid.uuid4().hex + extension)
+    upload.save(path)
+    return path
+
+
+class JobContext:
+    """Wat een lopende taak over zichzelf weet, en haar kanaal voor voortgang en annulering."""
+
+    def __init__(self, job, engine):
+        self.job_id = job.id
+        self.attempt = job.attempts
+        self.max_attempts = job.max_attempts
+        self._engine = engine
+
+    @property
+    def final_attempt(self):
+        return self.attempt >= self.max_attempts
+
+    def progress(self, done, total=None, message=None):
+        """
+        Schrijft de voortgang weg in een eigen transactie en geeft JobCancelled als de taak
+        geannuleerd werd. Meld voortgang bij voorkeur na een commit: op SQLite moet een
+        schrijfactie anders wachten op de open transactie van de taak zelf, en dan wordt
+        de melding overgeslagen.
+        """
+        values = {'progress_done': done, 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['progress_total'] = total
+        if message is not None:
+            values['message'] = message[:255]
+        with Session(self._engine) as session:
+            cancel_requested = session.scalar(select(Job.cancel_requested).where(Job.id == self.job_id))
+            try:
+                session.execute(update(Job).where(Job.id == self.job_id).values(**values))
+                session.commit()
+            except OperationalError:
+                session.rollback()
+                logger.warning("Voortgang van taak %s niet weggeschreven (database bezet).", self.job_id)
+        if cancel_requested:
+            raise JobCancelled()
+
+
+def claim_next(worker_name, session=None):
+    """Eist de oudste wachtende taak op voor deze worker en geeft haar id terug (of None)."""
+    session = session or db.session
+    now = datetime.utcnow()
+    candidates = session.scalars(
+        select(Job.id).where(Job.status == QUEUED, Job.run_after <= now)
+        .order_by(Job.run_after, Job.id).limit(5)
+        .with_for_update(skip_locked=True)  # PostgreSQL; SQLite negeert dit
+    ).all()
+    for job_id in candidates:
+        claimed = session.execute(
+            update(Job).where(Job.id == job_id, Job.status == QUEUED)
+            .values(status=RUNNING, attempts=Job.attempts + 1, worker=worker_name,
+                    started_at=now, heartbeat_at=now, cancel_requested=False)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed:
+            session.commit()
+            return job_id
+    session.rollback()
+    return None
+
+
+def _finish(session, job_id, status, **values):
+    session.execute(
+        update(Job).where(Job.id == job_id)
+        .values(status=status, finished_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+
+
+def run_job(job_id, session=None):
+    """Voert een opgeëiste taak uit en legt het resultaat, de fout of een nieuwe poging vast."""
+    session = session or db.session
+    job = session.get(Job, job_id)
+    task = TASKS.get(job.kind)
+    context = JobContext(job, session.get_bind())
+    params = dict(job.params or {})
+    logger.info("Taak %s (%s) gestart, poging %s/%s.", job_id, job.kind, context.attempt, context.max_attempts)
+    kind = job.kind
+    session.commit()
+    try:
+        if task is None:
+            raise JobError(f"Onbekende taak '{kind}'.")
+        result = task.func(context, **params)
+        session.commit()
+    except JobCancelled:
+        session.rollback()
+        _finish(session, job_id, CANCELLED, message='Geannuleerd')
+    except Exception as e:
+        session.rollback()
+        error = str(e) or e.__class__.__name__
+        if isinstance(e, JobError) or context.final_attempt:
+            logger.exception("Taak %s (%s) mislukt.", job_id, kind)
+            _finish(session, job_id, FAILED, error=error)
+        else:
+            delay = RETRY_DELAY * 2 ** (context.attempt - 1)
+            logger.warning("Taak %s (%s) mislukt, nieuwe poging over %s s: %s", job_id, kind, delay, error)
+            session.execute(
+                update(Job).where(Job.id == job_id)
+                .values(status=QUEUED, error=error, worker=None, run_after=datetime.utcnow() + timedelta(seconds=delay))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+    else:
+        _finish(session, job_id, DONE, result=result, error=None,
+                progress_done=func.coalesce(Job.progress_total, Job.progress_done))
+
+
+def requeue_stale(session):
+    """Taken van een weggevallen worker (geen hartslag meer) opnieuw inplannen of laten mislukken."""
+    now = datetime.utcnow()
+    stale = (Job.status == RUNNING) & (Job.heartbeat_at < now - STALE_AFTER)
+    session.execute(
+        update(Job).where(stale, Job.attempts < Job.max_attempts)
+        .values(status=QUEUED, worker=None, run_after=now, error='Worker gestopt tijdens de uitvoering.')
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        update(Job).where(stale)
+        .values(status=FAILED, finished_at=now, error='Worker gestopt tijdens de uitvoering.')
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+
+
+class JobWorker:
+    """Threadpool die de taken uit de tabel job uitvoert; één worker per host volstaat."""
+
+    def __init__(self, app, threads=1, poll_interval=POLL_INTERVAL):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self._stop = threading.Event()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.threads):
+            self._threads.append(threading.Thread(target=self._loop, name=f'jobworker-{number}', daemon=True))
+        self._threads.append(threading.Thread(target=self._heartbeat_loop, name='jobworker-heartbeat', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def request_stop(self):
+        """Lopende taken worden nog afgewerkt, er worden geen nieuwe meer opgeëist."""
+        self._stop.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def run_pending(self):
+        """Voert wachtende taken uit tot de wachtrij leeg is en geeft het aantal terug."""
+        count = 0
+        with self.app.app_context():
+            while True:
+                job_id = claim_next(self.name)
+                if job_id is None:
+                    return count
+                self._run(job_id)
+                count += 1
+
+    def _run(self, job_id):
+        with self._lock:
+            self._running.add(job_id)
+        try:
+            run_job(job_id)
+        except Exception:
+            logger.exception("Taak %s kon niet afgesloten worden.", job_id)
+            db.session.rollback()
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    job_id = claim_next(self.name)
+                except OperationalError:
+                    logger.warning("Wachtrij niet leesbaar, later opnieuw.", exc_info=True)
+                    db.session.rollback()
+                    job_id = None
+                if job_id is not None:
+                    self._run(job_id)
+                    continue
+            self._stop.wait(self.poll_interval)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                running = list(self._running)
+            with self.app.app_context(), Session(db.engine) as session:
+                try:
+                    if running:
+                        session.execute(update(Job).where(Job.id.in_(running)).values(heartbeat_at=datetime.utcnow()))
+                        session.commit()
+                    requeue_stale(session)
+                except OperationalError:
+                    session.rollback()
+                    logger.warning("Hartslag van de jobworker niet weggeschreven.", exc_info=True)
+
+
+# --- Taken ---
+
+@task('recompute-costs', api=True)
+def recompute_costs_task(context, missing=False):
+    from cost_engine import refresh_all_costs
+    context.progress(0, message="Kostprijzen worden herberekend.")
+    costs = refresh_all_costs(missing_only=missing)
+    db.session.commit()
+    context.progress(len(costs), len(costs), f"Kostprijs van {len(costs)} gerechten/bereidingen bijgewerkt.")
+    return {'dishes': len(costs)}
+
+
+@task('rebuild-closure', api=True)
+def rebuild_closure_task(context):
+    from recipe_closure import rebuild_closure
+    count = rebuild_closure()
+    db.session.commit()
+    context.progress(count, count, f"Where-used-index opgebouwd voor {count} gerechten/bereidingen.")
+    return {'dishes': count}
+
+
+@task('rebuild-search-index', api=True)
+def rebuild_search_index_task(context):
+    from product_search import create_search_index
+    with db.engine.begin() as connection:
+        create_search_index(connection)
+    return {}
+
+
+@task('seed-db', max_attempts=1)
+def seed_db_task(context):
+    from db_seeder import seed_data
+    seed_data()
+    return {}
+
+
+@task('import-prices')
+def import_prices_task(context, path, filename=None, supplier=None, category=None, create_missing=False,
+                       chunk_size=None, remove_file=False):
+    """Prijslijst importeren; met remove_file wordt het (geüploade) bestand achteraf opgeruimd."""
+    from price_import import DEFAULT_CHUNK_SIZE, PriceImportError, import_prices, iter_price_rows, price_summary_message
+    done_with_file = True
+    try:
+        with open(path, 'rb') as f:
+            summary = import_prices(
+                iter_price_rows(f, filename or path),
+                supplier_name=supplier,
+                category_name=category,
+                create_missing=create_missing,
+                chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+                progress=lambda rows: context.progress(rows, message=f"{rows} rijen verwerkt."),
+            )
+    except FileNotFoundError as e:
+        raise JobError(f"Prijsbestand niet gevonden: {filename or path}") from e
+    except (PriceImportError, UnicodeDecodeError) as e:
+        raise JobError(f"Importeren mislukt: {e}") from e
+    except JobCancelled:
+        raise
+    except Exception:
+        done_with_file = context.final_attempt
+        raise
+    finally:
+        if remove_file and done_with_file and os.path.exists(path):
+            os.remove(path)
+    rows = sum(count for key, count in summary.items() if key != 'errors')
+    context.progress(rows, rows, price_summary_message(summary))
+    return summary
@@ -0,0 +1,119 @@
+# metrics.py
+import os
+import time
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Onder gunicorn zet gunicorn.conf.py PROMETHEUS_MULTIPROC_DIR, zodat elke worker zijn
+# waarden naar een gedeelde map schrijft en /metrics ze over alle workers samentelt.
+
+REQUEST_LATENCY = Histogram(
+    'kostprijs_request_duration_seconds', 'Duur van een request per endpoint.',
+    ['endpoint', 'method'],
+)
+REQUESTS = Counter(
+    'kostprijs_requests_total', 'Aantal requests per endpoint en statuscode.',
+    ['endpoint', 'method', 'status'],
+)
+SQL_STATEMENTS = Counter(
+    'kostprijs_sql_statements_total', 'Aantal uitgevoerde SQL-statements per endpoint.',
+    ['endpoint'],
+)
+SQL_DURATION = Histogram(
+    'kostprijs_sql_duration_seconds', 'Totale databasetijd per request.',
+    ['endpoint'],
+)
+TEMPLATE_RENDER = Histogram(
+    'kostprijs_template_render_seconds', 'Rendertijd per template.',
+    ['template'],
+)
+COST_ENGINE = Histogram(
+    'kostprijs_cost_engine_seconds', 'Duur van kostprijsberekeningen.',
+    ['operation'],
+)
+
+# Connectiepool per engine (zie db_pool.py). Verzadiging = in_use / capacity; de
+# gauges tellen op over de levende workers, dus ook capacity is het totaal van alle workers.
+DB_POOL_CHECKOUT = Histogram(
+    'kostprijs_db_pool_checkout_seconds', 'Wachttijd om een verbinding uit de pool te krijgen (inclusief verbinden).',
+    ['pool'], buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_TIMEOUTS = Counter(
+    'kostprijs_db_pool_timeouts_total', 'Checkouts die opgaven omdat de pool vol zat.',
+    ['pool'],
+)
+DB_POOL_IN_USE = Gauge(
+    'kostprijs_db_pool_in_use', 'Uitgeleende verbindingen.',
+    ['pool'], multiprocess_mode='livesum',
+)
+DB_POOL_CAPACITY = Gauge(
+    'kostprijs_db_pool_capacity', 'Maximaal aantal verbindingen (pool_size + max_overflow).',
+    ['pool'], multiprocess_mode='livesum',
+)
+DB_CONNECTIONS = Counter(
+    'kostprijs_db_connections_total', 'Geopende en gesloten databaseverbindingen (verloop).',
+    ['pool', 'event'],
+)
+
+
+def _endpoint_label():
+    return request.endpoint or 'onbekend'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_start')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+
+
+def _start_template_timer(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+def _stop_template_timer(sender, template, context, **extra):
+    if has_request_context() and g.get('template_starts'):
+        TEMPLATE_RENDER.labels(template.name or 'string').observe(time.perf_counter() - g.template_starts.pop())
+
+
+def init_metrics(app):
+    """Koppelt de request-, SQL- en template-metingen aan de app en registreert /metrics."""
+    before_render_template.connect(_start_template_timer, app)
+    template_rendered.connect(_stop_template_timer, app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'request_start' not in g or request.endpoint == 'metrics':
+            return response
+        endpoint = _endpoint_label()
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - g.request_start)
+        REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        SQL_STATEMENTS.labels(endpoint).inc(g.get('sql_statements', 0))
+        SQL_DURATION.labels(endpoint).observe(g.get('sql_seconds', 0.0))
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Alle metingen in Prometheus-tekstformaat, samengeteld over alle workers."""
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,111 @@
+"""zoekindex voor producten
+
+Revision ID: 3c1d7e5a9b42
+Revises: 819000b9b317
+Create Date: 2026-10-18 14:52:10.412873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1d7e5a9b42'
+down_revision = '819000b9b317'
+branch_labels = None
+depends_on = None
+
+# De DDL staat bewust in deze revisie en niet in product_search.py: een latere wijziging
+# van de zoekindex hoort in een nieuwe migratie, niet in wat deze revisie ooit deed.
+SQLITE_CREATE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+        name, supplier, article_number,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_search (rowid, name, supplier, article_number)
+        VALUES (new.id, new.name, (SELECT name FROM supplier WHERE id = new.supplier_id), coalesce(new.article_number, ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_search_update AFTER UPDATE OF name, supplier_id, article_number ON product BEGIN
+        DELETE FROM product_search WHERE rowid = old.id;
+        INSERT INTO product_search (rowid, name, supplier, article_number)
+        VALUES (new.id, new.name, (SELECT name FROM supplier WHERE id = new.supplier_id), coalesce(new.article_number, ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON product BEGIN
+        DELETE FROM product_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_search_supplier AFTER UPDATE OF name ON supplier BEGIN
+        UPDATE product_search SET supplier = new.name WHERE rowid IN (SELECT id FROM product WHERE supplier_id = new.id);
+    END""",
+]
+SQLITE_REBUILD = [
+    "DELETE FROM product_search",
+    """INSERT INTO product_search (rowid, name, supplier, article_number)
+        SELECT product.id, product.name, supplier.name, coalesce(product.article_number, '')
+        FROM product JOIN supplier ON supplier.id = product.supplier_id""",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS product_search_insert",
+    "DROP TRIGGER IF EXISTS product_search_update",
+    "DROP TRIGGER IF EXISTS product_search_delete",
+    "DROP TRIGGER IF EXISTS product_search_supplier",
+    "DROP TABLE IF EXISTS product_search",
+]
+
+POSTGRES_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """CREATE OR REPLACE FUNCTION product_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.article_number, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce((SELECT name FROM supplier WHERE id = NEW.supplier_id), '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS product_search_vector ON product",
+    """CREATE TRIGGER product_search_vector BEFORE INSERT OR UPDATE OF name, supplier_id, article_number
+        ON product FOR EACH ROW EXECUTE FUNCTION product_search_vector()""",
+    """CREATE OR REPLACE FUNCTION product_search_supplier() RETURNS trigger AS $$
+    BEGIN
+        UPDATE product SET name = name WHERE supplier_id = NEW.id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS product_search_supplier ON supplier",
+    """CREATE TRIGGER product_search_supplier AFTER UPDATE OF name ON supplier
+        FOR EACH ROW EXECUTE FUNCTION product_search_supplier()""",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_product_name_trgm ON product USING gin (name gin_trgm_ops)",
+]
+POSTGRES_REBUILD = [
+    "UPDATE product SET name = name",
+]
+POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS product_search_supplier ON supplier",
+    "DROP FUNCTION IF EXISTS product_search_supplier()",
+    "DROP TRIGGER IF EXISTS product_search_vector ON product",
+    "DROP FUNCTION IF EXISTS product_search_vector()",
+    "DROP INDEX IF EXISTS ix_product_name_trgm",
+    "DROP INDEX IF EXISTS ix_product_search_vector",
+    "ALTER TABLE product DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(sqlite, postgres):
+    bind = op.get_bind()
+    statements = {'sqlite': sqlite, 'postgresql': postgres}.get(bind.dialect.name, [])
+    for statement in statements:
+        op.execute(sa.text(statement))
+
+
+def upgrade():
+    # FTS5-tabel (SQLite) of tsvector-kolom met GIN-index (PostgreSQL), met triggers, en
+    # meteen gevuld met de bestaande producten.
+    _run(SQLITE_CREATE + SQLITE_REBUILD, POSTGRES_CREATE + POSTGRES_REBUILD)
+
+
+def downgrade():
+    _run(SQLITE_DROP, POSTGRES_DROP)
@@ -0,0 +1,34 @@
+"""eenheidsprijs als berekende kolom
+
+Revision ID: 4b8e2f6c1d3a
+Revises: 6d0be94049dc
+Create Date: 2026-10-18 17:05:42.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e2f6c1d3a'
+down_revision = '6d0be94049dc'
+branch_labels = None
+depends_on = None
+
+UNIT_PRICE = ('CASE WHEN package_price IS NULL OR package_weight IS NULL OR package_weight = 0 '
+              'THEN 0 ELSE package_price / package_weight END')
+
+
+def upgrade():
+    # SQLite kan met ALTER TABLE enkel een VIRTUAL kolom toevoegen; de index bewaart de waarde toch.
+    # PostgreSQL kent alleen STORED.
+    persisted = True if op.get_bind().dialect.name == 'postgresql' else None
+    op.add_column('product', sa.Column('unit_price', sa.Float(), sa.Computed(UNIT_PRICE, persisted=persisted), nullable=True))
+    op.create_index('ix_product_category_unit_price', 'product', ['category_id', 'unit_price'], unique=False)
+    op.create_index('ix_product_unit_price', 'product', ['unit_price'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_unit_price', table_name='product')
+    op.drop_index('ix_product_category_unit_price', table_name='product')
+    op.drop_column('product', 'unit_price')
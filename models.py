@@ -1,7 +1,9 @@
 # models.py
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import relationship
 from extensions import db
+import cost_engine
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -32,11 +34,48 @@ class Product(db.Model):
     # Relatie met ingrediënten die dit product gebruiken
     ingredients = relationship('Ingredient', back_populates='product')
 
+    price_history = relationship('ProductPriceHistory', order_by='ProductPriceHistory.valid_from', cascade='all, delete-orphan')
+
+    # Eenheidsprijs berekend door de database (zelfde regel als cost_engine.unit_price), zodat
+    # de productlijst er via een index op kan sorteren. Nooit zelf schrijven.
+    unit_price = db.Column(db.Float, db.Computed(
+        'CASE WHEN package_price IS NULL OR package_weight IS NULL OR package_weight = 0 '
+        'THEN 0 ELSE package_price / package_weight END'
+    ))
+
+    # Keyset-paginatie van de productlijst, met of zonder categorie: (category_id, name, id), (unit_price, id), ...
+    __table_args__ = (
+        db.Index('ix_product_category_name', 'category_id', 'name'),
+        db.Index('ix_product_category_unit_price', 'category_id', 'unit_price'),
+        db.Index('ix_product_unit_price', 'unit_price'),
+    )
+
     @property
     def unit_price_calculated(self):
-        if self.package_price is None or self.package_weight is None or self.package_weight == 0:
-            return 0
-        return self.package_price / self.package_weight
+        return cost_engine.unit_price(self.package_price, self.package_weight)
+
+class ProductPriceHistory(db.Model):
+    """Append-only prijshistoriek: één rij per prijswijziging van een product."""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    package_price = db.Column(db.Float, nullable=True)
+    package_weight = db.Column(db.Float, nullable=True)
+    valid_from = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_product_price_history_product_valid_from', 'product_id', 'valid_from'),
+    )
+
+class DataVersion(db.Model):
+    """Versieteller per gegevensgroep ('products', 'dishes'), verhoogd bij elke schrijfactie (zie data_version.py)."""
+    scope = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class CategoryOrder(db.Model):
+    """Eigen volgorde van de categorienamen op het dashboard, per soort ('dishes', 'products')."""
+    kind = db.Column(db.String(20), primary_key=True)
+    names = db.Column(db.JSON, nullable=False, default=list)
 
 class DishCategory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -69,6 +108,23 @@ class Dish(db.Model):
     yield_quantity = db.Column(db.Float, nullable=True) # Bv. 1.5 (voor 1.5 Liter saus)
     yield_unit = db.Column(db.String(50), nullable=True) # Bv. "L" of "Kg"
 
+    # Opgeslagen resultaat van cost_engine.refresh_costs, bijgewerkt bij elke wijziging
+    # van een product of recept waar dit gerecht (onrechtstreeks) van afhangt.
+    cost_price_cached = db.Column(db.Float, nullable=True)
+    selling_price_cached = db.Column(db.Float, nullable=True)
+    profit_cached = db.Column(db.Float, nullable=True) # selling_price_cached - cost_price_cached
+
+    # Gesorteerde indexen voor de top-N grafiek: een LIMIT-query leest enkel de eerste k rijen.
+    # Dezelfde indexen dragen de keyset-paginatie op kostprijs en winst; de *_category-varianten
+    # de top-N binnen één gerechtcategorie.
+    __table_args__ = (
+        db.Index('ix_dish_ranking_cost', 'is_preparation', 'cost_price_cached'),
+        db.Index('ix_dish_ranking_profit', 'is_preparation', 'profit_cached'),
+        db.Index('ix_dish_ranking_category_cost', 'is_preparation', 'dish_category_id', 'cost_price_cached'),
+        db.Index('ix_dish_ranking_category_profit', 'is_preparation', 'dish_category_id', 'profit_cached'),
+        db.Index('ix_dish_list_name', 'is_preparation', 'name'),
+    )
+
     # Relatie met de ingrediënten die in dit gerecht/deze bereiding zitten
     ingredients = relationship('Ingredient', foreign_keys='Ingredient.parent_dish_id', back_populates='parent_dish', cascade="all, delete-orphan")
     
@@ -78,6 +134,24 @@ class Dish(db.Model):
     @property
     def cost_price_calculated(self):
         """Berekent de totale kostprijs voor een gerecht, of de kostprijs per eenheid voor een bereiding."""
+        if self.cost_price_cached is not None:
+            return self.cost_price_cached
+        if self.id is None:
+            return self._cost_price_recursive()
+        costs = cost_engine.dish_costs([self.id])
+        if self.id not in costs:
+            return self._cost_price_recursive()
+        return costs[self.id].cost_price
+
+    @property
+    def selling_price_calculated(self):
+        """Berekent de verkoopprijs. Alleen relevant voor eindgerechten."""
+        if self.is_preparation:
+            return 0 # Een bereiding heeft geen verkoopprijs
+        return cost_engine.selling_price(self.cost_price_calculated, self.profit_type, self.profit_value)
+
+    def _cost_price_recursive(self):
+        """Oude recursieve berekening, enkel nog voor objecten die (nog) niet in de database staan."""
         total_ingredient_cost = sum(ingredient.cost for ingredient in self.ingredients)
         
         if self.is_preparation:
@@ -87,30 +161,18 @@ class Dish(db.Model):
         
         return total_ingredient_cost # Geeft de totale kostprijs voor een eindgerecht
 
-    @property
-    def selling_price_calculated(self):
-        """Berekent de verkoopprijs. Alleen relevant voor eindgerechten."""
-        if self.is_preparation:
-            return 0 # Een bereiding heeft geen verkoopprijs
-
-        cost = self.cost_price_calculated
-        if self.profit_type == 'percentage':
-            return cost * (1 + self.profit_value / 100)
-        elif self.profit_type == 'multiplier':
-            return cost * self.profit_value
-        return cost
-
 class Ingredient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     quantity = db.Column(db.Float, nullable=False)
     
     # Het gerecht/de bereiding WAARIN dit ingrediënt wordt gebruikt
-    parent_dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=False)
+    parent_dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=False, index=True)
     parent_dish = relationship('Dish', foreign_keys=[parent_dish_id], back_populates='ingredients')
     
     # De BRON van het ingrediënt (ofwel een basisproduct, ofwel een bereiding)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=True)
-    preparation_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=True)
+    # Geïndexeerd: dit is de omgekeerde afhankelijkheidsindex die refresh_costs gebruikt.
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=True, index=True)
+    preparation_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=True, index=True)
 
     product = relationship('Product', back_populates='ingredients')
     preparation = relationship('Dish', foreign_keys=[preparation_id], back_populates='used_in_ingredients')
@@ -134,3 +196,57 @@ class Ingredient(db.Model):
             cost_per_unit = self.preparation.cost_price_calculated
         
         return cost_per_unit * self.quantity
+
+class RecipeClosure(db.Model):
+    """
+    Transitieve sluiting van de recepten (zie recipe_closure.py): één rij per gerecht of
+    bereiding en elk product of elke bereiding die er (onrechtstreeks) in zit, met de
+    totale hoeveelheid voor één recept van het gerecht (of één batch van de bereiding).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    ancestor_dish_id = db.Column(db.Integer, db.ForeignKey('dish.id', ondelete='CASCADE'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=True)
+    preparation_id = db.Column(db.Integer, db.ForeignKey('dish.id', ondelete='CASCADE'), nullable=True)
+    quantity = db.Column(db.Float, nullable=False, default=0)
+    depth = db.Column(db.Integer, nullable=False, default=1)  # 1 = rechtstreeks ingrediënt
+
+    __table_args__ = (
+        db.CheckConstraint(
+            '(product_id IS NOT NULL AND preparation_id IS NULL) OR (product_id IS NULL AND preparation_id IS NOT NULL)',
+            name='chk_recipe_closure_descendant'
+        ),
+        # Waar wordt dit product / deze bereiding gebruikt, en wat zit er in dit gerecht
+        db.Index('ix_recipe_closure_product', 'product_id', 'ancestor_dish_id'),
+        db.Index('ix_recipe_closure_preparation', 'preparation_id', 'ancestor_dish_id'),
+        db.Index('ix_recipe_closure_ancestor', 'ancestor_dish_id'),
+    )
+
+class Job(db.Model):
+    """
+    Achtergrondtaak (zie jobs.py): zware bewerkingen zoals imports en volledige
+    herberekeningen lopen in de jobworker in plaats van in een webrequest.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed, cancelled
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # uitstel bij een nieuwe poging
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    progress_done = db.Column(db.Integer, nullable=False, default=0)
+    progress_total = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.String(255), nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # De worker zoekt de oudste wachtende taak
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
@@ -0,0 +1,134 @@
+# pagination.py
+"""
+Keyset-paginatie (seek) voor de beheerlijsten.
+
+In plaats van OFFSET onthoudt een cursor de sorteerwaarde en het id van de laatste
+getoonde rij; de volgende pagina begint met WHERE (sorteerwaarde, id) > cursor.
+Elke pagina kost zo evenveel werk, hoe ver er ook gescrold wordt.
+"""
+import base64
+import json
+from collections import namedtuple
+from flask import abort, current_app, request, url_for
+from sqlalchemy import tuple_
+from models import Product, Dish
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'sort', 'direction'])
+
+# Sorteeropties per lijst: naam in de URL -> geïndexeerde kolom. Op een expressie
+# (coalesce, case) zou de database de hele lijst moeten sorteren in plaats van de index te lezen.
+# Rijen zonder waarde (nog niet berekende kostprijs) vallen weg uit de lijst op die kolom,
+# net als in de ranking; de cursor heeft zo altijd een waarde.
+PRODUCT_SORTS = {
+    'name': Product.name,
+    'unit_price': Product.unit_price,
+}
+DISH_SORTS = {
+    'name': Dish.name,
+    'cost': Dish.cost_price_cached,
+    'margin': Dish.profit_cached,
+}
+PREPARATION_SORTS = {
+    'name': Dish.name,
+    'cost': Dish.cost_price_cached,
+}
+
+
+def encode_cursor(sort_value, row_id):
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _cursor_types(sort_expr):
+    """Toegelaten Python-types voor de sorteerwaarde in een cursor op `sort_expr`."""
+    if sort_expr.type.python_type is str:
+        return (str,)
+    return (int, float)
+
+
+def decode_cursor(cursor, sort_expr=None):
+    """
+    Geeft (sorteerwaarde, id) terug. Een ongeldige cursor, of een sorteerwaarde die niet
+    past bij de gekozen sortering, geeft 400.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        abort(400, description="Ongeldige cursor.")
+    allowed = _cursor_types(sort_expr) if sort_expr is not None else (str, int, float)
+    if (not isinstance(sort_value, allowed) or isinstance(sort_value, bool)
+            or not isinstance(row_id, int) or isinstance(row_id, bool)):
+        abort(400, description="Ongeldige cursor.")
+    return sort_value, row_id
+
+
+def page_args(sorts):
+    """Leest sort, dir, cursor en per_page uit de querystring."""
+    sort = request.args.get('sort', 'name')
+    if sort not in sorts:
+        sort = 'name'
+    direction = 'desc' if request.args.get('dir') == 'desc' else 'asc'
+    default_size = current_app.config.get('LIST_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    page_size = min(max(request.args.get('per_page', default_size, type=int), 1), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor') or None
+    return sort, direction, cursor, page_size
+
+
+def keyset_page(query, sorts, id_column, sort='name', direction='asc', cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Eén pagina van `query`, gesorteerd op (sorteerwaarde, id). Er wordt één rij extra
+    opgehaald om te weten of er nog een volgende pagina is.
+    """
+    sort_expr = sorts[sort]
+    key = tuple_(sort_expr, id_column)
+    if sort_expr.nullable:
+        query = query.filter(sort_expr.is_not(None))
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_expr)
+        query = query.filter(key < tuple_(sort_value, row_id) if direction == 'desc' else key > tuple_(sort_value, row_id))
+    if direction == 'desc':
+        query = query.order_by(sort_expr.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_expr, id_column)
+
+    rows = query.add_columns(sort_expr.label('sort_key')).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.sort_key, last[0].id)
+    return Page([row[0] for row in rows], next_cursor, sort, direction)
+
+
+def next_page_urls(page, html_endpoint, json_endpoint):
+    """(HTML-url, JSON-url) van de volgende pagina met dezelfde filters, of (None, None)."""
+    if not page.next_cursor:
+        return None, None
+    args = request.args.to_dict()
+    args.update(cursor=page.next_cursor, sort=page.sort, dir=page.direction)
+    return url_for(html_endpoint, **args), url_for(json_endpoint, **args)
+
+
+def page_payload(page, items, html_endpoint, json_endpoint):
+    """JSON-antwoord voor de 'meer laden'-endpoints."""
+    next_page_url, next_json_url = next_page_urls(page, html_endpoint, json_endpoint)
+    return {
+        'items': items,
+        'next_cursor': page.next_cursor,
+        'next_page_url': next_page_url,
+        'next_json_url': next_json_url,
+    }
+
+
+def sort_url(sort):
+    """Link voor een kolomhoofding: eerste pagina, zelfde filters, omgekeerde richting bij een tweede klik."""
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    same_sort = args.get('sort', 'name') == sort
+    args['dir'] = 'desc' if same_sort and args.get('dir') != 'desc' else 'asc'
+    args['sort'] = sort
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
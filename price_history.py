@@ -0,0 +1,138 @@
+# price_history.py
+"""
+Prijshistoriek van producten en kostprijzen op een willekeurige datum.
+
+Elke prijswijziging (formulier of bulk-import) voegt één rij toe aan
+ProductPriceHistory. Voor een as-of-berekening wordt de prijs op elk gevraagd
+tijdstip opgezocht en via BomMatrix doorgerekend. Let op: de recepten zelf worden
+niet gehistoriseerd, dus de huidige samenstelling van elk gerecht wordt gebruikt.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import func, insert, select, true, union_all
+from extensions import db
+from models import Dish, ProductPriceHistory
+from cost_engine import DishCost, unit_price
+from metrics import COST_ENGINE
+
+
+def record_prices(rows, valid_from=None, session=None):
+    """
+    Voegt in één bulk-INSERT een historiekrij toe per gewijzigde productprijs.
+    rows: dicts met product_id, package_price en package_weight.
+    """
+    session = session or db.session
+    valid_from = valid_from or datetime.utcnow()
+    rows = [
+        {'product_id': row['product_id'], 'package_price': row['package_price'],
+         'package_weight': row['package_weight'], 'valid_from': valid_from}
+        for row in rows
+    ]
+    if rows:
+        session.execute(insert(ProductPriceHistory), rows)
+
+
+def _timestamp(moment):
+    # valid_from wordt als naïeve UTC-tijd opgeslagen
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def price_matrix_as_of(bom, moments, session=None, product_ids=None):
+    """
+    Eenheidsprijzen per product (rij) en tijdstip (kolom), uit één query op de historiek.
+    Vóór de eerste gekende prijs van een product geldt die eerste prijs; producten zonder
+    historiek houden hun huidige prijs. Met `product_ids` wordt enkel de historiek van die
+    producten gelezen (een BomMatrix voor een deel van de gerechten).
+    """
+    import numpy as np  # Enkel hier nodig; webworkers laden NumPy zo niet bij het opstarten
+    session = session or db.session
+    prices = np.repeat(bom.base_prices[:, None], len(moments), axis=1)
+    if not moments:
+        return prices
+
+    # Eén query met drie delen, telkens langs de index (product_id, valid_from):
+    # - per product de laatste prijs op het eerste tijdstip,
+    # - de wijzigingen tussen het eerste en het laatste tijdstip,
+    # - de eerste gekende prijs van producten waarvan de historiek pas later begint.
+    # Oudere wijzigingen worden zo nooit gelezen.
+    h = ProductPriceHistory
+    start, end = min(moments), max(moments)
+    in_scope = h.product_id.in_(product_ids) if product_ids is not None else true()
+    latest = (
+        select(h.id, func.row_number().over(partition_by=h.product_id, order_by=(h.valid_from.desc(), h.id.desc())).label('rank'))
+        .where(in_scope, h.valid_from <= start)
+        .subquery()
+    )
+    first = (
+        select(h.product_id, func.min(h.valid_from).label('first_valid_from'))
+        .where(in_scope)
+        .group_by(h.product_id)
+        .having(func.min(h.valid_from) > end)
+        .subquery()
+    )
+    columns = (h.product_id, h.package_price, h.package_weight, h.valid_from, h.id)
+    query = union_all(
+        select(*columns).join(latest, (h.id == latest.c.id) & (latest.c.rank == 1)),
+        select(*columns).where(in_scope, h.valid_from > start, h.valid_from <= end),
+        select(*columns).join(first, (h.product_id == first.c.product_id) & (h.valid_from == first.c.first_valid_from)),
+    )
+    history = session.execute(select(query.subquery()).order_by('product_id', 'valid_from', 'id')).all()
+    history = [row for row in history if row.product_id in bom.product_index]
+    if not history:
+        return prices
+
+    product_rows = np.array([bom.product_index[row.product_id] for row in history], dtype=np.int64)
+    times = np.array([_timestamp(row.valid_from) for row in history])
+    units = np.array([unit_price(row.package_price, row.package_weight) for row in history], dtype=float)
+    moment_times = np.array([_timestamp(m) for m in moments])
+
+    # Sleutel (product, tijd) als één gesorteerde float, zodat searchsorted per tijdstip
+    # voor alle producten tegelijk de laatste geldige rij vindt.
+    origin = min(times.min(), moment_times.min())
+    span = max(times.max(), moment_times.max()) - origin + 1
+    keys = product_rows * span + (times - origin)
+
+    products, first_rows = np.unique(product_rows, return_index=True)
+    prices[products, :] = units[first_rows][:, None]
+    for column, moment in enumerate(moment_times):
+        positions = np.searchsorted(keys, products * span + (moment - origin), side='right') - 1
+        valid = (positions >= 0) & (product_rows[positions.clip(0)] == products)
+        prices[products[valid], column] = units[positions[valid]]
+    return prices
+
+
+@COST_ENGINE.labels('costs_as_of').time()
+def dish_costs_as_of(moments, dish_ids=None, session=None):
+    """
+    Kostprijs en verkoopprijs van alle gerechten op elk van de gevraagde tijdstippen,
+    in één doorrekening: {dish_id: [DishCost per tijdstip]}. Met `dish_ids` wordt enkel
+    de receptenboom van die gerechten geladen; het resultaat bevat dan ook hun bereidingen.
+    """
+    from bom_matrix import BomMatrix
+    session = session or db.session
+    bom = BomMatrix.load(session=session, dish_ids=dish_ids)
+    product_ids = bom.product_ids if dish_ids is not None else None
+    costs = bom.cost_matrix(price_matrix_as_of(bom, moments, session=session, product_ids=product_ids))
+    selling = bom.selling_price_vector(costs)
+    return {
+        dish_id: [DishCost(float(costs[i, j]), float(selling[i, j])) for j in range(len(moments))]
+        for i, dish_id in enumerate(bom.dish_ids)
+    }
+
+
+def cost_trend(dish_ids, start, end, points=12, session=None):
+    """Kostprijsverloop van de opgegeven gerechten op `points` gelijk verdeelde tijdstippen."""
+    session = session or db.session
+    points = max(points, 2)
+    step = (end - start) / (points - 1)
+    moments = [start + step * i for i in range(points)]
+    costs = dish_costs_as_of(moments, dish_ids=dish_ids, session=session)
+    names = dict(session.execute(select(Dish.id, Dish.name).where(Dish.id.in_(dish_ids))).all())
+    return {
+        'labels': [m.strftime('%Y-%m-%d') for m in moments],
+        'datasets': [
+            {'id': dish_id, 'name': names[dish_id], 'data': [c.cost_price for c in costs[dish_id]]}
+            for dish_id in dish_ids if dish_id in names and dish_id in costs
+        ],
+    }
@@ -0,0 +1,318 @@
+# price_import.py
+import csv
+import io
+import os
+from collections import namedtuple
+from sqlalchemy import select, text
+from extensions import db
+from models import Product, Supplier, Category
+from cost_engine import refresh_costs
+from price_history import record_prices
+from data_version import mark_rows_changed
+
+# Aantal rijen per transactie. Het geheugengebruik hangt hiervan af, niet van de bestandsgrootte.
+DEFAULT_CHUNK_SIZE = 5000
+
+# Aantal foutmeldingen per rij dat in de samenvatting bewaard wordt; de rest wordt enkel geteld.
+MAX_REPORTED_ERRORS = 20
+
+# Toegelaten kolomnamen (kleine letters) per veld, zodat leverancierslijsten zonder aanpassing werken
+COLUMN_ALIASES = {
+    'article_number': ('article_number', 'artikelnummer', 'artikelnr', 'artnr', 'sku'),
+    'package_price': ('package_price', 'prijs', 'price', 'verpakkingsprijs'),
+    'package_weight': ('package_weight', 'gewicht', 'inhoud', 'weight'),
+    'package_unit': ('package_unit', 'eenheid', 'unit'),
+    'name': ('name', 'naam', 'omschrijving', 'description'),
+    'supplier': ('supplier', 'leverancier'),
+    'category': ('category', 'categorie'),
+}
+
+
+KnownProduct = namedtuple('KnownProduct', ['id', 'package_price', 'package_weight'])
+
+
+class PriceImportError(ValueError):
+    """Het prijsbestand kan niet gelezen worden."""
+
+
+def _parse_number(value):
+    """
+    Leest een prijs of gewicht. Het laatste scheidingsteken (',' of '.') is het decimaalteken,
+    het andere scheidt duizendtallen: 1.234,56 en 1,234.56 worden allebei 1234.56.
+    Eén scheidingsteken met precies drie cijfers erna (1.250 of 1,250) kan beide zijn en
+    geeft, net als slecht gegroepeerde duizendtallen, een ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip().replace('€', '').replace(' ', '').replace('\xa0', '')
+    if not value:
+        return None
+    sign = ''
+    if value[0] in '+-':
+        sign, value = value[0], value[1:]
+    last = max(value.rfind(','), value.rfind('.'))
+    if last == -1:
+        if not value.isdigit():
+            raise ValueError(f"Ongeldig getal {value!r}.")
+        return float(sign + value)
+
+    decimal = value[last]
+    thousands = '.' if decimal == ',' else ','
+    integer, fraction = value[:last], value[last + 1:]
+    if decimal in integer:
+        # Hetzelfde teken meermaals (1.234.567): enkel duizendtallen, geen decimalen
+        if thousands in value:
+            raise ValueError(f"Ongeldig getal {value!r}.")
+        integer, fraction, thousands = value, '', decimal
+    elif thousands not in integer and len(fraction) == 3 and 0 < len(integer.lstrip('0')) <= 3:
+        raise ValueError(f"Dubbelzinnig getal {value!r}: decimaal- of duizendtalscheiding?")
+
+    groups = integer.split(thousands)
+    if len(groups) > 1 and (not 1 <= len(groups[0]) <= 3 or any(len(group) != 3 for group in groups[1:])):
+        raise ValueError(f"Ongeldige duizendtallen in {value!r}.")
+    digits = ''.join(groups) or '0'
+    if not digits.isdigit() or (fraction and not fraction.isdigit()):
+        raise ValueError(f"Ongeldig getal {value!r}.")
+    return float(f"{sign}{digits}.{fraction or '0'}")
+
+
+def _map_header(header):
+    positions = {}
+    normalized = [str(h or '').strip().lower() for h in header]
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                positions[field] = normalized.index(alias)
+                break
+    if 'article_number' not in positions or 'package_price' not in positions:
+        raise PriceImportError("Het bestand heeft minstens een kolom voor artikelnummer en prijs nodig.")
+    return positions
+
+
+def iter_price_rows(stream, filename):
+    """
+    Leest een CSV- of XLSX-bestand rij per rij en geeft dicts met de gekende velden terug.
+    Er wordt nooit het volledige bestand in het geheugen geladen.
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        rows = _iter_xlsx(stream)
+    else:
+        rows = _iter_csv(stream)
+    positions = None
+    for row in rows:
+        if positions is None:
+            positions = _map_header(row)
+            continue
+        if not any(cell not in (None, '') for cell in row):
+            continue
+        yield {field: (row[i] if i < len(row) else None) for field, i in positions.items()}
+    if positions is None:
+        raise PriceImportError("Het bestand is leeg.")
+
+
+def _iter_csv(stream):
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    sample = stream.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(_chain(sample, stream), dialect)
+
+
+def _chain(sample, stream):
+    # Plakt de al gelezen sample terug voor de rest van de stream, regel per regel
+    rest = io.StringIO(sample)
+    pending = ''
+    for line in rest:
+        if line.endswith(('\n', '\r')):
+            yield pending + line
+            pending = ''
+        else:
+            pending += line
+    for line in stream:
+        yield pending + line
+        pending = ''
+    if pending:
+        yield pending
+
+
+def _iter_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise PriceImportError("Voor XLSX-bestanden is het pakket 'openpyxl' nodig.")
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def _chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_prices(rows, supplier_name=None, category_name=None, create_missing=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                  progress=None, session=None):
+    """
+    Werkt productprijzen bij op basis van (leverancier, artikelnummer).
+
+    Rijen worden per chunk verwerkt: één bulk-UPDATE (COPY naar een staging-tabel op
+    PostgreSQL, executemany op SQLite), de kostprijzen van afhankelijke gerechten worden
+    bijgewerkt en daarna wordt de chunk gecommit. Onbekende artikelnummers worden enkel
+    als nieuw product aangemaakt met create_missing en een gekende categorie.
+    Geeft een samenvatting terug met de aantallen changed, unchanged, new, unmatched en invalid,
+    en onder 'errors' de reden voor de eerste MAX_REPORTED_ERRORS ongeldige prijzen.
+    `progress(verwerkte_rijen)` wordt na elke gecommitte chunk aangeroepen (zie jobs.py).
+    """
+    session = session or db.session
+    summary = {'changed': 0, 'unchanged': 0, 'new': 0, 'unmatched': 0, 'invalid': 0, 'errors': []}
+    processed = 0
+
+    suppliers = {name.lower(): id for id, name in session.execute(select(Supplier.id, Supplier.name))}
+    categories = {name.lower(): id for id, name in session.execute(select(Category.id, Category.name))}
+    default_supplier_id = None
+    if supplier_name:
+        default_supplier_id = suppliers.get(supplier_name.strip().lower())
+        if default_supplier_id is None:
+            raise PriceImportError(f"Leverancier '{supplier_name}' bestaat niet.")
+    default_category_id = categories.get(category_name.strip().lower()) if category_name else None
+
+    # (leverancier, artikelnummer) -> bestaand product; enkel voor de betrokken leveranciers
+    known = {}
+    loaded_suppliers = set()
+
+    def products_for(supplier_id):
+        if supplier_id not in loaded_suppliers:
+            loaded_suppliers.add(supplier_id)
+            for row in session.execute(
+                select(Product.id, Product.article_number, Product.package_price, Product.package_weight)
+                .where(Product.supplier_id == supplier_id, Product.article_number.is_not(None))
+            ):
+                known[(supplier_id, row.article_number.strip())] = KnownProduct(row.id, row.package_price, row.package_weight)
+        return known
+
+    for chunk in _chunked(rows, chunk_size):
+        updates, inserts = {}, []
+        for row in chunk:
+            article_number = str(row.get('article_number') or '').strip()
+            if article_number.endswith('.0'):
+                article_number = article_number[:-2]  # Excel geeft artikelnummers soms als float
+            supplier_id = default_supplier_id
+            if row.get('supplier'):
+                supplier_id = suppliers.get(str(row['supplier']).strip().lower())
+            try:
+                price = _parse_number(row.get('package_price'))
+                weight = _parse_number(row.get('package_weight'))
+            except ValueError as e:
+                summary['invalid'] += 1
+                if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                    summary['errors'].append(f"Artikel {article_number or '?'}: {e}")
+                continue
+            if not article_number or price is None or supplier_id is None:
+                summary['invalid'] += 1
+                continue
+
+            existing = products_for(supplier_id).get((supplier_id, article_number))
+            if existing is None:
+                category_id = categories.get(str(row.get('category') or '').strip().lower(), default_category_id)
+                name = str(row.get('name') or '').strip()
+                if create_missing and category_id and name:
+                    inserts.append({
+                        'name': name, 'category_id': category_id, 'supplier_id': supplier_id,
+                        'article_number': article_number, 'package_price': price, 'package_weight': weight,
+                        'package_unit': str(row.get('package_unit') or 'Stuks').strip() or 'Stuks',
+                    })
+                else:
+                    summary['unmatched'] += 1
+                continue
+
+            new_weight = existing.package_weight if weight is None else weight
+            if price == existing.package_price and new_weight == existing.package_weight:
+                summary['unchanged'] += 1
+                continue
+            updates[existing.id] = {'id': existing.id, 'package_price': price, 'package_weight': new_weight}
+            known[(supplier_id, article_number)] = existing._replace(package_price=price, package_weight=new_weight)
+
+        if updates:
+            _bulk_update_prices(session, list(updates.values()))
+            record_prices([dict(u, product_id=u['id']) for u in updates.values()], session=session)
+        if inserts:
+            inserted = _insert_products(session, inserts)
+            summary['new'] += inserted
+            summary['unmatched'] += len(inserts) - inserted
+        changed_ids = list(updates)
+        summary['changed'] += len(changed_ids)
+        refresh_costs(product_ids=changed_ids, session=session)
+        session.commit()
+        processed += len(chunk)
+        if progress:
+            progress(processed)
+    return summary
+
+
+def _bulk_update_prices(session, updates):
+    mark_rows_changed('product', [u['id'] for u in updates], session=session)  # text()-UPDATE's worden niet automatisch herkend
+    if session.get_bind().dialect.name == 'postgresql':
+        _copy_update_prices(session, updates)
+    else:
+        session.execute(
+            text("UPDATE product SET package_price = :package_price, package_weight = :package_weight WHERE id = :id"),
+            updates,
+        )
+
+
+def _copy_update_prices(session, updates):
+    """PostgreSQL: COPY naar een tijdelijke staging-tabel en één UPDATE ... FROM."""
+    session.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS product_price_staging "
+        "(id integer PRIMARY KEY, package_price double precision, package_weight double precision) ON COMMIT DELETE ROWS"
+    ))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for u in updates:
+        writer.writerow([u['id'], u['package_price'], '' if u['package_weight'] is None else u['package_weight']])
+    buffer.seek(0)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert("COPY product_price_staging (id, package_price, package_weight) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+    session.execute(text(
+        "UPDATE product SET package_price = s.package_price, package_weight = s.package_weight "
+        "FROM product_price_staging s WHERE product.id = s.id"
+    ))
+
+
+def _insert_products(session, inserts):
+    """Voegt nieuwe producten toe; namen die al bestaan worden overgeslagen (naam is uniek)."""
+    names = [row['name'] for row in inserts]
+    taken = set(session.scalars(select(Product.name).where(Product.name.in_(names))))
+    fresh, seen = [], set()
+    for row in inserts:
+        if row['name'] not in taken and row['name'] not in seen:
+            seen.add(row['name'])
+            fresh.append(row)
+    if fresh:
+        session.execute(Product.__table__.insert(), fresh)
+        ids = dict(session.execute(select(Product.name, Product.id).where(Product.name.in_([row['name'] for row in fresh]))).all())
+        record_prices([dict(row, product_id=ids[row['name']]) for row in fresh], session=session)
+    return len(fresh)
+
+
+def price_summary_message(summary):
+    return (f"{summary['changed']} prijzen gewijzigd, {summary['unchanged']} ongewijzigd, "
+            f"{summary['new']} nieuwe producten, {summary['unmatched']} niet gevonden, {summary['invalid']} ongeldig.")
@@ -0,0 +1,135 @@
+# price_simulation.py
+import numpy as np
+from sqlalchemy import select
+from extensions import db
+from models import Product, Dish
+from bom_matrix import BomMatrix
+from metrics import COST_ENGINE
+
+# Sleutels waarmee een override zijn producten selecteert, van breed naar specifiek
+OVERRIDE_TARGETS = ('category_id', 'supplier_id', 'product_id')
+
+
+class ScenarioError(ValueError):
+    """Een scenario of override is ongeldig."""
+
+
+def parse_scenarios(data):
+    """
+    Valideert een lijst scenario's zoals:
+
+        [{"name": "Van Zon +7%", "overrides": [{"supplier_id": 1, "percentage": 7}]},
+         {"name": "Friet", "overrides": [{"product_id": 1, "package_price": 6.5}]}]
+
+    Elke override kiest producten via category_id, supplier_id of product_id en past
+    ofwel een procentuele wijziging ('percentage') ofwel een nieuwe verpakkingsprijs
+    ('package_price') toe. Overrides worden in volgorde toegepast.
+    """
+    if not isinstance(data, list):
+        raise ScenarioError("Verwacht een lijst van scenario's.")
+    scenarios = []
+    for i, scenario in enumerate(data):
+        if not isinstance(scenario, dict):
+            raise ScenarioError(f"Scenario {i} is geen object.")
+        raw_overrides = scenario.get('overrides', [])
+        if not isinstance(raw_overrides, list):
+            raise ScenarioError(f"Scenario {i}: 'overrides' moet een lijst zijn.")
+        overrides = []
+        for override in raw_overrides:
+            if not isinstance(override, dict):
+                raise ScenarioError(f"Scenario {i}: elke override moet een object zijn.")
+            targets = [key for key in OVERRIDE_TARGETS if override.get(key) is not None]
+            if len(targets) != 1:
+                raise ScenarioError(f"Scenario {i}: elke override heeft precies één van {', '.join(OVERRIDE_TARGETS)} nodig.")
+            if ('percentage' in override) == ('package_price' in override):
+                raise ScenarioError(f"Scenario {i}: geef ofwel 'percentage' ofwel 'package_price' op.")
+            try:
+                overrides.append({
+                    'target': targets[0],
+                    'target_id': int(override[targets[0]]),
+                    'percentage': float(override['percentage']) if 'percentage' in override else None,
+                    'package_price': float(override['package_price']) if 'package_price' in override else None,
+                })
+            except (ValueError, TypeError):
+                raise ScenarioError(f"Scenario {i}: ongeldige waarde in override {override!r}.")
+        scenarios.append({'name': str(scenario.get('name') or f'Scenario {i + 1}'), 'overrides': overrides})
+    return scenarios
+
+
+def parse_only_changed(value):
+    """Leest de optie only_changed: enkel true of false (standaard true), geen tekst of getal."""
+    if value is None:
+        return True
+    if not isinstance(value, bool):
+        raise ScenarioError("'only_changed' moet true of false zijn.")
+    return value
+
+
+def _price_matrix(bom, scenarios, session):
+    """Eenheidsprijzen per product (rij) en scenario (kolom)."""
+    products = session.execute(
+        select(Product.id, Product.category_id, Product.supplier_id, Product.package_weight).order_by(Product.id)
+    ).all()
+    columns = {
+        'product_id': np.array([row.id for row in products]),
+        'category_id': np.array([row.category_id for row in products]),
+        'supplier_id': np.array([row.supplier_id for row in products]),
+    }
+    weights = np.array([row.package_weight or 0 for row in products], dtype=float)
+    valid_weight = weights > 0
+
+    prices = np.repeat(bom.base_prices[:, None], len(scenarios), axis=1)
+    for s, scenario in enumerate(scenarios):
+        for override in scenario['overrides']:
+            mask = columns[override['target']] == override['target_id']
+            if override['percentage'] is not None:
+                prices[mask, s] *= 1 + override['percentage'] / 100
+            else:
+                prices[mask, s] = np.where(valid_weight[mask], override['package_price'] / np.where(valid_weight[mask], weights[mask], 1), 0)
+    return prices
+
+
+@COST_ENGINE.labels('simulate').time()
+def simulate(scenarios, only_changed=True, session=None):
+    """
+    Rekent alle scenario's in één batch door over de bestaande receptenboom, zonder
+    iets naar de database te schrijven. Geeft per scenario de eindgerechten terug met
+    nieuwe kostprijs, verkoopprijs en marge, en het verschil met de huidige marge.
+    """
+    session = session or db.session
+    bom = BomMatrix.load(session=session)
+    if not scenarios:
+        return []
+
+    base_cost = bom.cost_vector()
+    base_margin = bom.selling_price_vector(base_cost) - base_cost
+    costs = bom.cost_matrix(_price_matrix(bom, scenarios, session))
+    selling = bom.selling_price_vector(costs)
+    margins = selling - costs
+
+    names = dict(session.execute(select(Dish.id, Dish.name)).all())
+    dish_rows = np.flatnonzero(~bom.is_preparation)
+    results = []
+    for s, scenario in enumerate(scenarios):
+        cost_delta = costs[dish_rows, s] - base_cost[dish_rows]
+        margin_delta = margins[dish_rows, s] - base_margin[dish_rows]
+        rows = dish_rows[~np.isclose(cost_delta, 0)] if only_changed else dish_rows
+        dishes = []
+        for i in rows:
+            dish_id = bom.dish_ids[i]
+            dishes.append({
+                'id': dish_id,
+                'name': names.get(dish_id),
+                'cost_price': float(costs[i, s]),
+                'selling_price': float(selling[i, s]),
+                'margin': float(margins[i, s]),
+                'cost_delta': float(costs[i, s] - base_cost[i]),
+                'margin_delta': float(margins[i, s] - base_margin[i]),
+            })
+        results.append({
+            'name': scenario['name'],
+            'total_cost_delta': float(cost_delta.sum()),
+            'total_margin_delta': float(margin_delta.sum()),
+            'dishes': dishes,
+        })
+    return results
@@ -0,0 +1,233 @@
+# product_search.py
+"""
+Zoekindex voor producten op naam, leveranciersnaam en artikelnummer.
+
+- SQLite: een FTS5-tabel `product_search` (rowid = product.id), gerangschikt met bm25.
+- PostgreSQL: een tsvector-kolom `product.search_vector` met GIN-index, plus een
+  trigram-index op de naam.
+
+In beide gevallen houden databasetriggers de index bij, dus ook bulk-INSERTs en
+UPDATEs buiten de ORM (prijsimport, seeder, catalogusgenerator) blijven in sync.
+De index wordt aangemaakt door de migratie en, voor db.create_all(), via een
+after_create-event op de producttabel. Migratie 3c1d7e5a9b42 heeft een eigen kopie van
+de DDL: een wijziging hieronder vraagt ook een nieuwe migratie.
+"""
+import re
+from sqlalchemy import event, literal, select, text
+from sqlalchemy.orm import joinedload
+from extensions import db
+from models import Product, Supplier
+
+SEARCH_TABLE = 'product_search'
+DEFAULT_LIMIT = 10
+
+# Maximum aantal matches dat de typeahead rangschikt
+RANK_CANDIDATES = 1000
+
+# Relatief gewicht van de kolommen bij het rangschikken (naam, leverancier, artikelnummer)
+BM25_WEIGHTS = (10.0, 2.0, 5.0)
+
+_SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        name, supplier, article_number,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON product BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, name, supplier, article_number)
+        VALUES (new.id, new.name, (SELECT name FROM supplier WHERE id = new.supplier_id), coalesce(new.article_number, ''));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_update AFTER UPDATE OF name, supplier_id, article_number ON product BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+        INSERT INTO {SEARCH_TABLE} (rowid, name, supplier, article_number)
+        VALUES (new.id, new.name, (SELECT name FROM supplier WHERE id = new.supplier_id), coalesce(new.article_number, ''));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON product BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_supplier AFTER UPDATE OF name ON supplier BEGIN
+        UPDATE {SEARCH_TABLE} SET supplier = new.name WHERE rowid IN (SELECT id FROM product WHERE supplier_id = new.id);
+    END""",
+]
+_SQLITE_REBUILD = [
+    f"DELETE FROM {SEARCH_TABLE}",
+    f"""INSERT INTO {SEARCH_TABLE} (rowid, name, supplier, article_number)
+        SELECT product.id, product.name, supplier.name, coalesce(product.article_number, '')
+        FROM product JOIN supplier ON supplier.id = product.supplier_id""",
+]
+_SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS product_search_insert",
+    "DROP TRIGGER IF EXISTS product_search_update",
+    "DROP TRIGGER IF EXISTS product_search_delete",
+    "DROP TRIGGER IF EXISTS product_search_supplier",
+    f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+]
+
+_POSTGRES_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """CREATE OR REPLACE FUNCTION product_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.article_number, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce((SELECT name FROM supplier WHERE id = NEW.supplier_id), '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS product_search_vector ON product",
+    """CREATE TRIGGER product_search_vector BEFORE INSERT OR UPDATE OF name, supplier_id, article_number
+        ON product FOR EACH ROW EXECUTE FUNCTION product_search_vector()""",
+    """CREATE OR REPLACE FUNCTION product_search_supplier() RETURNS trigger AS $$
+    BEGIN
+        UPDATE product SET name = name WHERE supplier_id = NEW.id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS product_search_supplier ON supplier",
+    """CREATE TRIGGER product_search_supplier AFTER UPDATE OF name ON supplier
+        FOR EACH ROW EXECUTE FUNCTION product_search_supplier()""",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_product_name_trgm ON product USING gin (name gin_trgm_ops)",
+]
+_POSTGRES_REBUILD = [
+    "UPDATE product SET name = name",
+]
+_POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS product_search_supplier ON supplier",
+    "DROP FUNCTION IF EXISTS product_search_supplier()",
+    "DROP TRIGGER IF EXISTS product_search_vector ON product",
+    "DROP FUNCTION IF EXISTS product_search_vector()",
+    "DROP INDEX IF EXISTS ix_product_name_trgm",
+    "DROP INDEX IF EXISTS ix_product_search_vector",
+    "ALTER TABLE product DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _statements(connection, sqlite, postgres):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        return sqlite
+    if dialect == 'postgresql':
+        return postgres
+    return []
+
+
+def create_search_index(connection, rebuild=True):
+    """Maakt de zoekindex en triggers aan en vult de index met de bestaande producten."""
+    for statement in _statements(connection, _SQLITE_CREATE, _POSTGRES_CREATE):
+        connection.execute(text(statement))
+    if rebuild:
+        rebuild_search_index(connection)
+
+
+def rebuild_search_index(connection):
+    """Vult de zoekindex opnieuw vanuit de product- en leverancierstabel."""
+    for statement in _statements(connection, _SQLITE_REBUILD, _POSTGRES_REBUILD):
+        connection.execute(text(statement))
+
+
+def drop_search_index(connection):
+    for statement in _statements(connection, _SQLITE_DROP, _POSTGRES_DROP):
+        connection.execute(text(statement))
+
+
+@event.listens_for(Product.__table__, 'after_create')
+def _create_after_table(target, connection, **kw):
+    create_search_index(connection, rebuild=False)
+
+
+@event.listens_for(Product.__table__, 'before_drop')
+def _drop_before_table(target, connection, **kw):
+    drop_search_index(connection)
+
+
+def search_index_filter(obj, name, type_, reflected, compare_to):
+    """include_object voor Alembic: de zoekindex wordt niet door autogenerate beheerd."""
+    if type_ == 'table' and name.startswith(SEARCH_TABLE):
+        return False
+    if type_ == 'column' and name == 'search_vector':
+        return False
+    if type_ == 'index' and name in ('ix_product_search_vector', 'ix_product_name_trgm'):
+        return False
+    return True
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:8]
+
+
+def search_query(query, category_id=None, candidates=None, session=None):
+    """
+    SELECT van (id, rank) voor de producten die op alle zoektermen matchen; elke term
+    mag een prefix zijn ('tomatenk heinz' vindt 'Tomatenketchup' van leverancier Heinz).
+    Een lagere rank is een betere match. Geeft None terug zonder bruikbare termen.
+
+    Met `candidates` worden enkel de eerste zoveel matches gerangschikt: bij een brede
+    zoekterm ('pr') kost bm25/ts_rank over alle producten anders het meeste tijd.
+    """
+    terms = _terms(query)
+    if not terms:
+        return None
+    session = session or db.session
+    dialect = session.get_bind().dialect.name
+    params = {}
+    if dialect == 'sqlite':
+        weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+        params['match'] = ' '.join(f'"{term}"*' for term in terms)
+        if category_id:
+            # CROSS JOIN legt de volgorde vast: eerst de FTS-match, dan per match de categorie.
+            # Andersom overloopt SQLite de FTS-index opnieuw voor elk product van de categorie.
+            sql = (f"SELECT {SEARCH_TABLE}.rowid AS id, bm25({SEARCH_TABLE}, {weights}) AS rank "
+                   f"FROM {SEARCH_TABLE} CROSS JOIN product ON product.id = {SEARCH_TABLE}.rowid "
+                   f"WHERE {SEARCH_TABLE} MATCH :match AND product.category_id = :category_id")
+        else:
+            sql = (f"SELECT rowid AS id, bm25({SEARCH_TABLE}, {weights}) AS rank FROM {SEARCH_TABLE} "
+                   f"WHERE {SEARCH_TABLE} MATCH :match")
+    elif dialect == 'postgresql':
+        # tsvector voor woorden en prefixen, de trigram-index ook voor stukken midden in een
+        # woord ('ketchup' in 'Tomatenketchup'); die laatste matches komen achteraan.
+        sql = ("SELECT id, -ts_rank(search_vector, to_tsquery('simple', :tsquery)) AS rank FROM product "
+               "WHERE (search_vector @@ to_tsquery('simple', :tsquery) OR name ILIKE :pattern)")
+        params['tsquery'] = ' & '.join(f'{term}:*' for term in terms)
+        params['pattern'] = '%' + '%'.join(terms) + '%'
+        if category_id:
+            sql += " AND category_id = :category_id"
+    else:
+        # Andere databases: zonder index, zoals vroeger met ILIKE
+        conditions = [
+            Product.name.ilike(f'%{term}%') | Supplier.name.ilike(f'%{term}%') | Product.article_number.ilike(f'%{term}%')
+            for term in terms
+        ]
+        if category_id:
+            conditions.append(Product.category_id == category_id)
+        select_ = select(Product.id, literal(0.0).label('rank')).join(Product.supplier).where(*conditions)
+        return select_.limit(candidates) if candidates else select_
+
+    if category_id:
+        params['category_id'] = category_id
+    if candidates:
+        sql += " LIMIT :candidates"
+        params['candidates'] = candidates
+    return text(sql).bindparams(**params).columns(id=db.Integer, rank=db.Float)
+
+
+def matching_product_ids(query, session=None):
+    """SELECT met de ids van alle matchende producten, voor Product.id.in_(...)."""
+    select_ = search_query(query, session=session)
+    return select(select_.subquery().c.id) if select_ is not None else None
+
+
+def search_products(query, limit=DEFAULT_LIMIT, category_id=None, session=None):
+    """De `limit` best gerangschikte producten voor de typeahead."""
+    select_ = search_query(query, category_id=category_id, candidates=RANK_CANDIDATES, session=session)
+    if select_ is None:
+        return []
+    ranked = select_.subquery()
+    return (
+        Product.query.join(ranked, ranked.c.id == Product.id)
+        .options(joinedload(Product.supplier))
+        .order_by(ranked.c.rank, Product.name)
+        .limit(limit)
+        .all()
+    )
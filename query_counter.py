@@ -0,0 +1,59 @@
+# query_counter.py
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_QUERY_BUDGET = 15
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Een route voert meer SELECT-queries uit dan haar budget (waarschijnlijk een N+1)."""
+
+
+def query_budget(max_queries):
+    """
+    Decorator die het maximale aantal SELECT-queries voor een route vastlegt. Met
+    QUERY_BUDGET_ENFORCE faalt de query die het budget overschrijdt, dus nog tijdens de
+    view en vóór ze iets kan committen.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.query_budget = max_queries
+            return view(*args, **kwargs)
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_select(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and statement.lstrip()[:6].upper() in ('SELECT', 'WITH '):
+        g.query_count = g.get('query_count', 0) + 1
+        if current_app.config.get('QUERY_BUDGET_ENFORCE'):
+            budget = g.get('query_budget', current_app.config['QUERY_BUDGET_DEFAULT'])
+            if g.query_count > budget:
+                raise QueryBudgetExceeded(f"{request.endpoint} voert meer dan {budget} SELECT-queries uit.")
+
+
+def init_query_counter(app):
+    """
+    Telt de SELECT-queries per request. Met QUERY_BUDGET_ENFORCE (testmodus) faalt de
+    query boven het budget met QueryBudgetExceeded (zie _count_select); in debug-modus volgt
+    na de request een waarschuwing in de log wanneer een route haar budget overschreed.
+    """
+    app.config.setdefault('QUERY_BUDGET_DEFAULT', DEFAULT_QUERY_BUDGET)
+    app.config.setdefault('QUERY_BUDGET_ENFORCE', False)
+
+    @app.after_request
+    def check_query_budget(response):
+        count = g.get('query_count', 0)
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', current_app.config['QUERY_BUDGET_DEFAULT'])
+        if current_app.debug or current_app.testing:
+            response.headers['X-Query-Count'] = str(count)
+        # Enkel melden: de response is al opgebouwd en eventueel gecommit
+        if count > budget and current_app.debug:
+            current_app.logger.warning(f"{request.endpoint} voerde {count} SELECT-queries uit (budget {budget}).")
+        return response
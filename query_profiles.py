@@ -0,0 +1,22 @@
+# query_profiles.py
+from sqlalchemy.orm import joinedload, selectinload
+from models import Product, Dish, Ingredient
+
+# Benoemde sets loader-opties per scherm. Alles wat een route of template in een lus
+# aanspreekt, wordt hier vooraf in een vaste, kleine hoeveelheid queries geladen.
+
+# manage_dishes: categorie per gerecht
+DISH_LIST = (
+    joinedload(Dish.dish_category),
+)
+
+# edit_dish / edit_preparation: ingrediënten met hun product of bereiding
+RECIPE_FORM = (
+    selectinload(Dish.ingredients).joinedload(Ingredient.product),
+    selectinload(Dish.ingredients).joinedload(Ingredient.preparation),
+)
+
+# manage_products: categorie per product
+PRODUCT_LIST = (
+    joinedload(Product.category),
+)
@@ -0,0 +1,207 @@
+# read_replica.py
+"""
+Leesreplica voor de GET-views die enkel lezen (dashboard, beheerlijsten, catalogus).
+
+Met REPLICA_DATABASE_URL krijgt Flask-SQLAlchemy een tweede engine (bind 'replica').
+Views met @read_replica sturen dan hun SELECT's naar die replica; al het andere blijft
+op de primaire database:
+- schrijven (flush, INSERT/UPDATE/DELETE) gaat altijd naar de primaire, en wie in
+  een request schrijft, leest in dat request ook verder van de primaire;
+- na een schrijvend request leest dezelfde gebruiker (Flask-sessie) nog
+  REPLICA_STICKY_SECONDS van de primaire en ziet zo meteen de eigen wijziging;
+- een onbereikbare of achterlopende replica wordt overgeslagen.
+
+De achterstand wordt gemeten met de versietellers van data_version, die bij elke
+commit met gewijzigde data stijgen: om de REPLICA_CHECK_INTERVAL seconden worden de
+tellers van beide databases gelezen. Heeft de replica de tellers van een eerdere
+meting ingehaald, dan bevat ze alles wat vóór die meting gecommit was; de
+achterstand is dus hoogstens de tijd sinds die meting. Boven REPLICA_MAX_LAG
+seconden (of zolang de replica nog nooit bij was) leest iedereen van de primaire.
+
+Lokaal testen kan met twee SQLite-bestanden:
+    cp instance/kostprijs.db instance/replica.db
+    REPLICA_DATABASE_URL=sqlite:///$PWD/instance/replica.db flask run
+In debug- en testmodus vermeldt de header X-Database welke database gelezen werd.
+"""
+import os
+import threading
+import time
+from functools import wraps
+from flask import current_app, request, session
+from sqlalchemy import event, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from extensions import db
+from models import DataVersion
+
+REPLICA_BIND = 'replica'
+DEFAULT_MAX_LAG = 5.0
+DEFAULT_CHECK_INTERVAL = 1.0
+MAX_SAMPLES = 100
+
+_REPLICA_KEY = 'read_replica.engine'
+_WROTE_KEY = 'read_replica.wrote'
+_STICKY_KEY = '_primary_until'  # in de Flask-sessie: tot wanneer deze gebruiker van de primaire leest
+
+
+def _versions(engine):
+    with engine.connect() as connection:
+        return dict(connection.execute(select(DataVersion.scope, DataVersion.version)).all())
+
+
+class ReplicaMonitor:
+    """Houdt per proces bij of de replica bereikbaar is en hoe ver ze achterloopt."""
+
+    def __init__(self, max_lag=DEFAULT_MAX_LAG, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.caught_up_at = None  # tijdstip van de recentste meting die de replica ingehaald heeft
+        self.reason = 'nog niet gecontroleerd'
+        self._was_usable = False
+        self._samples = []  # [(tijdstip, tellers van de primaire)]
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def lag(self, now=None):
+        """Bovengrens van de achterstand in seconden, None als die onbekend is."""
+        if self.caught_up_at is None:
+            return None
+        return (now or time.time()) - self.caught_up_at
+
+    def usable(self):
+        now = time.time()
+        if now >= self._next_check and self._lock.acquire(blocking=False):
+            # Eén thread meet; de andere gebruiken intussen de vorige meting
+            try:
+                self._next_check = now + self.check_interval
+                self._check(now)
+            finally:
+                self._lock.release()
+        lag = self.lag(now)
+        usable = lag is not None and lag <= self.max_lag
+        if usable != self._was_usable:
+            self._was_usable = usable
+            if usable:
+                current_app.logger.info("Leesreplica in gebruik.")
+            else:
+                current_app.logger.warning(f"Leesreplica wordt niet gebruikt: {self.reason or 'loopt achter'}.")
+        return usable
+
+    def mark_down(self, reason):
+        """De replica faalde tijdens een request: overslaan tot de volgende meting."""
+        self._samples.clear()
+        self._set_state(None, f'onbereikbaar: {reason}')
+        self._next_check = time.time() + self.check_interval
+
+    def _check(self, now):
+        try:
+            primary = _versions(db.engines[None])
+        except DBAPIError as e:
+            self._set_state(None, f'primaire database onbereikbaar: {e.orig}')
+            return
+        try:
+            replica = _versions(db.engines[REPLICA_BIND])
+        except DBAPIError as e:
+            self._samples.clear()
+            self._set_state(None, f'onbereikbaar: {e.orig}')
+            return
+        self._samples.append((now, primary))
+        for i in range(len(self._samples) - 1, -1, -1):
+            moment, versions = self._samples[i]
+            if all(replica.get(scope, 0) >= version for scope, version in versions.items()):
+                # Oudere metingen zijn daarmee ook ingehaald
+                del self._samples[:i]
+                self._set_state(moment, None)
+                return
+        if len(self._samples) > MAX_SAMPLES:
+            del self._samples[1]  # de oudste blijft: de achterstand loopt vanaf daar
+        self._set_state(self.caught_up_at, 'loopt achter')
+
+    def _set_state(self, caught_up_at, reason):
+        self.caught_up_at = caught_up_at
+        self.reason = reason
+
+
+def replica_monitor():
+    return current_app.extensions.get('read_replica')
+
+
+def _use_replica():
+    """Zet de sessie van dit request op de replica als dat mag; geeft True terug als dat zo is."""
+    monitor = replica_monitor()
+    if monitor is None or request.method not in ('GET', 'HEAD'):
+        return False
+    if session.get(_STICKY_KEY, 0) > time.time() or not monitor.usable():
+        return False
+    if db.session.info.get(_WROTE_KEY):
+        return False
+    db.session.info[_REPLICA_KEY] = db.engines[REPLICA_BIND]
+    return True
+
+
+def read_replica(view):
+    """
+    Decorator voor GET-views die niets schrijven: hun queries mogen naar de leesreplica.
+    Faalt de replica midden in het request, dan wordt de view één keer opnieuw
+    uitgevoerd op de primaire database.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _use_replica():
+            return view(*args, **kwargs)
+        try:
+            return view(*args, **kwargs)
+        except DBAPIError as e:
+            if db.session.info.get(_WROTE_KEY):
+                raise
+            replica_monitor().mark_down(e.orig)
+            db.session.rollback()
+            db.session.info.pop(_REPLICA_KEY, None)
+            return view(*args, **kwargs)
+    wrapper.read_replica = True
+    return wrapper
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _route_reads(orm_execute_state):
+    session = orm_execute_state.session
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        session.info[_WROTE_KEY] = True
+        return
+    engine = session.info.get(_REPLICA_KEY)
+    if engine is not None and not session.info.get(_WROTE_KEY):
+        orm_execute_state.bind_arguments.setdefault('bind', engine)
+
+
+@event.listens_for(Session, 'after_flush')
+def _remember_write(session, flush_context):
+    session.info[_WROTE_KEY] = True
+
+
+def init_read_replica(app):
+    """
+    Activeert de routering als de replica geconfigureerd is (SQLALCHEMY_BINDS['replica'],
+    in create_app gezet vanuit REPLICA_DATABASE_URL). Zonder replica verandert er niets.
+    """
+    app.config.setdefault('REPLICA_MAX_LAG', float(os.environ.get('REPLICA_MAX_LAG', DEFAULT_MAX_LAG)))
+    app.config.setdefault('REPLICA_CHECK_INTERVAL', float(os.environ.get('REPLICA_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)))
+    # Wie net schreef, leest minstens zo lang van de primaire als de replica mag achterlopen
+    app.config.setdefault('REPLICA_STICKY_SECONDS', float(os.environ.get(
+        'REPLICA_STICKY_SECONDS', app.config['REPLICA_MAX_LAG'] + app.config['REPLICA_CHECK_INTERVAL'])))
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+    app.extensions['read_replica'] = ReplicaMonitor(
+        max_lag=app.config['REPLICA_MAX_LAG'],
+        check_interval=app.config['REPLICA_CHECK_INTERVAL'],
+    )
+
+    @app.after_request
+    def stick_to_primary(response):
+        if not db.session.registry.has():
+            return response
+        info = db.session.info
+        if info.get(_WROTE_KEY):
+            session[_STICKY_KEY] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+        if current_app.debug or current_app.testing:
+            response.headers['X-Database'] = 'replica' if info.get(_REPLICA_KEY) and not info.get(_WROTE_KEY) else 'primary'
+        return response
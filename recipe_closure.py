@@ -0,0 +1,199 @@
+# recipe_closure.py
+"""
+Transitieve "where-used"-index van de recepten.
+
+De tabel recipe_closure bevat voor elk gerecht en elke bereiding alle producten en
+bereidingen die er rechtstreeks of via tussenliggende bereidingen in zitten, met de
+uitgerekende hoeveelheid per recept. Waar een product gebruikt wordt en wat er in een
+gerecht zit, zijn daarmee telkens één geïndexeerde lookup.
+
+Bij een receptwijziging worden enkel de rijen van dat gerecht en van alles wat het
+(onrechtstreeks) gebruikt opnieuw berekend. Daarbij valt een cyclus meteen op: een
+bereiding die zichzelf bevat, geeft een CostCycleError en de transactie wordt niet
+gecommit.
+"""
+from collections import defaultdict
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.orm import aliased
+from extensions import db
+from cost_engine import IN_CHUNK_SIZE, CostCycleError, IngredientEdge
+from models import Dish, Ingredient, RecipeClosure
+
+INSERT_BATCH_SIZE = 5000
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[start:start + IN_CHUNK_SIZE]
+
+
+def _recipe_query():
+    """Ingrediëntregels met meteen de opbrengst van de gebruikte bereiding."""
+    preparation = aliased(Dish)
+    return (select(Ingredient.parent_dish_id, Ingredient.product_id, Ingredient.preparation_id, Ingredient.quantity,
+                   preparation.yield_quantity)
+            .outerjoin(preparation, preparation.id == Ingredient.preparation_id))
+
+
+def _add_recipe_rows(rows, edges, yields):
+    loaded = defaultdict(list)
+    for row in rows:
+        loaded[row.parent_dish_id].append(IngredientEdge(row.product_id, row.preparation_id, row.quantity))
+        if row.preparation_id is not None:
+            yields[row.preparation_id] = row.yield_quantity
+    for dish_id, dish_edges in loaded.items():
+        # Een gerecht kan in meerdere chunks opduiken; elke query geeft al zijn regels
+        edges.setdefault(dish_id, dish_edges)
+
+
+def _load_recipes(dish_ids, session):
+    """
+    Ingrediënten (edges) van deze gerechten én van alle gerechten en bereidingen die ze
+    (onrechtstreeks) gebruiken, met de opbrengst van elke gebruikte bereiding: één query
+    per chunk in plaats van aparte lookups voor de gebruikers, regels en opbrengsten.
+    """
+    edges, yields = {}, {}
+    for chunk in _chunks(dish_ids):
+        users = select(RecipeClosure.ancestor_dish_id).where(RecipeClosure.preparation_id.in_(chunk))
+        query = _recipe_query().where(or_(Ingredient.parent_dish_id.in_(chunk), Ingredient.parent_dish_id.in_(users)))
+        _add_recipe_rows(session.execute(query), edges, yields)
+    return edges, yields
+
+
+def _load_closures(dish_ids, session):
+    closures = defaultdict(dict)
+    for chunk in _chunks(dish_ids):
+        query = (select(RecipeClosure.ancestor_dish_id, RecipeClosure.product_id, RecipeClosure.preparation_id,
+                        RecipeClosure.quantity, RecipeClosure.depth)
+                 .where(RecipeClosure.ancestor_dish_id.in_(chunk)))
+        for row in session.execute(query):
+            closures[row.ancestor_dish_id][(row.product_id, row.preparation_id)] = (row.quantity, row.depth)
+    return closures
+
+
+def _explode(roots, edges, yields, known):
+    """
+    Sluiting van elk gerecht in `roots`: {dish_id: {(product_id, preparation_id): (hoeveelheid, diepte)}}.
+    Bereidingen buiten `roots` komen uit `known`. Iteratieve post-order DFS zoals in
+    CostGraph, zodat ook diep geneste bereidingen geen recursielimiet raken.
+    """
+    result = {}
+
+    def combine(dish_id):
+        rows = {}
+
+        def add(key, quantity, depth):
+            if key in rows:
+                old_quantity, old_depth = rows[key]
+                rows[key] = (old_quantity + quantity, min(old_depth, depth))
+            else:
+                rows[key] = (quantity, depth)
+
+        for edge in edges.get(dish_id, ()):
+            if edge.product_id is not None:
+                add((edge.product_id, None), edge.quantity, 1)
+                continue
+            prep_id = edge.preparation_id
+            add((None, prep_id), edge.quantity, 1)
+            # De sluiting van een bereiding is per batch; omrekenen naar de gebruikte hoeveelheid
+            yield_quantity = yields.get(prep_id)
+            factor = edge.quantity / yield_quantity if yield_quantity and yield_quantity > 0 else 0
+            child = result[prep_id] if prep_id in result else known.get(prep_id, {})
+            for key, (quantity, depth) in child.items():
+                add(key, quantity * factor, depth + 1)
+        return rows
+
+    for root in roots:
+        if root in result:
+            continue
+        in_progress = {root}
+        stack = [(root, iter(edges.get(root, ())))]
+        while stack:
+            dish_id, dish_edges = stack[-1]
+            child_id = None
+            for edge in dish_edges:
+                prep_id = edge.preparation_id
+                if prep_id in in_progress:
+                    raise CostCycleError(f"Bereiding {prep_id} gebruikt zichzelf (onrechtstreeks) als ingrediënt.")
+                if prep_id is None or prep_id in result or prep_id not in roots:
+                    continue
+                child_id = prep_id
+                break
+            if child_id is not None:
+                in_progress.add(child_id)
+                stack.append((child_id, iter(edges.get(child_id, ()))))
+                continue
+            stack.pop()
+            in_progress.discard(dish_id)
+            result[dish_id] = combine(dish_id)
+    return result
+
+
+def _write(result, session):
+    rows = [
+        {'ancestor_dish_id': dish_id, 'product_id': product_id, 'preparation_id': preparation_id,
+         'quantity': quantity, 'depth': depth}
+        for dish_id, closure in result.items()
+        for (product_id, preparation_id), (quantity, depth) in closure.items()
+    ]
+    # Core-insert op de tabel: één executemany per batch. De ORM-variant splitst de rijen
+    # per combinatie van NULL-kolommen en werd zo tienduizenden losse statements.
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        session.execute(insert(RecipeClosure.__table__), rows[start:start + INSERT_BATCH_SIZE])
+
+
+def update_closure(dish_ids, session=None):
+    """
+    Berekent de sluiting opnieuw voor deze gerechten en alles wat ze gebruikt, na een
+    wijziging van hun ingrediënten of opbrengst. Er wordt niet gecommit.
+    """
+    session = session or db.session
+    edges, yields = _load_recipes(dish_ids, session)
+    # Wie deze gerechten gebruikt, heeft zelf ingrediënten en zit dus in edges
+    roots = set(dish_ids) | edges.keys()
+    known = _load_closures(yields.keys() - roots, session)
+    result = _explode(roots, edges, yields, known)
+    for chunk in _chunks(roots):
+        session.execute(delete(RecipeClosure).where(RecipeClosure.ancestor_dish_id.in_(chunk)))
+    _write(result, session)
+    return roots
+
+
+def remove_from_closure(dish_id, session=None):
+    """Haalt een verwijderd gerecht of een ongebruikte bereiding uit de sluiting."""
+    session = session or db.session
+    session.execute(delete(RecipeClosure).where(
+        (RecipeClosure.ancestor_dish_id == dish_id) | (RecipeClosure.preparation_id == dish_id)
+    ))
+
+
+def rebuild_closure(session=None):
+    """Volledige herberekening, bv. na een bulk-import van recepten."""
+    session = session or db.session
+    dish_ids = set(session.scalars(select(Dish.id)))
+    edges, yields = {}, {}
+    _add_recipe_rows(session.execute(_recipe_query()), edges, yields)
+    result = _explode(dish_ids, edges, yields, {})
+    session.execute(delete(RecipeClosure))
+    _write(result, session)
+    return len(result)
+
+
+def where_used(product_id=None, preparation_id=None, session=None):
+    """(gerecht, hoeveelheid, diepte) voor elk gerecht en elke bereiding die het product of de bereiding gebruikt."""
+    session = session or db.session
+    column, value = (RecipeClosure.product_id, product_id) if product_id is not None else (RecipeClosure.preparation_id, preparation_id)
+    query = (select(Dish, RecipeClosure.quantity, RecipeClosure.depth)
+             .join(RecipeClosure, RecipeClosure.ancestor_dish_id == Dish.id)
+             .where(column == value)
+             .order_by(Dish.is_preparation, Dish.name))
+    return session.execute(query).all()
+
+
+def contains(dish_id, session=None):
+    """Alle (product_id, preparation_id, hoeveelheid, diepte) in een gerecht of bereiding."""
+    session = session or db.session
+    query = (select(RecipeClosure.product_id, RecipeClosure.preparation_id, RecipeClosure.quantity, RecipeClosure.depth)
+             .where(RecipeClosure.ancestor_dish_id == dish_id))
+    return session.execute(query).all()
@@ -0,0 +1,138 @@
+# recipes.py
+"""
+Opslaan van de ingrediëntenlijst van een gerecht of bereiding.
+
+In plaats van alle ingrediënten te wissen en opnieuw toe te voegen, wordt de
+ingediende lijst vergeleken met de bestaande rijen: enkel nieuwe regels worden
+ingevoegd, gewijzigde hoeveelheden bijgewerkt en weggevallen regels verwijderd,
+elk met één bulk-statement in de lopende transactie. Ongewijzigde rijen houden hun
+id. Het resultaat zegt wat er veranderde, zodat enkel die kosten herberekend worden.
+
+Elke wijziging werkt ook de where-used-index bij (recipe_closure.py); een bereiding
+die zichzelf (onrechtstreeks) zou bevatten, geeft daarbij een CostCycleError.
+"""
+from collections import defaultdict, namedtuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm.util import identity_key
+from extensions import db
+from models import Ingredient
+from recipe_closure import update_closure
+
+# Eén ingrediëntregel zoals ingediend: precies één van product_id/preparation_id is gezet
+IngredientLine = namedtuple('IngredientLine', ['product_id', 'preparation_id', 'quantity'])
+
+
+class RecipeChanges(namedtuple('RecipeChanges', ['added', 'updated', 'removed'])):
+    """
+    Wijzigingen aan een recept: toegevoegde regels (IngredientLine), bijgewerkte en
+    verwijderde regels (IngredientLine met de nieuwe resp. oude hoeveelheid).
+    Onwaar als er niets veranderde.
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return bool(self.added or self.updated or self.removed)
+
+    @property
+    def product_ids(self):
+        return {line.product_id for line in self.added + self.updated + self.removed if line.product_id}
+
+    @property
+    def preparation_ids(self):
+        return {line.preparation_id for line in self.added + self.updated + self.removed if line.preparation_id}
+
+
+def _parse_quantity(value):
+    try:
+        return float(value.replace(',', '.'))
+    except (AttributeError, ValueError):
+        return 0
+
+
+def parse_ingredient_form(form, default_type='product'):
+    """
+    Leest de ingrediëntregels uit ingredient_type[], ingredient_id[] en quantity[].
+    Regels zonder product/bereiding of met een hoeveelheid <= 0 vallen weg.
+    """
+    ids = form.getlist('ingredient_id[]')
+    quantities = form.getlist('quantity[]')
+    types = form.getlist('ingredient_type[]') or [default_type] * len(ids)
+    lines = []
+    for type_, id_str, qty_str in zip(types, ids, quantities):
+        if not id_str or not id_str.isdigit():
+            continue
+        quantity = _parse_quantity(qty_str)
+        if quantity > 0:
+            source_id = int(id_str)
+            lines.append(IngredientLine(
+                product_id=source_id if type_ == 'product' else None,
+                preparation_id=source_id if type_ == 'preparation' else None,
+                quantity=quantity,
+            ))
+    return lines
+
+
+def save_ingredients(dish, lines, session=None):
+    """
+    Brengt de ingrediënten van `dish` in overeenstemming met `lines` en geeft de
+    RecipeChanges terug. Er wordt niet gecommit. Regels met hetzelfde product of
+    dezelfde bereiding worden op volgorde aan de bestaande rijen gekoppeld, zodat ook
+    dubbele regels behouden blijven.
+    """
+    session = session or db.session
+    if dish.id is None:
+        session.add(dish)
+        session.flush()
+
+    existing = defaultdict(list)
+    rows = session.execute(
+        select(Ingredient.id, Ingredient.product_id, Ingredient.preparation_id, Ingredient.quantity)
+        .where(Ingredient.parent_dish_id == dish.id)
+        .order_by(Ingredient.id)
+    )
+    for row in rows:
+        existing[(row.product_id, row.preparation_id)].append(row)
+
+    added, updated, removed = [], [], []
+    inserts, updates = [], []
+    for line in lines:
+        matches = existing.get((line.product_id, line.preparation_id))
+        if matches:
+            row = matches.pop(0)
+            if row.quantity != line.quantity:
+                updates.append({'id': row.id, 'quantity': line.quantity})
+                updated.append(line)
+        else:
+            inserts.append({'parent_dish_id': dish.id, **line._asdict()})
+            added.append(line)
+    deleted_ids = []
+    for leftovers in existing.values():
+        for row in leftovers:
+            deleted_ids.append(row.id)
+            removed.append(IngredientLine(row.product_id, row.preparation_id, row.quantity))
+
+    if deleted_ids:
+        session.execute(delete(Ingredient).where(Ingredient.id.in_(deleted_ids)).execution_options(synchronize_session=False))
+    if updates:
+        session.execute(update(Ingredient), updates)
+    if inserts:
+        session.execute(insert(Ingredient), inserts)
+
+    changes = RecipeChanges(added, updated, removed)
+    if changes:
+        _sync_loaded(session, dish, [u['id'] for u in updates], deleted_ids)
+        update_closure([dish.id], session=session)
+    return changes
+
+
+def _sync_loaded(session, dish, updated_ids, deleted_ids):
+    """Bulk-statements werken reeds ingeladen objecten niet bij: vergeten of opnieuw laden."""
+    for ingredient_id in updated_ids + deleted_ids:
+        obj = session.identity_map.get(identity_key(Ingredient, ingredient_id))
+        if obj is None:
+            continue
+        if ingredient_id in deleted_ids:
+            session.expunge(obj)
+        else:
+            session.expire(obj)
+    session.expire(dish, ['ingredients'])
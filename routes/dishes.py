@@ -1,7 +1,16 @@
 # routes/dishes.py
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from models import db, Dish, DishCategory, Product, Ingredient, Category as ProductCategory
-from category_order_manager import load_category_order, save_category_order
+from cost_engine import CostCycleError, refresh_costs
+from models import db, Dish, DishCategory
+from recipes import parse_ingredient_form, save_ingredients
+from recipe_closure import remove_from_closure
+from category_order_manager import ORDER_TYPES, save_category_order
+from query_counter import query_budget
+from data_version import DISHES, conditional_get
+from read_replica import read_replica
+from sqlite_profile import retry_on_lock
+from query_profiles import DISH_LIST, RECIPE_FORM
+from pagination import DISH_SORTS, keyset_page, next_page_urls, page_args, page_payload
 
 dish_bp = Blueprint('dishes', __name__, template_folder='../templates')
 
@@ -14,14 +23,49 @@ def get_or_create_dish_category(name):
         db.session.add(instance)
     return instance
 
+def dish_page():
+    """Eén pagina eindgerechten volgens de sortering en cursor in de querystring."""
+    query = Dish.query.options(*DISH_LIST).filter_by(is_preparation=False)
+    sort, direction, cursor, page_size = page_args(DISH_SORTS)
+    return keyset_page(query, DISH_SORTS, Dish.id, sort, direction, cursor, page_size)
+
 @dish_bp.route('/manage_dishes')
+@read_replica
+@query_budget(4)
+@conditional_get(DISHES, private=True)
 def manage_dishes():
-    """Toont een overzicht van alle eindgerechten (geen bereidingen)."""
-    dishes = Dish.query.filter_by(is_preparation=False).order_by(Dish.name).all()
-    return render_template('manage_dishes.html', composed_dishes=dishes)
+    """Toont een overzicht van de eindgerechten (geen bereidingen), per pagina."""
+    page = dish_page()
+    next_page_url, next_json_url = next_page_urls(page, '.manage_dishes', '.dishes_page_json')
+    return render_template('manage_dishes.html', composed_dishes=page.items, page=page,
+                           next_page_url=next_page_url, next_json_url=next_json_url)
+
+@dish_bp.route('/page_json')
+@read_replica
+@query_budget(4)
+@conditional_get(DISHES)
+def dishes_page_json():
+    """Volgende pagina van de gerechtenlijst voor 'meer laden' bij het scrollen."""
+    page = dish_page()
+    items = [{
+        'id': d.id,
+        'name': d.name,
+        'category': d.dish_category.name if d.dish_category else None,
+        'cost_price': d.cost_price_calculated,
+        'selling_price': d.selling_price_calculated,
+        'profit': d.selling_price_calculated - d.cost_price_calculated,
+        'profit_type': d.profit_type,
+        'profit_value': d.profit_value,
+        'edit_url': url_for('.edit_dish', dish_id=d.id),
+        'delete_url': url_for('.delete_dish', dish_id=d.id),
+    } for d in page.items]
+    return jsonify(page_payload(page, items, '.manage_dishes', '.dishes_page_json'))
 
 def process_dish_form(dish):
-    """Hulpfunctie om de formulierdata voor een gerecht te verwerken."""
+    """
+    Hulpfunctie om de formulierdata voor een gerecht te verwerken. Slaat enkel de
+    gewijzigde ingrediënten op (zonder commit) en geeft de RecipeChanges terug.
+    """
     dish.name = request.form.get('dish_name', '').strip()
     dish.profit_type = request.form['profit_type']
     try:
@@ -40,31 +84,10 @@ def process_dish_form(dish):
             cat_name = category_obj.name
     dish.dish_category = get_or_create_dish_category(cat_name)
 
-    # Verwijder de oude ingrediënten en voeg de nieuwe toe
-    Ingredient.query.filter_by(parent_dish_id=dish.id).delete(synchronize_session=False)
-    
-    ingredient_types = request.form.getlist('ingredient_type[]')
-    ingredient_ids = request.form.getlist('ingredient_id[]')
-    quantities = request.form.getlist('quantity[]')
-
-    for type, id_str, qty_str in zip(ingredient_types, ingredient_ids, quantities):
-        if id_str and qty_str:
-            try:
-                quantity = float(qty_str.replace(',', '.'))
-            except (ValueError, TypeError):
-                quantity = 0
-            
-            if quantity > 0:
-                ingredient_id = int(id_str)
-                new_ingredient = Ingredient(
-                    parent_dish_id=dish.id,
-                    product_id=ingredient_id if type == 'product' else None,
-                    preparation_id=ingredient_id if type == 'preparation' else None,
-                    quantity=quantity
-                )
-                db.session.add(new_ingredient)
-                
+    return save_ingredients(dish, parse_ingredient_form(request.form))
+
 @dish_bp.route('/create', methods=['GET', 'POST'])
+@retry_on_lock
 def create_dish():
     """Pagina voor het aanmaken van een nieuw gerecht."""
     if request.method == 'POST':
@@ -73,99 +96,56 @@ def create_dish():
             flash(f"Gerechtnaam '{name}' is ongeldig of bestaat al.", "danger")
             return redirect(url_for('dishes.create_dish'))
 
-        # 1. Create the dish object and set its direct properties
-        new_dish = Dish(
-            name=name,
-            is_preparation=False,
-            profit_type=request.form['profit_type'],
-            profit_value=float(request.form.get('profit_value', '0').replace(',', '.'))
-        )
-
-        # 2. Set the category
-        cat_id = request.form.get('dish_category')
-        cat_name = ''
-        if cat_id == 'new_dish_category':
-            cat_name = request.form.get('new_category_name', '').strip()
-        elif cat_id:
-            category_obj = DishCategory.query.get(cat_id)
-            if category_obj:
-                cat_name = category_obj.name
-        new_dish.dish_category = get_or_create_dish_category(cat_name)
-        
-        # 3. Add and commit the dish to get an ID
-        db.session.add(new_dish)
-        db.session.commit()
-
-        # 4. Now that new_dish.id exists, create the ingredients
-        ingredient_types = request.form.getlist('ingredient_type[]')
-        ingredient_ids = request.form.getlist('ingredient_id[]')
-        quantities = request.form.getlist('quantity[]')
-
-        for type, id_str, qty_str in zip(ingredient_types, ingredient_ids, quantities):
-            if id_str and qty_str:
-                quantity = float(qty_str.replace(',', '.'))
-                if quantity > 0:
-                    ingredient_id = int(id_str)
-                    new_ingredient = Ingredient(
-                        parent_dish_id=new_dish.id, # Use the new ID here
-                        product_id=ingredient_id if type == 'product' else None,
-                        preparation_id=ingredient_id if type == 'preparation' else None,
-                        quantity=quantity
-                    )
-                    db.session.add(new_ingredient)
-        
-        # 5. Commit the new ingredients
+        # Gerecht, categorie en ingrediënten in één transactie
+        new_dish = Dish(is_preparation=False)
+        try:
+            process_dish_form(new_dish)
+        except CostCycleError as e:
+            db.session.rollback()
+            flash(str(e), "danger")
+            return redirect(url_for('dishes.create_dish'))
+        refresh_costs(dish_ids=[new_dish.id])
         db.session.commit()
 
         flash(f"Gerecht '{new_dish.name}' succesvol aangemaakt!", "success")
         return redirect(url_for('dishes.manage_dishes'))
 
     # Data voorbereiden voor een leeg formulier
-    product_categories = ProductCategory.query.order_by(ProductCategory.name).all()
-    product_categories_json = [{'id': cat.id, 'name': cat.name} for cat in product_categories]
+    # Producten en bereidingen laadt het formulier uit de ingrediëntencatalogus
     dish_categories = DishCategory.query.order_by(DishCategory.name).all()
-    preparations = Dish.query.filter_by(is_preparation=True).order_by(Dish.name).all()
-    preparations_json = [{'id': p.id, 'name': p.name, 'unit': p.yield_unit, 'unit_price_calculated': p.cost_price_calculated} for p in preparations]
 
     return render_template(
         'dish_form.html',
         form_action=url_for('dishes.create_dish'),
-        all_product_categories_json=product_categories_json,
-        all_dish_categories=dish_categories,
-        all_preparations_json=preparations_json
-    )
-    
-    # Data voorbereiden voor een leeg formulier
-    product_categories = ProductCategory.query.order_by(ProductCategory.name).all()
-    product_categories_json = [{'id': cat.id, 'name': cat.name} for cat in product_categories]
-    dish_categories = DishCategory.query.order_by(DishCategory.name).all()
-    preparations = Dish.query.filter_by(is_preparation=True).order_by(Dish.name).all()
-    preparations_json = [{'id': p.id, 'name': p.name, 'unit': p.yield_unit, 'unit_price_calculated': p.cost_price_calculated} for p in preparations]
-
-    return render_template(
-        'dish_form.html',
-        form_action=url_for('dishes.create_dish'),
-        all_product_categories_json=product_categories_json,
-        all_dish_categories=dish_categories,
-        all_preparations_json=preparations_json
+        all_dish_categories=dish_categories
     )
 
 @dish_bp.route('/edit/<int:dish_id>', methods=['GET', 'POST'])
+@retry_on_lock
+@query_budget(12)
 def edit_dish(dish_id):
     """Pagina voor het bewerken van een bestaand gerecht."""
-    dish = Dish.query.get_or_404(dish_id)
+    # Het formulier toont de ingrediënten; bij opslaan vergelijkt save_ingredients zelf de rijen
+    options = RECIPE_FORM if request.method == 'GET' else ()
+    dish = Dish.query.options(*options).filter_by(id=dish_id).first_or_404()
     if request.method == 'POST':
-        process_dish_form(dish)
+        pricing = (dish.profit_type, dish.profit_value)
+        try:
+            changes = process_dish_form(dish)
+        except CostCycleError as e:
+            db.session.rollback()
+            flash(str(e), "danger")
+            return redirect(url_for('dishes.edit_dish', dish_id=dish_id))
+        # Enkel herberekenen als de ingrediënten of de winstmarge wijzigden
+        if changes or pricing != (dish.profit_type, dish.profit_value) or dish.cost_price_cached is None:
+            refresh_costs(dish_ids=[dish.id])
         db.session.commit()
         flash(f"Gerecht '{dish.name}' succesvol bijgewerkt!", "success")
         return redirect(url_for('dishes.manage_dishes'))
 
     # Data voorbereiden voor een ingevuld formulier
-    product_categories = ProductCategory.query.order_by(ProductCategory.name).all()
-    product_categories_json = [{'id': cat.id, 'name': cat.name} for cat in product_categories]
+    # Producten en bereidingen laadt het formulier uit de ingrediëntencatalogus
     dish_categories = DishCategory.query.order_by(DishCategory.name).all()
-    preparations = Dish.query.filter_by(is_preparation=True).order_by(Dish.name).all()
-    preparations_json = [{'id': p.id, 'name': p.name, 'unit': p.yield_unit, 'unit_price_calculated': p.cost_price_calculated} for p in preparations]
     
     ingredients_data = []
     for ing in dish.ingredients:
@@ -179,28 +159,27 @@ def edit_dish(dish_id):
         dish=dish,
         ingredients_data=ingredients_data,
         form_action=url_for('dishes.edit_dish', dish_id=dish_id),
-        all_product_categories_json=product_categories_json,
-        all_dish_categories=dish_categories,
-        all_preparations_json=preparations_json
+        all_dish_categories=dish_categories
     )
 
 @dish_bp.route('/delete/<int:dish_id>', methods=['POST'])
+@retry_on_lock
 def delete_dish(dish_id):
     """Verwijdert een gerecht."""
     dish = Dish.query.get_or_404(dish_id)
+    remove_from_closure(dish.id)
     db.session.delete(dish)
     db.session.commit()
     flash(f"Gerecht '{dish.name}' succesvol verwijderd.", "success")
     return redirect(url_for('dishes.manage_dishes'))
 
 @dish_bp.route('/save_order', methods=['POST'])
+@retry_on_lock
 def save_order():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     order_type = data.get('type')
     new_order = data.get('order')
-    if order_type and new_order is not None:
-        category_orders = load_category_order()
-        category_orders[order_type] = new_order
-        save_category_order(category_orders)
+    if order_type in ORDER_TYPES and isinstance(new_order, list):
+        save_category_order(order_type, [str(name) for name in new_order])
         return jsonify({'status': 'success'})
     return jsonify({'status': 'error'}), 400
\ No newline at end of file
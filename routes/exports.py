@@ -0,0 +1,28 @@
+# routes/exports.py
+from datetime import datetime
+from flask import Blueprint, Response, stream_with_context
+from cost_export import export_rows, iter_csv, iter_xlsx
+from query_counter import query_budget
+
+export_bp = Blueprint('exports', __name__)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def streamed_download(chunks, mimetype, extension):
+    filename = f"kostprijzen-{datetime.now():%Y%m%d-%H%M}.{extension}"
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # proxy mag de stream niet bufferen
+    return response
+
+@export_bp.route('/costs.csv')
+@query_budget(1)
+def export_costs_csv():
+    """Volledige kostprijsopbouw van alle gerechten als CSV, rij per rij gestreamd."""
+    return streamed_download(iter_csv(export_rows()), 'text/csv; charset=utf-8', 'csv')
+
+@export_bp.route('/costs.xlsx')
+@query_budget(1)
+def export_costs_xlsx():
+    """Zelfde export als XLSX, eveneens gestreamd in constant geheugen."""
+    return streamed_download(iter_xlsx(export_rows()), XLSX_MIMETYPE, 'xlsx')
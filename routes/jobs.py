@@ -0,0 +1,66 @@
+# routes/jobs.py
+from flask import Blueprint, request, url_for, jsonify
+from models import db, Job
+from jobs import TASKS, InvalidJobError, cancel, enqueue, job_status
+from query_counter import query_budget
+from sqlite_profile import retry_on_lock
+
+job_bp = Blueprint('jobs', __name__)
+
+RECENT_JOBS = 50
+
+def job_payload(job):
+    return dict(job_status(job), status_url=url_for('jobs.job_detail', job_id=job.id),
+                cancel_url=url_for('jobs.cancel_job', job_id=job.id))
+
+@job_bp.route('/', methods=['GET'])
+@query_budget(1)
+def list_jobs():
+    """De recentste taken, eventueel gefilterd op ?status= en ?kind=."""
+    query = Job.query
+    if request.args.get('status'):
+        query = query.filter(Job.status == request.args['status'])
+    if request.args.get('kind'):
+        query = query.filter(Job.kind == request.args['kind'])
+    return jsonify([job_payload(job) for job in query.order_by(Job.id.desc()).limit(RECENT_JOBS)])
+
+@job_bp.route('/', methods=['POST'])
+@retry_on_lock
+def create_job():
+    """
+    Start een taak: JSON {"kind": ..., "params": {...}} met het CSRF-token in X-CSRFToken
+    (zie de kaart Achtergrondtaken op het dashboard). Antwoordt meteen met 202 en de status-URL.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': "Verwacht een JSON-object met 'kind' en 'params'."}), 400
+    kind = data.get('kind')
+    if not isinstance(kind, str):
+        return jsonify({'status': 'error', 'message': "'kind' moet een tekst zijn."}), 400
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'status': 'error', 'message': "'params' moet een object zijn."}), 400
+    if kind in TASKS and not TASKS[kind].api:
+        return jsonify({'status': 'error', 'message': f"Taak '{kind}' kan niet via de API gestart worden."}), 400
+    try:
+        job = enqueue(kind, params)
+    except InvalidJobError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    db.session.commit()
+    response = jsonify(job_payload(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.job_detail', job_id=job.id)
+    return response
+
+@job_bp.route('/<int:job_id>')
+@query_budget(1)
+def job_detail(job_id):
+    """Status, voortgang en resultaat van één taak."""
+    return jsonify(job_payload(Job.query.get_or_404(job_id)))
+
+@job_bp.route('/<int:job_id>/cancel', methods=['POST'])
+@retry_on_lock
+def cancel_job(job_id):
+    """Annuleert een wachtende taak meteen; een lopende taak stopt bij haar volgende voortgangsmelding."""
+    Job.query.get_or_404(job_id)
+    return jsonify(job_payload(cancel(job_id)))
@@ -1,6 +1,15 @@
 # routes/preparations.py
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from models import db, Dish, Ingredient, Category as ProductCategory, PreparationCategory
+from cost_engine import CostCycleError, refresh_costs
+from models import db, Dish, PreparationCategory
+from recipes import parse_ingredient_form, save_ingredients
+from recipe_closure import remove_from_closure, update_closure, where_used
+from query_counter import query_budget
+from data_version import DISHES, conditional_get
+from read_replica import read_replica
+from sqlite_profile import retry_on_lock
+from query_profiles import RECIPE_FORM
+from pagination import PREPARATION_SORTS, keyset_page, next_page_urls, page_args, page_payload
 
 preparation_bp = Blueprint('preparations', __name__, template_folder='../templates')
 
@@ -14,7 +23,10 @@ def get_or_create_prep_category(name):
     return instance
 
 def process_preparation_form(dish):
-    """Hulpfunctie om de formulierdata voor een bereiding te verwerken."""
+    """
+    Hulpfunctie om de formulierdata voor een bereiding te verwerken. Slaat enkel de
+    gewijzigde ingrediënten op (zonder commit) en geeft de RecipeChanges terug.
+    """
     dish.name = request.form.get('preparation_name', '').strip()
     try:
         dish.yield_quantity = float(request.form.get('yield_quantity', '1.0').replace(',', '.'))
@@ -32,37 +44,44 @@ def process_preparation_form(dish):
             cat_name = category_obj.name
     dish.preparation_category = get_or_create_prep_category(cat_name)
 
-    # Verwijder de oude ingrediënten en voeg de nieuwe toe
-    Ingredient.query.filter_by(parent_dish_id=dish.id).delete(synchronize_session=False)
+    return save_ingredients(dish, parse_ingredient_form(request.form))
 
-    ingredient_types = request.form.getlist('ingredient_type[]')
-    ingredient_ids = request.form.getlist('ingredient_id[]')
-    quantities = request.form.getlist('quantity[]')
-
-    for type, id_str, qty_str in zip(ingredient_types, ingredient_ids, quantities):
-        if id_str and qty_str:
-            try:
-                quantity = float(qty_str.replace(',', '.'))
-            except (ValueError, TypeError):
-                quantity = 0
-
-            if quantity > 0:
-                ingredient_id = int(id_str)
-                new_ingredient = Ingredient(
-                    parent_dish_id=dish.id,
-                    product_id=ingredient_id if type == 'product' else None,
-                    preparation_id=ingredient_id if type == 'preparation' else None,
-                    quantity=quantity
-                )
-                db.session.add(new_ingredient)
+def preparation_page():
+    """Eén pagina bereidingen volgens de sortering en cursor in de querystring."""
+    query = Dish.query.filter_by(is_preparation=True)
+    sort, direction, cursor, page_size = page_args(PREPARATION_SORTS)
+    return keyset_page(query, PREPARATION_SORTS, Dish.id, sort, direction, cursor, page_size)
 
 @preparation_bp.route('/manage_preparations')
+@read_replica
+@query_budget(4)
+@conditional_get(DISHES, private=True)
 def manage_preparations():
-    """Toont een overzicht van alle bereidingen."""
-    preparations = Dish.query.filter_by(is_preparation=True).order_by(Dish.name).all()
-    return render_template('manage_preparations.html', preparations=preparations)
+    """Toont een overzicht van de bereidingen, per pagina."""
+    page = preparation_page()
+    next_page_url, next_json_url = next_page_urls(page, '.manage_preparations', '.preparations_page_json')
+    return render_template('manage_preparations.html', preparations=page.items, page=page,
+                           next_page_url=next_page_url, next_json_url=next_json_url)
+
+@preparation_bp.route('/page_json')
+@read_replica
+@query_budget(4)
+@conditional_get(DISHES)
+def preparations_page_json():
+    """Volgende pagina van de bereidingenlijst voor 'meer laden' bij het scrollen."""
+    page = preparation_page()
+    items = [{
+        'id': p.id,
+        'name': p.name,
+        'cost_price': p.cost_price_calculated,
+        'yield_unit': p.yield_unit,
+        'edit_url': url_for('.edit_preparation', dish_id=p.id),
+        'delete_url': url_for('.delete_preparation', dish_id=p.id),
+    } for p in page.items]
+    return jsonify(page_payload(page, items, '.manage_preparations', '.preparations_page_json'))
 
 @preparation_bp.route('/create', methods=['GET', 'POST'])
+@retry_on_lock
 def create_preparation():
     """Pagina voor het aanmaken van een nieuwe bereiding."""
     if request.method == 'POST':
@@ -74,47 +93,59 @@ def create_preparation():
         # Maak een nieuw, leeg bereiding-object aan
         new_preparation = Dish(is_preparation=True)
         
-        # Vul de data van het formulier in het object in
-        process_preparation_form(new_preparation)
-        
-        # Voeg nu het volledig gevulde object toe aan de sessie en commit
-        db.session.add(new_preparation)
+        # Bereiding, categorie en ingrediënten in één transactie
+        try:
+            process_preparation_form(new_preparation)
+        except CostCycleError as e:
+            db.session.rollback()
+            flash(str(e), "danger")
+            return redirect(url_for('preparations.create_preparation'))
+        refresh_costs(dish_ids=[new_preparation.id])
         db.session.commit()
 
         flash(f"Bereiding '{new_preparation.name}' succesvol aangemaakt!", "success")
         return redirect(url_for('preparations.manage_preparations'))
 
     # Data voorbereiden voor een leeg formulier
-    product_categories = ProductCategory.query.order_by(ProductCategory.name).all()
-    product_categories_json = [{'id': cat.id, 'name': cat.name} for cat in product_categories]
+    # Producten laadt het formulier uit de ingrediëntencatalogus
     prep_categories = PreparationCategory.query.order_by(PreparationCategory.name).all()
-    preparations = Dish.query.filter_by(is_preparation=True).order_by(Dish.name).all()
-    preparations_json = [{'id': p.id, 'name': p.name, 'unit': p.yield_unit, 'unit_price_calculated': p.cost_price_calculated} for p in preparations]
 
     return render_template(
         'preparation_form.html',
         form_action=url_for('preparations.create_preparation'),
-        all_product_categories_json=product_categories_json,
-        all_prep_categories=prep_categories,
-        all_preparations_json=preparations_json
+        all_prep_categories=prep_categories
     )
 
 @preparation_bp.route('/edit/<int:dish_id>', methods=['GET', 'POST'])
+@retry_on_lock
+@query_budget(12)
 def edit_preparation(dish_id):
     """Pagina voor het bewerken van een bestaande bereiding."""
-    preparation = Dish.query.filter_by(id=dish_id, is_preparation=True).first_or_404()
+    # Het formulier toont de ingrediënten; bij opslaan vergelijkt save_ingredients zelf de rijen
+    options = RECIPE_FORM if request.method == 'GET' else ()
+    preparation = Dish.query.options(*options).filter_by(id=dish_id, is_preparation=True).first_or_404()
     if request.method == 'POST':
-        process_preparation_form(preparation)
+        yield_quantity = preparation.yield_quantity
+        try:
+            changes = process_preparation_form(preparation)
+        except CostCycleError as e:
+            db.session.rollback()
+            flash(str(e), "danger")
+            return redirect(url_for('preparations.edit_preparation', dish_id=dish_id))
+        if not changes and yield_quantity != preparation.yield_quantity:
+            # Andere opbrengst: de uitgerekende hoeveelheden in de gerechten wijzigen mee
+            update_closure([preparation.id])
+        # Herberekent deze bereiding en alle gerechten die ze gebruiken, enkel als
+        # de ingrediënten of de opbrengst wijzigden
+        if changes or yield_quantity != preparation.yield_quantity or preparation.cost_price_cached is None:
+            refresh_costs(dish_ids=[preparation.id])
         db.session.commit()
         flash(f"Bereiding '{preparation.name}' succesvol bijgewerkt!", "success")
         return redirect(url_for('preparations.manage_preparations'))
 
     # Data voorbereiden voor een ingevuld formulier
-    product_categories = ProductCategory.query.order_by(ProductCategory.name).all()
-    product_categories_json = [{'id': cat.id, 'name': cat.name} for cat in product_categories]
+    # Producten laadt het formulier uit de ingrediëntencatalogus
     prep_categories = PreparationCategory.query.order_by(PreparationCategory.name).all()
-    preparations = Dish.query.filter_by(is_preparation=True).order_by(Dish.name).all()
-    preparations_json = [{'id': p.id, 'name': p.name, 'unit': p.yield_unit, 'unit_price_calculated': p.cost_price_calculated} for p in preparations]
     
     ingredients_data = []
     for ing in preparation.ingredients:
@@ -128,15 +159,19 @@ def edit_preparation(dish_id):
         preparation=preparation,
         ingredients_data=ingredients_data,
         form_action=url_for('preparations.edit_preparation', dish_id=dish_id),
-        all_product_categories_json=product_categories_json,
-        all_prep_categories=prep_categories,
-        all_preparations_json=preparations_json
+        all_prep_categories=prep_categories
     )
 
 @preparation_bp.route('/delete/<int:dish_id>', methods=['POST'])
+@retry_on_lock
 def delete_preparation(dish_id):
     """Verwijdert een bereiding."""
     preparation = Dish.query.filter_by(id=dish_id, is_preparation=True).first_or_404()
+    users = where_used(preparation_id=preparation.id)
+    if users:
+        flash(f"Kan '{preparation.name}' niet verwijderen, ze wordt (onrechtstreeks) gebruikt in {len(users)} gerecht(en) en bereiding(en).", "danger")
+        return redirect(url_for('preparations.manage_preparations'))
+    remove_from_closure(preparation.id)
     db.session.delete(preparation)
     db.session.commit()
     flash(f"Bereiding '{preparation.name}' succesvol verwijderd.", "success")
@@ -1,6 +1,17 @@
 # routes/products.py
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from cost_engine import refresh_costs
+from price_history import record_prices
 from models import db, Product, Category, Supplier
+from query_counter import query_budget
+from data_version import PRODUCTS, conditional_get
+from read_replica import read_replica
+from sqlite_profile import retry_on_lock
+from query_profiles import PRODUCT_LIST
+from pagination import PRODUCT_SORTS, keyset_page, next_page_urls, page_args, page_payload
+from product_search import matching_product_ids, search_products
+from recipe_closure import where_used
+from jobs import enqueue, store_upload
 
 product_bp = Blueprint('products', __name__, template_folder='../templates')
 
@@ -22,9 +33,9 @@ def get_package_unit_from_form():
         return request.form.get('package_unit_other', 'Stuks').strip() or 'Stuks'
     return unit_selection
 
-@product_bp.route('/')
-def manage_products():
-    query = Product.query
+def product_page():
+    """Eén pagina producten volgens de filters, sortering en cursor in de querystring."""
+    query = Product.query.options(*PRODUCT_LIST)
     selected_category_id = request.args.get('category', type=int)
     search_query = request.args.get('search', '').strip().lower()
 
@@ -32,22 +43,55 @@ def manage_products():
         query = query.filter(Product.category_id == selected_category_id)
 
     if search_query:
-        query = query.join(Product.supplier).filter(
-            Product.name.ilike(f'%{search_query}%') |
-            Supplier.name.ilike(f'%{search_query}%')
-        )
+        matches = matching_product_ids(search_query)
+        if matches is not None:
+            query = query.filter(Product.id.in_(matches))
+
+    sort, direction, cursor, page_size = page_args(PRODUCT_SORTS)
+    return keyset_page(query, PRODUCT_SORTS, Product.id, sort, direction, cursor, page_size)
 
-    products = query.order_by(Product.name).all()
+@product_bp.route('/')
+@read_replica
+@query_budget(5)
+@conditional_get(PRODUCTS, private=True)
+def manage_products():
+    page = product_page()
     all_categories = Category.query.order_by(Category.name).all()
+    all_suppliers = Supplier.query.order_by(Supplier.name).all()
+    next_page_url, next_json_url = next_page_urls(page, '.manage_products', '.products_page_json')
 
     return render_template(
         'manage_products.html',
-        base_products=products,
+        base_products=page.items,
+        page=page,
+        next_page_url=next_page_url,
+        next_json_url=next_json_url,
         all_categories=all_categories,
-        selected_category_id=selected_category_id,
+        all_suppliers=all_suppliers,
+        selected_category_id=request.args.get('category', type=int),
         search_query=request.args.get('search', '')
     )
 
+@product_bp.route('/page_json')
+@read_replica
+@query_budget(2)
+@conditional_get(PRODUCTS)
+def products_page_json():
+    """Volgende pagina van de productlijst voor 'meer laden' bij het scrollen."""
+    page = product_page()
+    items = [{
+        'id': p.id,
+        'name': p.name,
+        'category': p.category.name,
+        'package_weight': p.package_weight,
+        'package_unit': p.package_unit,
+        'package_price': p.package_price,
+        'unit_price_calculated': p.unit_price_calculated,
+        'edit_url': url_for('.edit_product', product_id=p.id),
+        'delete_url': url_for('.delete_product', product_id=p.id),
+    } for p in page.items]
+    return jsonify(page_payload(page, items, '.manage_products', '.products_page_json'))
+
 def get_category_from_form():
     """Haalt veilig de categorie op uit het formulier."""
     category_id = request.form.get('category')
@@ -67,6 +111,7 @@ def get_supplier_from_form():
     return supplier_obj.name if supplier_obj else None
 
 @product_bp.route('/add', methods=['GET', 'POST'])
+@retry_on_lock
 def add_product():
     if request.method == 'POST':
         name = request.form['name'].strip()
@@ -95,6 +140,8 @@ def add_product():
             article_number=request.form.get('article_number')
         )
         db.session.add(new_product)
+        db.session.flush()
+        record_prices([{'product_id': new_product.id, 'package_price': new_product.package_price, 'package_weight': new_product.package_weight}])
         db.session.commit()
         flash(f"Product '{name}' succesvol toegevoegd!", "success")
         return redirect(url_for('.manage_products'))
@@ -104,10 +151,13 @@ def add_product():
     return render_template('product_form.html', form_action=url_for('.add_product'), all_categories=all_categories, all_suppliers=all_suppliers)
 
 @product_bp.route('/edit/<int:product_id>', methods=['GET', 'POST'])
+@retry_on_lock
 def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
 
     if request.method == 'POST':
+        old_unit_price = product.unit_price_calculated
+        old_package = (product.package_price, product.package_weight)
         product.name = request.form['name'].strip()
 
         cat_name = get_category_from_form()
@@ -121,6 +171,11 @@ def edit_product(product_id):
         product.package_price = request.form.get('package_price', type=float)
         product.article_number = request.form.get('article_number')
 
+        if (product.package_price, product.package_weight) != old_package:
+            record_prices([{'product_id': product.id, 'package_price': product.package_price, 'package_weight': product.package_weight}])
+        # Enkel gerechten die dit product (onrechtstreeks) gebruiken worden herberekend
+        if product.unit_price_calculated != old_unit_price:
+            refresh_costs(product_ids=[product.id])
         db.session.commit()
         flash(f"Product '{product.name}' succesvol bijgewerkt!", "success")
         return redirect(url_for('.manage_products'))
@@ -137,10 +192,14 @@ def edit_product(product_id):
     )
 
 @product_bp.route('/delete/<int:product_id>', methods=['POST'])
+@retry_on_lock
 def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
-    if product.ingredients:
-        flash(f"Kan '{product.name}' niet verwijderen, het is in gebruik in {len(product.ingredients)} gerecht(en).", "danger")
+    users = where_used(product_id=product.id)
+    if users:
+        dishes = sum(1 for dish, _, _ in users if not dish.is_preparation)
+        flash(f"Kan '{product.name}' niet verwijderen, het is (onrechtstreeks) in gebruik in {dishes} gerecht(en) "
+              f"en {len(users) - dishes} bereiding(en).", "danger")
         return redirect(url_for('.manage_products'))
 
     db.session.delete(product)
@@ -148,17 +207,74 @@ def delete_product(product_id):
     flash(f"Product '{product.name}' succesvol verwijderd.", "success")
     return redirect(url_for('.manage_products'))
 
+@product_bp.route('/where_used/<int:product_id>')
+@query_budget(2)
+def where_used_json(product_id):
+    """Alle gerechten en bereidingen die dit product (onrechtstreeks) gebruiken, met de hoeveelheid per recept."""
+    product = Product.query.get_or_404(product_id)
+    return jsonify({
+        'product': {'id': product.id, 'name': product.name, 'unit': product.package_unit},
+        'used_in': [{
+            'id': dish.id,
+            'name': dish.name,
+            'is_preparation': dish.is_preparation,
+            'quantity': quantity,
+            'direct': depth == 1,
+            'edit_url': url_for('preparations.edit_preparation' if dish.is_preparation else 'dishes.edit_dish', dish_id=dish.id),
+        } for dish, quantity, depth in where_used(product_id=product.id)],
+    })
+
+@product_bp.route('/import_prices', methods=['POST'])
+def import_prices_upload():
+    """
+    Zet een prijslijst (CSV of XLSX) van een leverancier klaar voor de jobworker en keert
+    meteen terug; de voortgang staat op /jobs/<id>.
+    """
+    upload = request.files.get('price_file')
+    if not upload or not upload.filename:
+        flash("Kies een prijsbestand om te importeren.", "danger")
+        return redirect(url_for('.manage_products'))
+    supplier_obj = Supplier.query.get(request.form.get('supplier', type=int) or 0)
+    job = enqueue('import-prices', {
+        'path': store_upload(upload),
+        'filename': upload.filename,
+        'supplier': supplier_obj.name if supplier_obj else None,
+        'remove_file': True,
+    })
+    db.session.commit()
+    flash(f"Prijslijst '{upload.filename}' wordt op de achtergrond geïmporteerd (taak #{job.id}, "
+          f"status op {url_for('jobs.job_detail', job_id=job.id)}).", "success")
+    return redirect(url_for('.manage_products'))
+
+@product_bp.route('/search_json')
+@query_budget(1)
+def search_products_json():
+    """Typeahead: de best passende producten voor een (deel van een) naam, leverancier of artikelnummer."""
+    query = request.args.get('q', '').strip()
+    if len(query) < 2:
+        return jsonify([])
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    products = search_products(query, limit=limit, category_id=request.args.get('category_id', type=int))
+    return jsonify([{
+        'id': p.id,
+        'name': p.name,
+        'supplier': p.supplier.name,
+        'article_number': p.article_number,
+        'category_id': p.category_id,
+        'unit_price_calculated': p.unit_price_calculated,
+        'package_unit': p.package_unit
+    } for p in products])
+
 @product_bp.route('/get_products_by_category_json')
+@query_budget(1)
 def get_products_by_category_json():
     category_id = request.args.get('category_id', type=int)
     if category_id:
-        category = Category.query.get(category_id)
-        if category:
-            products_data = [{
-                'id': p.id,
-                'name': p.name,
-                'unit_price_calculated': p.unit_price_calculated,
-                'package_unit': p.package_unit
-            } for p in category.products]
-            return jsonify(products_data)
+        products_data = [{
+            'id': p.id,
+            'name': p.name,
+            'unit_price_calculated': p.unit_price_calculated,
+            'package_unit': p.package_unit
+        } for p in Product.query.filter_by(category_id=category_id)]
+        return jsonify(products_data)
     return jsonify([])
@@ -0,0 +1,277 @@
+# snapshot.py
+"""
+Snapshot van de volledige database om een omgeving te seeden of te klonen
+(productie -> staging of een benchmarkdatabase).
+
+Het bestand is gzip met één JSON-regel per blok: eerst een kop met de schemahash en
+de tabellen, daarna per tabel blokken van CHUNK_ROWS rijen, kolom per kolom
+opgeslagen. Tabellen volgen de volgorde van de foreign keys, dus terugzetten kan
+blok per blok in één transactie zonder alles in het geheugen te laden.
+
+Terugzetten gebruikt per dialect de snelste weg:
+- PostgreSQL: COPY (bij een niet-lege tabel via een tijdelijke staging-tabel en
+  INSERT ... ON CONFLICT), daarna worden de id-sequences bijgezet.
+- SQLite: executemany in één transactie met tijdelijk versoepelde pragma's
+  (synchronous=OFF, groter cachegeheugen), INSERT ... ON CONFLICT voor een niet-lege tabel.
+Een lege tabel wordt zonder haar indexen gevuld; die worden nadien in één keer opgebouwd.
+
+Taken en versietellers horen bij een omgeving en zitten niet in de snapshot; na het
+terugzetten worden alle versietellers verhoogd, zodat geen enkele cache oude data toont.
+Afgeleide data volgt uit de recepten en wordt in dezelfde transactie opnieuw berekend:
+de where-used-index (recipe_closure, niet in de snapshot) en de opgeslagen kostprijzen
+van de gerechten. Na een upsert in een niet-lege database kloppen ze zo ook voor de
+samengevoegde recepten.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import Date, DateTime, Integer, JSON, func, literal, select, text
+from sqlalchemy.orm import Session
+from extensions import db
+from cost_engine import refresh_all_costs
+from recipe_closure import rebuild_closure
+from data_version import CATEGORY_ORDER, DISH_SECTIONS, DISHES, PRODUCT_SECTIONS, PRODUCTS, mark_changed
+
+FORMAT = 'kostprijs-snapshot/2'
+CHUNK_ROWS = 10000
+EXCLUDED_TABLES = {'job', 'data_version'}
+DERIVED_TABLES = {'recipe_closure'}  # wordt na het terugzetten opnieuw opgebouwd
+
+# Versoepelde pragma's tijdens het terugzetten op SQLite (nadien hersteld)
+SQLITE_RESTORE_PRAGMAS = {'synchronous': 'OFF', 'cache_size': -200000, 'temp_store': 'MEMORY'}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def snapshot_tables():
+    """Alle tabellen van de modellen in foreign-key-volgorde, zonder de omgevingsgebonden tabellen."""
+    return [table for table in db.metadata.sorted_tables if table.name not in EXCLUDED_TABLES | DERIVED_TABLES]
+
+
+def _stored_columns(table):
+    """Kolommen die de snapshot bewaart: berekende kolommen vult de database zelf in."""
+    return [column for column in table.columns if column.computed is None]
+
+
+def schema_hash(tables=None):
+    """Hash van tabellen, kolommen en types: een snapshot past enkel op hetzelfde schema."""
+    schema = [
+        [table.name, [[column.name, str(column.type), column.nullable] for column in table.columns]]
+        for table in (tables or snapshot_tables())
+    ]
+    return hashlib.sha256(json.dumps(schema).encode('utf-8')).hexdigest()[:16]
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Kan {type(value).__name__} niet in een snapshot opslaan.")
+
+
+def dump_snapshot(path, session=None):
+    """Schrijft alle tabellen naar `path` en geeft {tabel: aantal rijen} terug."""
+    session = session or db.session
+    if session.get_bind().dialect.name == 'postgresql':
+        # Eén consistent beeld over alle tabellen heen
+        session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+    tables = snapshot_tables()
+    counts = {table.name: session.scalar(select(func.count()).select_from(table)) for table in tables}
+    header = {
+        'format': FORMAT,
+        'schema_hash': schema_hash(tables),
+        'created_at': datetime.utcnow().isoformat(),
+        'tables': [{'name': table.name, 'columns': [column.name for column in _stored_columns(table)], 'rows': counts[table.name]}
+                   for table in tables],
+    }
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        f.write(json.dumps(header) + '\n')
+        for table in tables:
+            query = select(*_stored_columns(table)).order_by(*table.primary_key.columns).execution_options(yield_per=CHUNK_ROWS)
+            for rows in session.execute(query).partitions():
+                f.write(json.dumps({'table': table.name, 'columns': [list(column) for column in zip(*rows)]},
+                                   default=_encode, separators=(',', ':')) + '\n')
+    session.rollback()
+    return counts
+
+
+def read_snapshot_header(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.loads(f.readline())
+
+
+def _blocks(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        f.readline()
+        for line in f:
+            yield json.loads(line)
+
+
+def _decoder(column):
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column.type, Date):
+        return date.fromisoformat
+    return None
+
+
+def _db_values(table, names, columns, dialect):
+    """Kolomblok -> rijen met waarden zoals de database ze opslaat (datums, JSON, booleans)."""
+    converted = []
+    for name, values in zip(names, columns):
+        column_type = table.columns[name].type
+        decode = _decoder(table.columns[name])
+        process = column_type.bind_processor(dialect)
+        if decode:
+            values = [None if value is None else decode(value) for value in values]
+        if process:
+            values = [None if value is None else process(value) for value in values]
+        converted.append(values)
+    return zip(*converted)
+
+
+def _copy_csv(table, names, columns):
+    """Kolomblok als CSV voor COPY: lege cel = NULL, teksten altijd tussen aanhalingstekens."""
+    json_columns = {name for name in names if isinstance(table.columns[name].type, JSON)}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for values in zip(*columns):
+        writer.writerow([json.dumps(value) if name in json_columns and value is not None else value
+                         for name, value in zip(names, values)])
+    buffer.seek(0)
+    return buffer
+
+
+def _restore_postgresql(session, table, names, columns, upsert):
+    cursor = session.connection().connection.cursor()
+    column_list = ', '.join(f'"{name}"' for name in names)
+    try:
+        if not upsert:
+            cursor.copy_expert(f'COPY "{table.name}" ({column_list}) FROM STDIN WITH (FORMAT csv)',
+                               _copy_csv(table, names, columns))
+            return
+        cursor.execute(f'CREATE TEMP TABLE snapshot_staging (LIKE "{table.name}" INCLUDING DEFAULTS) ON COMMIT DROP')
+        cursor.copy_expert(f'COPY snapshot_staging ({column_list}) FROM STDIN WITH (FORMAT csv)',
+                           _copy_csv(table, names, columns))
+        keys = [column.name for column in table.primary_key.columns]
+        updates = ', '.join(f'"{name}" = EXCLUDED."{name}"' for name in names if name not in keys)
+        cursor.execute(
+            f'INSERT INTO "{table.name}" ({column_list}) SELECT {column_list} FROM snapshot_staging '
+            f'ON CONFLICT ({", ".join(keys)}) ' + (f'DO UPDATE SET {updates}' if updates else 'DO NOTHING')
+        )
+        cursor.execute('DROP TABLE snapshot_staging')
+    finally:
+        cursor.close()
+
+
+def _restore_sqlite(session, table, names, columns, upsert):
+    # Rechtstreeks executemany op de DBAPI-cursor: zonder een dict per rij en zonder
+    # de ORM-events, die voor honderdduizenden rijen het meeste werk zouden zijn
+    connection = session.connection()
+    column_list = ', '.join(f'"{name}"' for name in names)
+    statement = f'INSERT INTO "{table.name}" ({column_list}) VALUES ({", ".join("?" for _ in names)})'
+    if upsert:
+        keys = [column.name for column in table.primary_key.columns]
+        updates = ', '.join(f'"{name}" = excluded."{name}"' for name in names if name not in keys)
+        statement += f' ON CONFLICT ({", ".join(keys)}) ' + (f'DO UPDATE SET {updates}' if updates else 'DO NOTHING')
+    cursor = connection.connection.cursor()
+    try:
+        cursor.executemany(statement, _db_values(table, names, columns, connection.dialect))
+    finally:
+        cursor.close()
+
+
+def _reset_sequences(session, tables):
+    for table in tables:
+        keys = list(table.primary_key.columns)
+        if len(keys) == 1 and isinstance(keys[0].type, Integer) and keys[0].autoincrement in (True, 'auto'):
+            session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', '{keys[0].name}'), "
+                f"coalesce(max(\"{keys[0].name}\"), 1)) FROM \"{table.name}\""
+            ))
+
+
+def _set_pragmas(connection, pragmas):
+    # Buiten een transactie: synchronous kan niet binnen een transactie wijzigen
+    for pragma, value in pragmas.items():
+        connection.exec_driver_sql(f'PRAGMA {pragma} = {value}')
+    connection.commit()
+
+
+def _end_load(session, table, upsert):
+    if table is not None and not upsert[table.name]:
+        for index in table.indexes:
+            index.create(session.connection(), checkfirst=True)
+
+
+def _restore(session, path, header, tables, replace):
+    dialect = session.get_bind().dialect.name
+    if replace:
+        for table in [db.metadata.tables[name] for name in DERIVED_TABLES] + list(reversed(tables.values())):
+            session.execute(table.delete())
+    upsert = {name: not replace and session.scalar(select(literal(1)).select_from(table).limit(1)) is not None
+              for name, table in tables.items()}
+    restore = _restore_postgresql if dialect == 'postgresql' else _restore_sqlite
+    names = {entry['name']: entry['columns'] for entry in header['tables']}
+    counts = dict.fromkeys(names, 0)
+    loading = None
+    for block in _blocks(path):
+        table = tables[block['table']]
+        if table is not loading:
+            _end_load(session, loading, upsert)
+            loading = table
+            if not upsert[table.name]:
+                # Een lege tabel vullen gaat sneller zonder indexen; ze worden nadien in één keer opgebouwd
+                for index in table.indexes:
+                    index.drop(session.connection(), checkfirst=True)
+        restore(session, table, names[table.name], block['columns'], upsert[table.name])
+        counts[table.name] += len(block['columns'][0]) if block['columns'] else 0
+    _end_load(session, loading, upsert)
+    if dialect == 'postgresql':
+        _reset_sequences(session, tables.values())
+    rebuild_closure(session=session)
+    refresh_all_costs(session=session)
+    mark_changed(PRODUCTS, DISHES, CATEGORY_ORDER, PRODUCT_SECTIONS, DISH_SECTIONS, session=session)
+    return counts
+
+
+def restore_snapshot(path, replace=False, engine=None):
+    """
+    Zet een snapshot terug in één transactie en geeft {tabel: aantal rijen} terug.
+    Lege tabellen worden gewoon gevuld; in een niet-lege tabel worden rijen met
+    dezelfde primaire sleutel overschreven (upsert). Met replace worden de
+    tabellen eerst leeggemaakt. Daarna worden recipe_closure en de kostprijzen
+    opnieuw berekend.
+    """
+    engine = engine or db.engine
+    header = read_snapshot_header(path)
+    if header.get('format') != FORMAT:
+        raise SnapshotError(f"Onbekend snapshotformaat '{header.get('format')}'.")
+    tables = {table.name: table for table in snapshot_tables()}
+    if header['schema_hash'] != schema_hash(list(tables.values())):
+        raise SnapshotError("De snapshot hoort bij een ander databaseschema; breng beide databases eerst "
+                            "op dezelfde migratie (flask db upgrade).")
+
+    # Eigen verbinding, zodat de versoepelde pragma's nadien op dezelfde verbinding hersteld worden
+    with engine.connect() as connection:
+        previous_pragmas = {}
+        if connection.dialect.name == 'sqlite':
+            previous_pragmas = {pragma: connection.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+                                for pragma in SQLITE_RESTORE_PRAGMAS}
+            _set_pragmas(connection, SQLITE_RESTORE_PRAGMAS)
+        try:
+            with Session(bind=connection) as session:
+                counts = _restore(session, path, header, tables, replace)
+                session.commit()
+        finally:
+            if previous_pragmas:
+                connection.rollback()
+                _set_pragmas(connection, previous_pragmas)
+    return counts
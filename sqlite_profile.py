@@ -0,0 +1,244 @@
+# sqlite_profile.py
+"""
+Afgestelde SQLite voor een lokale installatie met meerdere gunicorn-workers.
+
+Bij elke nieuwe verbinding worden de pragma's van SQLITE_PRAGMAS gezet:
+- journal_mode=WAL: lezers lezen een vaste momentopname en wachten niet op een schrijver
+  (en omgekeerd); enkel schrijvers wachten op elkaar;
+- synchronous=NORMAL: veilig in WAL-modus, enkel de laatste commits kunnen bij een
+  stroomonderbreking verloren gaan (nooit een corrupte database);
+- busy_timeout: een schrijver wacht tot zoveel ms op het schrijfslot in plaats van
+  meteen 'database is locked' te geven;
+- mmap_size en cache_size: leest de database via het geheugen, minder systeemaanroepen;
+- foreign_keys=ON: zelfde referentiële integriteit (en ON DELETE CASCADE) als op PostgreSQL.
+
+Lukt het schrijfslot ook na busy_timeout niet, dan voert @retry_on_lock het hele
+request nog enkele keren opnieuw uit met exponentiële backoff. Eens per
+SQLITE_MAINTENANCE_INTERVAL seconden draait na een request (als het antwoord al
+verstuurd is) PRAGMA optimize en een WAL-checkpoint, zodat het -wal-bestand niet blijft
+groeien. `flask sqlite check` toont dat lezers tijdens een lange schrijftransactie
+gewoon verder lezen.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+from extensions import db
+
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,  # eerst: ook het omschakelen naar WAL wacht dan op een slot
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # negatief = KiB, dus 64 MB per verbinding
+    'foreign_keys': 'ON',
+}
+DEFAULT_MAINTENANCE_INTERVAL = 3600
+
+WRITE_RETRIES = 4
+RETRY_BASE_DELAY = 0.05  # 50, 100, 200, 400 ms, telkens met willekeurige spreiding
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+def is_lock_error(error):
+    """Of een (SQLAlchemy-)fout betekent dat een ander proces het schrijfslot heeft."""
+    error = getattr(error, 'orig', error)
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def retry_on_lock(view):
+    """
+    Decorator voor schrijvende views: bij 'database is locked' wordt de transactie
+    teruggedraaid en de view tot WRITE_RETRIES keer opnieuw uitgevoerd, met
+    exponentiële backoff. Andere fouten (en andere databases) gaan gewoon door.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                return view(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == WRITE_RETRIES or not is_lock_error(e):
+                    raise
+                db.session.rollback()
+                delay = RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+                current_app.logger.warning(f"Database bezet, nieuwe poging over {delay * 1000:.0f} ms ({e.orig}).")
+                time.sleep(delay)
+    return wrapper
+
+
+def apply_pragmas(dbapi_connection, pragmas=None):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in (pragmas or SQLITE_PRAGMAS).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+    finally:
+        cursor.close()
+
+
+def maintain(engine):
+    """PRAGMA optimize en een checkpoint die het WAL-bestand terug leegmaakt; geeft (wal-pagina's, gekopieerd) terug."""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA optimize')
+        busy, wal_pages, copied = cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        cursor.close()
+        return wal_pages, copied
+    finally:
+        connection.close()
+
+
+class _Maintenance:
+    """Houdt per proces bij wanneer het onderhoud weer aan de beurt is."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = time.time() + interval
+        self._lock = threading.Lock()
+
+    def due(self):
+        return time.time() >= self._next
+
+    def run(self, app, engines):
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next = time.time() + self.interval
+            for engine in engines:
+                try:
+                    maintain(engine)
+                except sqlite3.Error as e:
+                    app.logger.warning(f"SQLite-onderhoud van {engine.url.database} mislukt: {e}")
+        finally:
+            self._lock.release()
+
+
+def profile_pragmas(config):
+    return dict(SQLITE_PRAGMAS, busy_timeout=config['SQLITE_BUSY_TIMEOUT'])
+
+
+def _sqlite_engines():
+    return [engine for engine in db.engines.values()
+            if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')]
+
+
+def init_sqlite_profile(app):
+    """Zet de pragma's op elke nieuwe SQLite-verbinding en plant het periodieke onderhoud in."""
+    app.config.setdefault('SQLITE_PROFILE', os.environ.get('SQLITE_PROFILE', '1') != '0')
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT', int(os.environ.get('SQLITE_BUSY_TIMEOUT', SQLITE_PRAGMAS['busy_timeout'])))
+    app.config.setdefault('SQLITE_MAINTENANCE_INTERVAL',
+                          int(os.environ.get('SQLITE_MAINTENANCE_INTERVAL', DEFAULT_MAINTENANCE_INTERVAL)))
+    if not app.config['SQLITE_PROFILE']:
+        return
+    with app.app_context():
+        engines = _sqlite_engines()
+    if not engines:
+        return
+    pragmas = profile_pragmas(app.config)
+    for engine in engines:
+        event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, pragmas))
+
+    maintenance = _Maintenance(app.config['SQLITE_MAINTENANCE_INTERVAL'])
+
+    @app.after_request
+    def schedule_sqlite_maintenance(response):
+        if maintenance.due():
+            # Pas nadat het antwoord volledig verstuurd is
+            response.call_on_close(lambda: maintenance.run(app, engines))
+        return response
+
+
+def concurrency_check(url, pragmas=None, hold=1.0, readers=4):
+    """
+    Houdt `hold` seconden een schrijftransactie open en meet intussen de leesqueries van
+    `readers` threads en de wachttijd van een tweede schrijver. De schrijftransactie
+    wordt teruggedraaid: er verandert niets aan de data. Elke thread krijgt een eigen
+    verbinding met het profiel (buiten de pool, die kleiner kan zijn dan het aantal threads).
+    """
+    engine = create_engine(url, poolclass=NullPool)
+    event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, pragmas))
+    started = threading.Event()
+    stop = threading.Event()
+    latencies = []
+    errors = []
+    second_writer = {}
+    lock = threading.Lock()
+
+    def writer():
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('UPDATE data_version SET version = version')
+            started.set()
+            time.sleep(hold)
+            cursor.execute('ROLLBACK')
+        finally:
+            started.set()
+            connection.close()
+
+    def reader():
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            started.wait()
+            while not stop.is_set():
+                begin = time.perf_counter()
+                cursor.execute('SELECT count(*) FROM product').fetchone()
+                cursor.execute('SELECT max(version) FROM data_version').fetchone()
+                with lock:
+                    latencies.append(time.perf_counter() - begin)
+        except sqlite3.Error as e:
+            errors.append(str(e))
+        finally:
+            connection.close()
+
+    def writer_2():
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            started.wait()
+            begin = time.perf_counter()
+            cursor.execute('BEGIN IMMEDIATE')
+            second_writer['waited'] = time.perf_counter() - begin
+            cursor.execute('ROLLBACK')
+        except sqlite3.Error as e:
+            second_writer['error'] = str(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads.append(threading.Thread(target=writer_2))
+    write_thread = threading.Thread(target=writer)
+    write_thread.start()
+    for thread in threads:
+        thread.start()
+    write_thread.join()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    latencies.sort()
+    return {
+        'hold_seconds': hold,
+        'reads': len(latencies),
+        'read_p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else None,
+        'read_max_ms': latencies[-1] * 1000 if latencies else None,
+        'read_errors': errors,
+        'second_writer_wait_ms': second_writer['waited'] * 1000 if 'waited' in second_writer else None,
+        'second_writer_error': second_writer.get('error'),
+    }
@@ -3,14 +3,28 @@
 # Exit immediately if a command exits with a non-zero status.
 set -e
 
-# Upgrade de database naar de laatste versie
-echo "Running database upgrades..."
-flask db upgrade
+# Upgrade de database, seed ze als ze leeg is en vul ontbrekende opgeslagen kostprijzen
+# aan; alles in één flask-proces, zodat de app maar één keer extra moet opstarten.
+echo "Upgrading, seeding and recomputing missing cost prices..."
+flask deploy
 
-# Vul de database met initiële data (de seeder is slim genoeg om dit niet opnieuw te doen)
-echo "Seeding database if necessary..."
-flask seed-db
+# Jobworker en Gunicorn draaien naast elkaar in deze container. Stopt één van beide,
+# dan wordt ook het andere gestopt en eindigt het script met diens exitcode, zodat de
+# supervisor (Docker, systemd, ...) de container herstart in plaats van verder te draaien
+# zonder worker. Met de Procfile draait de worker als eigen proces ('worker:').
+echo "Starting job worker..."
+flask jobs worker &
+worker_pid=$!
 
-# Start de Gunicorn webserver
 echo "Starting Gunicorn..."
-exec gunicorn app:app
+gunicorn app:app &
+web_pid=$!
+
+trap 'kill -TERM $web_pid $worker_pid 2>/dev/null' TERM INT
+
+set +e
+wait -n $web_pid $worker_pid
+status=$?
+kill -TERM $web_pid $worker_pid 2>/dev/null
+wait
+exit $status
@@ -0,0 +1,22 @@
+// static/js/ingredient_catalog.js
+// Haalt de ingrediëntencatalogus op (producten en bereidingen) en zet de compacte
+// rijen om naar objecten in dezelfde vorm als de vroegere JSON-endpoints.
+// De browser bewaart het antwoord en revalideert het met If-None-Match (304).
+async function loadIngredientCatalog(url) {
+    const response = await fetch(url);
+    const data = await response.json();
+    const productsByCategory = {};
+    data.products.forEach(([id, name, categoryId, unit, unitPrice]) => {
+        (productsByCategory[categoryId] = productsByCategory[categoryId] || []).push({
+            id, name, package_unit: unit, unit_price_calculated: unitPrice,
+        });
+    });
+    return {
+        version: data.version,
+        categories: data.categories.map(([id, name]) => ({ id, name })),
+        productsByCategory,
+        preparations: data.preparations.map(([id, name, unit, unitPrice]) => ({
+            id, name, unit, unit_price_calculated: unitPrice,
+        })),
+    };
+}
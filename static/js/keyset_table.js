@@ -0,0 +1,83 @@
+// static/js/keyset_table.js
+// Laadt de volgende pagina van een beheerlijst via de JSON-endpoint zodra de
+// "Meer laden"-link in beeld komt. Zonder JavaScript werkt de link als gewone
+// volgende-pagina-link.
+//
+// <table data-keyset-table data-row-template="..." data-load-more="...">
+// In de <template>: data-field="veld" (tekst), data-format="currency|number|profit",
+// data-href="veld" (link), data-action="veld" (formulier), data-confirm (verwijderknop).
+(function () {
+    function formatCurrency(value) {
+        if (value === null || value === undefined || isNaN(value)) return 'N/A';
+        return Number(value).toFixed(2).replace('.', ',');
+    }
+
+    function formatNumber(value) {
+        if (value === null || value === undefined || isNaN(value)) return 'N/A';
+        return Number.isInteger(value) ? String(value) : String(Math.round(value * 100) / 100).replace('.', ',');
+    }
+
+    function formatValue(item, field, format) {
+        const value = item[field];
+        if (format === 'currency') return formatCurrency(value);
+        if (format === 'number') return formatNumber(value);
+        if (format === 'profit') {
+            if (item.profit_type === 'percentage') return `${formatCurrency(value)} %`;
+            if (item.profit_type === 'multiplier') return `x ${formatCurrency(value)}`;
+            return 'N/A';
+        }
+        return value === null || value === undefined ? '' : String(value);
+    }
+
+    function renderRow(template, item) {
+        const row = template.content.firstElementChild.cloneNode(true);
+        row.querySelectorAll('[data-field]').forEach(el => {
+            el.textContent = formatValue(item, el.dataset.field, el.dataset.format);
+        });
+        row.querySelectorAll('[data-href]').forEach(el => el.setAttribute('href', item[el.dataset.href]));
+        row.querySelectorAll('[data-action]').forEach(el => el.setAttribute('action', item[el.dataset.action]));
+        row.querySelectorAll('[data-confirm]').forEach(el => {
+            el.addEventListener('click', event => {
+                if (!confirm(`Weet je zeker dat je ${item.name} wilt verwijderen?`)) event.preventDefault();
+            });
+        });
+        return row;
+    }
+
+    document.querySelectorAll('[data-keyset-table]').forEach(table => {
+        const body = table.querySelector('tbody');
+        const template = document.getElementById(table.dataset.rowTemplate);
+        const more = document.getElementById(table.dataset.loadMore);
+        if (!template || !more) return;
+        let loading = false;
+
+        async function loadMore() {
+            if (loading || !more.dataset.jsonUrl) return;
+            loading = true;
+            try {
+                const response = await fetch(more.dataset.jsonUrl);
+                if (!response.ok) return;
+                const data = await response.json();
+                data.items.forEach(item => body.appendChild(renderRow(template, item)));
+                if (data.next_json_url) {
+                    more.dataset.jsonUrl = data.next_json_url;
+                    more.setAttribute('href', data.next_page_url);
+                } else {
+                    observer.disconnect();
+                    more.remove();
+                }
+            } finally {
+                loading = false;
+            }
+        }
+
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadMore();
+        });
+        observer.observe(more);
+        more.addEventListener('click', event => {
+            event.preventDefault();
+            loadMore();
+        });
+    });
+})();
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# De modules staan plat in de root van het project
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,58 @@
+# tests/test_query_counter.py
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from query_counter import QueryBudgetExceeded, init_query_counter, query_budget
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE log (id INTEGER PRIMARY KEY, note TEXT)"))
+    return engine
+
+
+@pytest.fixture
+def app(engine):
+    app = Flask(__name__)
+    app.config.update(TESTING=True, QUERY_BUDGET_ENFORCE=True)
+    init_query_counter(app)
+
+    def select_then_write(count):
+        with engine.begin() as conn:
+            for _ in range(count):
+                conn.execute(text("SELECT 1"))
+            conn.execute(text("INSERT INTO log (note) VALUES ('geschreven')"))
+        return 'ok'
+
+    @app.route('/under')
+    @query_budget(2)
+    def under_budget():
+        return select_then_write(2)
+
+    @app.route('/over')
+    @query_budget(2)
+    def over_budget():
+        return select_then_write(3)
+
+    return app
+
+
+def _written(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT count(*) FROM log")).scalar()
+
+
+def test_view_within_budget_passes(app, engine):
+    response = app.test_client().get('/under')
+    assert response.status_code == 200
+    assert response.headers['X-Query-Count'] == '2'
+    assert _written(engine) == 1
+
+
+def test_view_over_budget_fails_before_commit(app, engine):
+    with pytest.raises(QueryBudgetExceeded):
+        app.test_client().get('/over')
+    assert _written(engine) == 0